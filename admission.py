@@ -0,0 +1,223 @@
+import asyncio
+import itertools
+import math
+import os
+import time
+from collections import OrderedDict
+
+from starlette.datastructures import Headers
+from starlette.responses import JSONResponse
+
+import metrics
+
+# Admission control in front of the app. At most ADMISSION_MAX_CONCURRENCY requests run at once,
+# kept below the 40-thread request threadpool so handlers never queue inside it. Each route
+# class also has its own concurrency limit, so browsing cannot take the slots checkout needs.
+# Requests beyond that wait in one bounded queue ordered by class priority; a freed slot goes to
+# order writes first, then API reads, pages and batch jobs. A request whose estimated wait is
+# longer than its class allows is answered 503 with Retry-After at once instead of after the
+# wait, and a full queue drops its lowest-priority waiter to make room for a more urgent one.
+# /static and /metrics are never held back. Set ADMISSION_MAX_CONCURRENCY near the concurrency
+# at which throughput stops growing (benchmarks/admission.py); above it requests only queue in
+# the database and the CPU instead of here.
+#
+# ADMISSION_RATE adds a per-client token bucket (requests/second, ADMISSION_BURST deep);
+# clients over it get 429. Clients are told apart by socket address, or by the first value of
+# ADMISSION_CLIENT_HEADER (e.g. x-forwarded-for) behind a proxy.
+ADMISSION_CONTROL = os.environ.get("ADMISSION_CONTROL", "1") == "1"
+ADMISSION_MAX_CONCURRENCY = int(os.environ.get("ADMISSION_MAX_CONCURRENCY", "32"))
+ADMISSION_QUEUE_SIZE = int(os.environ.get("ADMISSION_QUEUE_SIZE", "64"))
+ADMISSION_RATE = float(os.environ.get("ADMISSION_RATE", "0"))
+ADMISSION_BURST = float(os.environ.get("ADMISSION_BURST", "20"))
+ADMISSION_CLIENT_HEADER = os.environ.get("ADMISSION_CLIENT_HEADER", "").lower()
+MAX_TRACKED_CLIENTS = 10000
+
+EXEMPT_PREFIXES = ("/static/", "/metrics")
+ORDER_WRITES = {("POST", "/api/orders"), ("POST", "/api/orders/checkout"), ("POST", "/api/reservations")}
+BATCH_PREFIXES = ("/api/orders/bulk", "/api/orders/export")
+
+shed_total = metrics.registry.register(metrics.Counter(
+    "admission_shed_total", "Requests turned away by admission control, by route class and reason.", ("class", "reason")))
+
+class RouteClass:
+
+    def __init__(self, name: str, priority: int, limit: int, max_wait_ms: float):
+        # ADMISSION_<NAME>_LIMIT and ADMISSION_<NAME>_WAIT_MS override the defaults
+        self.name = name
+        self.priority = priority
+        self.limit = int(os.environ.get(f"ADMISSION_{name.upper()}_LIMIT", str(limit)))
+        self.max_wait = float(os.environ.get(f"ADMISSION_{name.upper()}_WAIT_MS", str(max_wait_ms))) / 1000
+
+ROUTE_CLASSES = {route_class.name: route_class for route_class in (
+    RouteClass("orders", 0, ADMISSION_MAX_CONCURRENCY, 5000),
+    RouteClass("api", 1, ADMISSION_MAX_CONCURRENCY * 3 // 4, 1000),
+    RouteClass("pages", 2, ADMISSION_MAX_CONCURRENCY * 3 // 4, 500),
+    RouteClass("batch", 3, 2, 2000),
+)}
+
+def classify(method: str, path: str) -> str | None:
+    if path.startswith(EXEMPT_PREFIXES):
+        return None
+    if (method, path.rstrip("/")) in ORDER_WRITES or (method == "DELETE" and path.startswith("/api/reservations/")):
+        return "orders"
+    if path.startswith(BATCH_PREFIXES):
+        return "batch"
+    if path.startswith("/api/"):
+        return "api"
+    return "pages"
+
+class Shed(Exception):
+
+    def __init__(self, reason: str, retry_after: float):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+class AdmissionController:
+    # Runs on the event loop only, so its counters need no lock
+
+    def __init__(self, capacity: int = ADMISSION_MAX_CONCURRENCY, queue_size: int = ADMISSION_QUEUE_SIZE, classes=None):
+        self.capacity = capacity
+        self.queue_size = queue_size
+        self.classes = classes or ROUTE_CLASSES
+        self.total = 0
+        self.in_flight = {name: 0 for name in self.classes}
+        # Running average of how long an admitted request holds its slot, for wait estimates
+        self.service_time = 0.05
+        self._waiters = []
+        self._seq = itertools.count()
+
+    def _has_room(self, route_class: RouteClass) -> bool:
+        return self.total < self.capacity and self.in_flight[route_class.name] < route_class.limit
+
+    def _admit(self, route_class: RouteClass):
+        self.total += 1
+        self.in_flight[route_class.name] += 1
+
+    def queued(self, name: str | None = None) -> int:
+        return sum(1 for waiter in self._waiters if name is None or waiter[2].name == name)
+
+    def estimated_wait(self, priority: int) -> float:
+        ahead = sum(1 for waiter in self._waiters if waiter[0] <= priority)
+        return (ahead + 1) * self.service_time / self.capacity
+
+    async def acquire(self, route_class: RouteClass):
+        # Returns once admitted; raises Shed otherwise
+        ahead = any(waiter[0] <= route_class.priority and self._has_room(waiter[2]) for waiter in self._waiters)
+        if self._has_room(route_class) and not ahead:
+            self._admit(route_class)
+            return
+        wait = self.estimated_wait(route_class.priority)
+        if wait > route_class.max_wait:
+            raise Shed("deadline", wait)
+        if len(self._waiters) >= self.queue_size:
+            worst = max(self._waiters)
+            if worst[0] <= route_class.priority:
+                raise Shed("queue_full", wait)
+            self._waiters.remove(worst)
+            worst[3].set_exception(Shed("evicted", self.estimated_wait(worst[0])))
+        waiter = (route_class.priority, next(self._seq), route_class, asyncio.get_running_loop().create_future())
+        self._waiters.append(waiter)
+        try:
+            done, _ = await asyncio.wait({waiter[3]}, timeout=route_class.max_wait)
+        except asyncio.CancelledError:
+            # The client went away while queued; hand back a slot it may have just been given
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+            elif waiter[3].done() and not waiter[3].cancelled() and waiter[3].exception() is None:
+                self.release(route_class, 0)
+            raise
+        if not done:
+            self._waiters.remove(waiter)
+            waiter[3].cancel()
+            raise Shed("deadline", self.estimated_wait(route_class.priority))
+        waiter[3].result()
+
+    def release(self, route_class: RouteClass, held: float):
+        self.total -= 1
+        self.in_flight[route_class.name] -= 1
+        self.service_time += 0.1 * (held - self.service_time)
+        self._dispatch()
+
+    def _dispatch(self):
+        # Free slots go to waiters by priority, then arrival, skipping classes at their limit
+        for waiter in sorted(self._waiters):
+            if self.total >= self.capacity:
+                return
+            if self._has_room(waiter[2]):
+                self._waiters.remove(waiter)
+                self._admit(waiter[2])
+                waiter[3].set_result(None)
+
+class RateLimiter:
+    # Token bucket per client; the least recently seen clients are forgotten past max_clients
+
+    def __init__(self, rate: float, burst: float, max_clients: int = MAX_TRACKED_CLIENTS, clock=time.monotonic):
+        self.rate = rate
+        self.burst = burst
+        self.max_clients = max_clients
+        self.clock = clock
+        self._buckets = OrderedDict()
+
+    def take(self, client: str) -> float:
+        # 0 when the request may proceed, otherwise seconds until a token is available
+        now = self.clock()
+        tokens, stamp = self._buckets.pop(client, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - stamp) * self.rate)
+        wait = 0.0
+        if tokens >= 1:
+            tokens -= 1
+        else:
+            wait = (1 - tokens) / self.rate
+        self._buckets[client] = (tokens, now)
+        if len(self._buckets) > self.max_clients:
+            self._buckets.popitem(last=False)
+        return wait
+
+controller = AdmissionController()
+limiter = RateLimiter(ADMISSION_RATE, ADMISSION_BURST) if ADMISSION_RATE > 0 else None
+
+def client_key(scope) -> str:
+    if ADMISSION_CLIENT_HEADER:
+        forwarded = Headers(scope=scope).get(ADMISSION_CLIENT_HEADER)
+        if forwarded:
+            return forwarded.split(",")[0].strip()
+    client = scope.get("client")
+    return client[0] if client else "unknown"
+
+def _reject(status: int, detail: str, retry_after: float):
+    return JSONResponse({"detail": detail}, status_code=status, headers={"Retry-After": str(max(1, math.ceil(retry_after)))})
+
+class AdmissionMiddleware:
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        name = classify(scope["method"], scope["path"]) if scope["type"] == "http" and ADMISSION_CONTROL else None
+        if name is None:
+            await self.app(scope, receive, send)
+            return
+        if limiter is not None:
+            wait = limiter.take(client_key(scope))
+            if wait:
+                shed_total.inc(name, "rate_limited")
+                await _reject(429, "Too many requests", wait)(scope, receive, send)
+                return
+        route_class = controller.classes[name]
+        try:
+            await controller.acquire(route_class)
+        except Shed as e:
+            shed_total.inc(name, e.reason)
+            await _reject(503, "Server is busy, retry later", e.retry_after)(scope, receive, send)
+            return
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            controller.release(route_class, time.perf_counter() - started)
+
+metrics.register_gauge("admission_in_flight", "Requests holding an admission slot, by route class.", ("class",),
+                       lambda: {(name,): count for name, count in controller.in_flight.items()})
+metrics.register_gauge("admission_queued", "Requests waiting for an admission slot, by route class.", ("class",),
+                       lambda: {(name,): controller.queued(name) for name in controller.classes})
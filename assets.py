@@ -0,0 +1,120 @@
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+import threading
+
+from fastapi.staticfiles import StaticFiles
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+
+import etag
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+STATIC_DIR = "static"
+STATIC_PREFIX = "/static"
+
+# Text assets get precompressed variants; images and fonts are already compressed
+COMPRESSIBLE = {".js", ".css", ".html", ".svg", ".json", ".txt", ".map", ".xml"}
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+class Asset:
+    # A file under static/ addressed by a content-hashed name, e.g. script.3f2a1b9c0d4e.js
+
+    def __init__(self, directory: str, name: str):
+        self.name = name
+        self.path = os.path.join(directory, name)
+        with open(self.path, "rb") as f:
+            body = f.read()
+        digest = hashlib.blake2b(body, digest_size=6).hexdigest()
+        stem, ext = os.path.splitext(name)
+        self.hashed_name = f"{stem}.{digest}{ext}"
+        self.etag = f'"{digest}"'
+        self.media_type = mimetypes.guess_type(name)[0] or "application/octet-stream"
+        self.variants = {}
+        if ext in COMPRESSIBLE:
+            self.variants["gzip"] = gzip.compress(body, compresslevel=9, mtime=0)
+            if brotli is not None:
+                self.variants["br"] = brotli.compress(body, quality=11)
+
+class AssetPipeline:
+    # Fingerprints and precompresses static/ once, on first use (the app lifespan warms it)
+
+    def __init__(self, directory: str = STATIC_DIR, prefix: str = STATIC_PREFIX):
+        self.directory = directory
+        self.prefix = prefix
+        self._assets = None
+        self._pattern = None
+        self._lock = threading.Lock()
+
+    @property
+    def assets(self):
+        if self._assets is None:
+            self.build()
+        return self._assets
+
+    def build(self):
+        with self._lock:
+            assets = {}
+            for root, _, files in os.walk(self.directory):
+                for filename in files:
+                    name = os.path.relpath(os.path.join(root, filename), self.directory).replace(os.sep, "/")
+                    asset = Asset(self.directory, name)
+                    assets[asset.hashed_name] = asset
+            self.manifest = {asset.name: asset.hashed_name for asset in assets.values()}
+            names = sorted(self.manifest, key=len, reverse=True)
+            self._pattern = re.compile(
+                "(?<=[\"'(])" + re.escape(self.prefix + "/") + "(" + "|".join(map(re.escape, names)) + ")(?=[\"')?#])"
+            ) if names else None
+            self._assets = assets
+
+    def url(self, name: str) -> str:
+        self.assets
+        return f"{self.prefix}/{self.manifest.get(name, name)}"
+
+    def rewrite(self, html: bytes) -> bytes:
+        # Point quoted /static/<name> references at the fingerprinted names
+        self.assets
+        if self._pattern is None:
+            return html
+        text = self._pattern.sub(lambda m: self.url(m.group(1)), html.decode("utf-8"))
+        return text.encode("utf-8")
+
+    def response(self, hashed_name: str, scope):
+        asset = self.assets.get(hashed_name)
+        if asset is None:
+            return None
+        headers = {"Cache-Control": IMMUTABLE, "ETag": asset.etag, "Vary": "Accept-Encoding"}
+        request_headers = Headers(scope=scope)
+        if etag.matches_if_none_match(request_headers.get("if-none-match"), asset.etag):
+            return Response(status_code=304, headers=headers)
+        coding = etag.choose_encoding(request_headers.get("accept-encoding", ""), asset.variants)
+        if coding != "identity" and "range" not in request_headers:
+            headers["Content-Encoding"] = coding
+            return Response(content=asset.variants[coding], media_type=asset.media_type, headers=headers)
+        # Identity bodies go through FileResponse for sendfile and Range support
+        return FileResponse(asset.path, media_type=asset.media_type, headers=headers)
+
+class AssetFiles(StaticFiles):
+    # StaticFiles that answers fingerprinted names from the pipeline and falls back to
+    # plain files (revalidated on every use) for unversioned references
+
+    def __init__(self, pipeline: AssetPipeline, **kwargs):
+        super().__init__(directory=pipeline.directory, **kwargs)
+        self.pipeline = pipeline
+
+    async def get_response(self, path: str, scope):
+        response = self.pipeline.response(path.replace(os.sep, "/"), scope)
+        if response is not None:
+            return response
+        response = await super().get_response(path, scope)
+        response.headers.setdefault("Cache-Control", "no-cache")
+        return response
+
+pipeline = AssetPipeline()
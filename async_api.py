@@ -0,0 +1,162 @@
+from datetime import date
+from typing import Any
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import cache, catalog, compact, crud_async, idempotency, inventory, order_queue, orders, pagination, replicas, schemas, search, stats
+from database import get_async_db
+
+# Async versions of the JSON API in main.py, mounted when DATABASE_MODE=async.
+# Handlers run on the event loop instead of the threadpool.
+router = APIRouter()
+
+async def get_async_read_db(request: Request, db: AsyncSession = Depends(get_async_db)):
+    if not replicas.async_read_replicas or replicas.prefers_primary(request):
+        yield db
+        return
+    async with replicas.async_replica_session() as replica_db:
+        yield replica_db
+
+# Primary until the replicas have caught up with the last catalog invalidation; see main.py
+async def get_async_catalog_read_db(request: Request, db: AsyncSession = Depends(get_async_db)):
+    cache.catalog_cache.sync()
+    if not replicas.caught_up(cache.catalog_cache.invalidated_at):
+        yield db
+        return
+    async for read_db in get_async_read_db(request, db):
+        yield read_db
+
+@router.get("/api/products", response_model=list[schemas.Product] | schemas.ProductPage)
+async def read_products(request: Request, skip: int = 0, limit: int = 100, cursor: str | None = None, fields: str | None = None,
+                        format: str = "objects", ids: str | None = None, db: AsyncSession = Depends(get_async_catalog_read_db)):
+    after_id = pagination.get_after_id(cursor)
+    selected = compact.parse(fields, format, schemas.Product)
+    if ids is not None:
+        products = await crud_async.get_cached_products_by_ids(db, catalog.parse_ids(ids))
+        return products if selected is None else compact.ORJSONResponse(compact.shape(products, selected, format))
+
+    async def encode():
+        products = await crud_async.get_cached_products(db, skip=skip, limit=limit, after_id=after_id)
+        return catalog.encode_page(products, limit, cursor, selected, format)
+
+    body, tag = await cache.page_cache.get_or_load_async(catalog.page_key(skip, limit, cursor, after_id, selected, format), encode)
+    return catalog.page_response(request, body, tag)
+
+@router.get("/api/products/search", response_model=list[schemas.Product])
+async def search_products(q: str = "", min_price: float | None = None, max_price: float | None = None,
+                          limit: int = Query(20, ge=1, le=search.MAX_RESULTS),
+                          fields: str | None = None, format: str = "objects", db: AsyncSession = Depends(get_async_db)):
+    selected = compact.parse(fields, format, schemas.Product)
+    results = await search.search_products_async(db, q, min_price=min_price, max_price=max_price, limit=limit)
+    if selected is None:
+        return results
+    return compact.ORJSONResponse(compact.shape(results, selected, format))
+
+@router.get("/api/products/{product_id}", response_model=schemas.Product)
+async def read_product(product_id: int, db: AsyncSession = Depends(get_async_db)):
+    product = await crud_async.get_cached_product(db, product_id=product_id)
+    if product is None:
+        raise HTTPException(status_code=404, detail="Product not found")
+    return product
+
+async def place_order(order: schemas.OrderCreate, db: AsyncSession):
+    db_product = await crud_async.get_cached_product(db, product_id=order.product_id)
+    if db_product is None:
+        raise HTTPException(status_code=404, detail="Product not found")
+    if order_queue.ORDER_WRITE_BEHIND:
+        return await order_queue.result_async(order_queue.get_writer().submit(order, db_product.price))
+    await inventory.claim_async(db, order)
+    return schemas.Order.model_validate(await crud_async.create_order(db=db, order=order, unit_price=db_product.price))
+
+@router.post("/api/orders", response_model=schemas.Order)
+async def create_order(order: schemas.OrderCreate, response: Response, idempotency_key: str | None = Header(None), db: AsyncSession = Depends(get_async_db)):
+    replicas.mark_write(response)
+    if idempotency_key is None:
+        return await place_order(order, db)
+    result, replayed = await idempotency.store.execute_async(idempotency_key, idempotency.fingerprint(order), lambda: place_order(order, db))
+    if replayed:
+        response.headers["Idempotent-Replayed"] = "true"
+    return result
+
+async def place_checkout(checkout: schemas.CheckoutCreate, db: AsyncSession):
+    prices = await crud_async.get_product_prices(db, [line.product_id for line in checkout.items])
+    cart = orders.checkout_orders(checkout, prices)
+    orders.require_claimed(await inventory.claim_all_async(db, cart))
+    return orders.checkout_result(await crud_async.create_checkout(db, cart, [prices[order.product_id] for order in cart]))
+
+@router.post("/api/orders/checkout", response_model=schemas.Checkout)
+async def create_checkout(checkout: schemas.CheckoutCreate, response: Response, idempotency_key: str | None = Header(None), db: AsyncSession = Depends(get_async_db)):
+    replicas.mark_write(response)
+    if idempotency_key is None:
+        return await place_checkout(checkout, db)
+    result, replayed = await idempotency.store.execute_async(idempotency_key, idempotency.fingerprint(checkout), lambda: place_checkout(checkout, db))
+    if replayed:
+        response.headers["Idempotent-Replayed"] = "true"
+    return result
+
+@router.post("/api/orders/bulk", response_model=schemas.BulkOrderResult)
+async def create_orders_bulk(items: list[Any], response: Response, db: AsyncSession = Depends(get_async_db)):
+    replicas.mark_write(response)
+    if len(items) > orders.MAX_BULK_ORDERS:
+        raise HTTPException(status_code=413, detail=f"At most {orders.MAX_BULK_ORDERS} orders per batch")
+    results, valid = orders.parse_bulk_items(items)
+    prices = await crud_async.get_product_prices(db, [order.product_id for _, order in valid])
+    accepted = orders.accept_known_products(results, valid, prices)
+    accepted = orders.accept_claimed(results, accepted, await inventory.claim_all_async(db, [order for _, order in accepted]))
+    ids = await crud_async.create_orders_bulk(db, [order for _, order in accepted], [prices[order.product_id] for _, order in accepted])
+    return orders.bulk_result(results, accepted, ids)
+
+@router.get("/api/orders", response_model=list[schemas.Order] | schemas.OrderPage)
+async def read_orders(skip: int = 0, limit: int = 100, cursor: str | None = None, fields: str | None = None,
+                      format: str = "objects", db: AsyncSession = Depends(get_async_read_db)):
+    after_id = pagination.get_after_id(cursor)
+    selected = compact.parse(fields, format, schemas.Order)
+    if cursor is None:
+        db_orders = await crud_async.get_orders(db, skip=skip, limit=limit)
+        return db_orders if selected is None else compact.ORJSONResponse(compact.shape(db_orders, selected, format))
+    db_orders = await crud_async.get_orders(db, limit=limit, after_id=after_id)
+    if selected is not None:
+        return compact.ORJSONResponse(compact.page(db_orders, selected, format, pagination.next_cursor(db_orders, limit)))
+    return {"items": db_orders, "next_cursor": pagination.next_cursor(db_orders, limit)}
+
+@router.get("/api/products/{product_id}/orders", response_model=schemas.OrderPage)
+async def read_product_orders(product_id: int, limit: int = 100, cursor: str | None = None, db: AsyncSession = Depends(get_async_read_db)):
+    db_orders = await crud_async.get_orders_for_product(db, product_id, limit=limit, after_id=pagination.get_after_id(cursor))
+    return {"items": db_orders, "next_cursor": pagination.next_cursor(db_orders, limit)}
+
+@router.get("/api/orders/by-customer", response_model=schemas.OrderPage)
+async def read_customer_orders(email: str, limit: int = 100, cursor: str | None = None, db: AsyncSession = Depends(get_async_read_db)):
+    db_orders = await crud_async.get_orders_for_customer(db, email, limit=limit, after_id=pagination.get_after_id(cursor))
+    return {"items": db_orders, "next_cursor": pagination.next_cursor(db_orders, limit)}
+
+@router.get("/api/products/{product_id}/stock", response_model=schemas.StockLevel)
+async def read_product_stock(product_id: int, db: AsyncSession = Depends(get_async_db)):
+    level = await inventory.get_stock_async(db, product_id)
+    if level is None:
+        raise HTTPException(status_code=404, detail="Product not found")
+    return level
+
+@router.post("/api/reservations", response_model=schemas.Reservation)
+async def create_reservation(reservation: schemas.ReservationCreate, db: AsyncSession = Depends(get_async_db)):
+    if await crud_async.get_cached_product(db, product_id=reservation.product_id) is None:
+        raise HTTPException(status_code=404, detail="Product not found")
+    return await inventory.reserve_async(db, reservation.product_id, reservation.quantity)
+
+@router.delete("/api/reservations/{reservation_id}", status_code=204)
+async def delete_reservation(reservation_id: int, db: AsyncSession = Depends(get_async_db)):
+    if not await inventory.release_async(db, reservation_id):
+        raise HTTPException(status_code=404, detail="Reservation not found")
+
+@router.get("/api/stats/products/{product_id}", response_model=schemas.ProductSales)
+async def read_product_sales(product_id: int, db: AsyncSession = Depends(get_async_db)):
+    sales = await stats.get_product_sales_async(db, product_id)
+    if sales is not None:
+        return sales
+    if await crud_async.get_cached_product(db, product_id=product_id) is None:
+        raise HTTPException(status_code=404, detail="Product not found")
+    return schemas.ProductSales(product_id=product_id)
+
+@router.get("/api/stats/daily", response_model=list[schemas.DailySales])
+async def read_daily_sales(start: date | None = None, end: date | None = None, limit: int = 90, db: AsyncSession = Depends(get_async_db)):
+    return await stats.get_daily_sales_async(db, start, end, limit)
@@ -0,0 +1,93 @@
+# Order POST latency while browsing clients offer about twice the load the server can handle,
+# with admission control off and on. Browsers back off briefly after a 503, like the storefront
+# script would, and keep coming back.
+#
+#   ADMISSION_MAX_CONCURRENCY=8 python benchmarks/admission.py --writers 4 --writes 100
+#   ADMISSION_MAX_CONCURRENCY=4 python benchmarks/admission.py --browsers 32
+import argparse
+import asyncio
+import logging
+import os
+import random
+import statistics
+import tempfile
+import time
+from collections import Counter
+
+import httpx
+
+from suite import ORDER, seed
+
+def percentile(samples, q: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--products", type=int, default=1000)
+    parser.add_argument("--orders", type=int, default=100000)
+    parser.add_argument("--browsers", type=int, default=None, help="defaults to twice ADMISSION_MAX_CONCURRENCY")
+    parser.add_argument("--writers", type=int, default=4)
+    parser.add_argument("--writes", type=int, default=200, help="per writer")
+    parser.add_argument("--backoff", type=float, default=0.1, help="seconds a browser waits after a 503")
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(directory, 'admission.db')}"
+    seed(os.environ["DATABASE_URL"], args.products, args.orders)
+
+    import admission
+    from main import app
+    logging.getLogger("ecommerce.sql").setLevel(logging.ERROR)
+    browsers = args.browsers or 2 * admission.ADMISSION_MAX_CONCURRENCY
+    rng = random.Random(1)
+
+    def browse_request():
+        return rng.choice([
+            ("/api/orders", {"skip": rng.randrange(args.orders), "limit": 100}),
+            ("/api/products", {"skip": rng.randrange(args.products), "limit": 20}),
+            ("/products", None),
+        ])
+
+    async def browser(client, stop, statuses):
+        while not stop.is_set():
+            path, params = browse_request()
+            response = await client.get(path, params=params)
+            statuses[response.status_code] += 1
+            if response.status_code == 503:
+                await asyncio.sleep(args.backoff)
+
+    async def writer(client, latencies, statuses):
+        for _ in range(args.writes):
+            started = time.perf_counter()
+            response = await client.post("/api/orders", json={**ORDER, "product_id": rng.randrange(1, args.products + 1)})
+            latencies.append((time.perf_counter() - started) * 1000)
+            statuses[response.status_code] += 1
+
+    async def run(load: int):
+        stop = asyncio.Event()
+        latencies, browse_statuses, order_statuses = [], Counter(), Counter()
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+            tasks = [asyncio.create_task(browser(client, stop, browse_statuses)) for _ in range(load)]
+            started = time.perf_counter()
+            await asyncio.gather(*(writer(client, latencies, order_statuses) for _ in range(args.writers)))
+            elapsed = time.perf_counter() - started
+            stop.set()
+            await asyncio.gather(*tasks)
+        return latencies, browse_statuses, order_statuses, elapsed
+
+    print(f"{'admission':>10} {'browsers':>9} {'order p50 ms':>13} {'order p99 ms':>13} {'orders ok':>10} "
+          f"{'browse ok/s':>12} {'browse 503':>11}")
+    for label, enabled, load in (("baseline", False, 0), ("off", False, browsers), ("on", True, browsers)):
+        admission.ADMISSION_CONTROL = enabled
+        admission.controller = admission.AdmissionController()
+        latencies, browse_statuses, order_statuses, elapsed = asyncio.run(run(load))
+        print(f"{label:>10} {load:>9} {statistics.median(latencies):>13.2f} {percentile(latencies, 0.99):>13.2f} "
+              f"{order_statuses[200]:>10} {browse_statuses[200] / elapsed:>12.1f} {browse_statuses[503]:>11}")
+    shed = {f"{name}/{reason}": admission.shed_total.value(name, reason) for name in admission.ROUTE_CLASSES
+            for reason in ("deadline", "queue_full", "evicted")}
+    print("shed:", {key: value for key, value in shed.items() if value})
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+# Compare p50/p99 latency of the sync and async database modes under concurrent load.
+# Starts uvicorn once per mode from the repository root and drives DB-bound order listings.
+#
+#   python benchmarks/async_load.py --concurrency 500 --requests 5000
+import argparse
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+def seed(orders: int):
+    from sqlalchemy import create_engine, insert
+    import models
+    engine = create_engine(f"sqlite:///{os.path.join(ROOT, 'ecommerce.db')}")
+    models.Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        if conn.execute(models.Order.__table__.select().limit(1)).first() is None:
+            conn.execute(insert(models.Product), [{"name": f"Product {i}", "price": 9.99} for i in range(100)])
+            conn.execute(insert(models.Order), [
+                {"product_id": i % 100 + 1, "quantity": 1, "unit_price": 9.99, "customer_name": "Bench", "customer_email": "bench@example.com", "shipping_address": "1 Bench Street"}
+                for i in range(orders)
+            ])
+    engine.dispose()
+
+def start_server(mode: str, port: int):
+    env = dict(os.environ, DATABASE_MODE=mode)
+    # Measures the handlers under full load; admission control would shed most of it
+    env.setdefault("ADMISSION_CONTROL", "0")
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "critical"],
+        cwd=ROOT, env=env,
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/api/orders?limit=1")
+            return proc
+        except httpx.TransportError:
+            time.sleep(0.1)
+    proc.kill()
+    raise RuntimeError(f"uvicorn ({mode}) did not start")
+
+async def drive(url: str, concurrency: int, total: int):
+    latencies, errors = [], 0
+    queue = asyncio.Queue()
+    for i in range(total):
+        queue.put_nowait(i)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(limits=limits, timeout=30) as client:
+        async def worker():
+            nonlocal errors
+            while not queue.empty():
+                i = queue.get_nowait()
+                started = time.perf_counter()
+                try:
+                    response = await client.get(url, params={"skip": (i * 37) % 1000, "limit": 20})
+                    response.raise_for_status()
+                except httpx.HTTPError:
+                    # Timeouts and 5xx still count towards latency: that is what the client saw
+                    errors += 1
+                latencies.append((time.perf_counter() - started) * 1000)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+    return latencies, errors, elapsed
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--concurrency", type=int, default=500)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    seed(10000)
+    for mode in ("sync", "async"):
+        proc = start_server(mode, args.port)
+        try:
+            latencies, errors, elapsed = asyncio.run(drive(f"http://127.0.0.1:{args.port}/api/orders", args.concurrency, args.requests))
+        finally:
+            # uvicorn waits for in-flight requests on shutdown; a wedged threadpool never drains
+            proc.terminate()
+            try:
+                proc.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+                proc.wait()
+        quantiles = statistics.quantiles(latencies, n=100)
+        print(f"{mode:>6}: {len(latencies) / elapsed:>8.0f} req/s  p50 {quantiles[49]:>8.1f} ms  p99 {quantiles[98]:>8.1f} ms  errors {errors}")
+
+if __name__ == "__main__":
+    main()
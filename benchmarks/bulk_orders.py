@@ -0,0 +1,60 @@
+# Compare per-request order creation with the bulk ingestion path.
+#
+#   python benchmarks/bulk_orders.py --orders 5000
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import crud, models, schemas
+
+def make_orders(count: int, products: int):
+    return [
+        schemas.OrderCreate(product_id=i % products + 1, quantity=1, customer_name=f"Customer {i}",
+                            customer_email=f"customer{i}@example.com", shipping_address="1 Bench Street")
+        for i in range(count)
+    ]
+
+def per_request(Session, orders):
+    # Mirrors main.create_order: one lookup, one insert and one commit per order
+    with Session() as db:
+        for order in orders:
+            db_product = crud.get_product(db, order.product_id)
+            if db_product is not None:
+                crud.create_order(db, order, db_product.price)
+
+def bulk(Session, orders):
+    with Session() as db:
+        prices = crud.get_product_prices(db, [order.product_id for order in orders])
+        known = [order for order in orders if order.product_id in prices]
+        crud.create_orders_bulk(db, known, [prices[order.product_id] for order in known])
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--orders", type=int, default=5000)
+    parser.add_argument("--products", type=int, default=100)
+    args = parser.parse_args()
+
+    orders = make_orders(args.orders, args.products)
+    for name, fn in (("per-request", per_request), ("bulk", bulk)):
+        path = os.path.join(tempfile.mkdtemp(), "orders.db")
+        engine = create_engine(f"sqlite:///{path}")
+        models.Base.metadata.create_all(bind=engine)
+        Session = sessionmaker(bind=engine)
+        with Session() as db:
+            db.add_all([models.Product(name=f"Product {i}", price=9.99) for i in range(args.products)])
+            db.commit()
+        started = time.perf_counter()
+        fn(Session, orders)
+        elapsed = time.perf_counter() - started
+        print(f"{name:>12}: {args.orders / elapsed:>10.0f} orders/s ({elapsed:.3f}s)")
+        engine.dispose()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+# A cart of N items placed the old way (one product GET and one order POST per item)
+# against one ids lookup plus one checkout POST. Reports requests, SQL statements and time per cart.
+#
+#   python benchmarks/checkout.py --items 10 --carts 200
+import argparse
+import asyncio
+import logging
+import os
+import random
+import statistics
+import tempfile
+import time
+
+import httpx
+
+from suite import ORDER, seed
+
+CUSTOMER = {k: v for k, v in ORDER.items() if k != "quantity"}
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--products", type=int, default=10000)
+    parser.add_argument("--items", type=int, default=10)
+    parser.add_argument("--carts", type=int, default=200)
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    os.environ["DATABASE_URL"] = f"sqlite:///{path}"
+    seed(os.environ["DATABASE_URL"], args.products, 0)
+
+    from sqlalchemy import event
+    import cache, database
+    from main import app
+    logging.getLogger("ecommerce.sql").setLevel(logging.ERROR)
+
+    statements = 0
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        nonlocal statements
+        statements += 1
+
+    event.listen(database.get_engine(), "before_cursor_execute", count)
+    rng = random.Random(1)
+    carts = [rng.sample(range(1, args.products + 1), args.items) for _ in range(args.carts)]
+
+    async def per_item(client, cart):
+        for product_id in cart:
+            (await client.get(f"/api/products/{product_id}")).raise_for_status()
+        for product_id in cart:
+            (await client.post("/api/orders", json={"product_id": product_id, "quantity": 1, **CUSTOMER})).raise_for_status()
+        return 2 * len(cart)
+
+    async def batched(client, cart):
+        (await client.get("/api/products", params={"ids": ",".join(map(str, cart))})).raise_for_status()
+        items = [{"product_id": product_id, "quantity": 1} for product_id in cart]
+        (await client.post("/api/orders/checkout", json={**CUSTOMER, "items": items})).raise_for_status()
+        return 2
+
+    async def run(place):
+        nonlocal statements
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+            requests, queries, times = [], [], []
+            for cart in carts:
+                cache.catalog_cache.invalidate()
+                statements = 0
+                started = time.perf_counter()
+                requests.append(await place(client, cart))
+                times.append((time.perf_counter() - started) * 1000)
+                queries.append(statements)
+        return statistics.mean(requests), statistics.mean(queries), statistics.median(times)
+
+    for name, place in (("per-item", per_item), ("batched", batched)):
+        requests, queries, ms = asyncio.run(run(place))
+        print(f"{name:>9}: {args.items} items/cart, {requests:.0f} requests, {queries:.1f} SQL statements, median {ms:.2f} ms per cart")
+
+if __name__ == "__main__":
+    main()
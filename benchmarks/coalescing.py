@@ -0,0 +1,77 @@
+# Thundering herd on a cold catalog cache: N clients request the same product page at once.
+# Counts the product SELECTs that reach the database with single-flight on and off.
+#
+#   python benchmarks/coalescing.py --clients 1000
+#   python benchmarks/coalescing.py --clients 1000 --mode async
+import argparse
+import asyncio
+import logging
+import os
+import statistics
+import tempfile
+import time
+
+import httpx
+
+from suite import seed
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clients", type=int, default=1000)
+    parser.add_argument("--products", type=int, default=10000)
+    parser.add_argument("--bursts", type=int, default=3)
+    parser.add_argument("--mode", choices=["sync", "async"], default="sync")
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    os.environ["DATABASE_URL"] = f"sqlite:///{path}"
+    os.environ["ASYNC_DATABASE_URL"] = f"sqlite+aiosqlite:///{path}"
+    os.environ["DATABASE_MODE"] = args.mode
+    # The whole herd has to reach the cache; admission control would shed most of it
+    os.environ.setdefault("ADMISSION_CONTROL", "0")
+    seed(os.environ["DATABASE_URL"], args.products, 0)
+
+    from sqlalchemy import event
+    import cache, database
+    from main import app
+    # Herds of 1,000 requests trip the slow-query log; keep the report readable
+    logging.getLogger("ecommerce.sql").setLevel(logging.ERROR)
+
+    queries = 0
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        nonlocal queries
+        if "FROM products" in statement:
+            queries += 1
+
+    engine = database.get_async_engine().sync_engine if args.mode == "async" else database.get_engine()
+    event.listen(engine, "before_cursor_execute", count)
+
+    async def burst(client):
+        started = time.perf_counter()
+        responses = await asyncio.gather(*(client.get("/api/products", params={"skip": 0, "limit": 100}) for _ in range(args.clients)))
+        elapsed = (time.perf_counter() - started) * 1000
+        assert all(r.status_code == 200 for r in responses)
+        return elapsed
+
+    async def run(single_flight: bool):
+        nonlocal queries
+        cache.catalog_cache.single_flight = cache.page_cache.single_flight = single_flight
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+            counts, times = [], []
+            for _ in range(args.bursts):
+                cache.catalog_cache.invalidate()
+                queries = 0
+                times.append(await burst(client))
+                counts.append(queries)
+        return counts, statistics.median(times)
+
+    for single_flight in (False, True):
+        counts, elapsed = asyncio.run(run(single_flight))
+        label = "single-flight" if single_flight else "no coalescing"
+        print(f"{label:>14}: {args.clients} clients, product queries per burst {counts}, median burst {elapsed:.0f} ms")
+    print(f"coalesced waits: {cache.catalog_cache.coalesced + cache.page_cache.coalesced}")
+
+if __name__ == "__main__":
+    main()
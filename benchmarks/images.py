@@ -0,0 +1,82 @@
+# First-hit (resize) and cached-hit latency of /images/<name>?w=, against the bytes the product
+# grid downloaded when it used the originals.
+#
+#   python benchmarks/images.py --images 40 --size 2400x1600 --concurrency 8
+#   python benchmarks/images.py --workers 0
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+import httpx
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+def percentile(samples, q: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+def make_images(directory: str, count: int, width: int, height: int):
+    # Blurry colour blobs plus grain, so sizes before and after resizing resemble photos
+    from PIL import Image
+    for i in range(count):
+        channels = [Image.effect_noise((width // 32, height // 32), 90 + 5 * i % 40).resize((width, height), Image.Resampling.BICUBIC)
+                    for _ in range(3)]
+        grain = Image.effect_noise((width, height), 20).convert("RGB")
+        Image.blend(Image.merge("RGB", channels), grain, 0.2).save(os.path.join(directory, f"product{i}.jpg"), quality=90)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--images", type=int, default=40)
+    parser.add_argument("--size", default="2400x1600")
+    parser.add_argument("--width", type=int, default=320)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--workers", type=int, default=None, help="render processes (IMAGE_WORKERS)")
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    os.makedirs(os.path.join(directory, "images"))
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(directory, 'images.db')}"
+    os.environ["IMAGE_DIR"] = os.path.join(directory, "images")
+    os.environ["IMAGE_CACHE_DIR"] = os.path.join(directory, "image_cache")
+    if args.workers is not None:
+        os.environ["IMAGE_WORKERS"] = str(args.workers)
+    width, height = map(int, args.size.split("x"))
+    make_images(os.environ["IMAGE_DIR"], args.images, width, height)
+
+    import images
+    from main import app
+    names = sorted(os.listdir(os.environ["IMAGE_DIR"]))
+
+    async def fetch_all(params):
+        latencies, sizes = [], []
+        semaphore = asyncio.Semaphore(args.concurrency)
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=300) as client:
+            async def fetch(name):
+                async with semaphore:
+                    started = time.perf_counter()
+                    response = await client.get(f"/images/{name}", params=params, headers={"Accept": "image/webp,*/*"})
+                    response.raise_for_status()
+                    latencies.append((time.perf_counter() - started) * 1000)
+                    sizes.append(len(response.content))
+            await asyncio.gather(*(fetch(name) for name in names))
+        return latencies, sizes
+
+    print(f"{images.store.workers} render processes, {args.images} images of {args.size}, concurrency {args.concurrency}")
+    print(f"{'request':>22} {'p50 ms':>9} {'p95 ms':>9} {'max ms':>9} {'KiB/image':>10}")
+    for label, params in (
+        ("original", None),
+        (f"w={args.width} first hit", {"w": args.width}),
+        (f"w={args.width} cached", {"w": args.width}),
+    ):
+        latencies, sizes = asyncio.run(fetch_all(params))
+        print(f"{label:>22} {statistics.median(latencies):>9.2f} {percentile(latencies, 0.95):>9.2f} "
+              f"{max(latencies):>9.2f} {statistics.mean(sizes) / 1024:>10.1f}")
+    images.store.shutdown()
+
+if __name__ == "__main__":
+    main()
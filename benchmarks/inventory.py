@@ -0,0 +1,78 @@
+# Flash sale on one hot product: N concurrent buyers order one unit at a time until it sells out.
+# Checks that exactly `--stock` units were sold (no overselling, no stuck stock) and reports
+# orders per second for a single stock counter and for sharded stock, with orders written by
+# each request and through the write-behind queue.
+#
+# 200 buyers writing directly keep more requests waiting on SQLite's write lock than the default
+# pool and busy timeout allow for, so the direct runs get a larger pool and a 60 s busy timeout.
+#
+#   python benchmarks/inventory.py --buyers 200 --stock 2000
+#   python benchmarks/inventory.py --buyers 200 --stock 2000 --mode async --shards 0 16
+import argparse
+import asyncio
+import logging
+import os
+import tempfile
+import time
+
+import httpx
+
+from suite import ORDER, seed
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--buyers", type=int, default=200)
+    parser.add_argument("--stock", type=int, default=2000)
+    parser.add_argument("--shards", type=int, nargs="+", default=[0, 8])
+    parser.add_argument("--mode", choices=["sync", "async"], default="sync")
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    os.environ["DATABASE_URL"] = f"sqlite:///{path}"
+    os.environ["ASYNC_DATABASE_URL"] = f"sqlite+aiosqlite:///{path}"
+    os.environ["DATABASE_MODE"] = args.mode
+    os.environ.setdefault("DB_MAX_OVERFLOW", str(args.buyers))
+    os.environ.setdefault("SQLITE_BUSY_TIMEOUT_MS", "60000")
+    # Every buyer has to reach the stock; admission control would shed the burst
+    os.environ.setdefault("ADMISSION_CONTROL", "0")
+    seed(os.environ["DATABASE_URL"], 10, 0)
+
+    from sqlalchemy import func, select
+    import database, inventory, models, order_queue
+    from main import app
+    logging.getLogger("ecommerce.sql").setLevel(logging.ERROR)
+
+    async def buyer(client, product_id, outcome):
+        while True:
+            response = await client.post("/api/orders", json={**ORDER, "product_id": product_id})
+            if response.status_code == 409:
+                outcome["refused"] += 1
+                return
+            response.raise_for_status()
+            outcome["sold"] += 1
+
+    async def sale(product_id):
+        outcome = {"sold": 0, "refused": 0}
+        limits = httpx.Limits(max_connections=args.buyers)
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=120, limits=limits) as client:
+            started = time.perf_counter()
+            await asyncio.gather(*(buyer(client, product_id, outcome) for _ in range(args.buyers)))
+            return outcome, time.perf_counter() - started
+
+    runs = [(shards, write_behind) for write_behind in (False, True) for shards in args.shards]
+    for product_id, (shards, write_behind) in enumerate(runs, start=1):
+        order_queue.ORDER_WRITE_BEHIND = write_behind
+        with database.SessionLocal() as db:
+            inventory.set_stock(db, product_id, args.stock, shards)
+        outcome, elapsed = asyncio.run(sale(product_id))
+        with database.SessionLocal() as db:
+            ordered = db.scalar(select(func.sum(models.Order.quantity)).where(models.Order.product_id == product_id))
+            left = inventory.get_stock(db, product_id).stock
+        label = (f"{shards} shards" if shards else "one counter") + (", write-behind" if write_behind else ", direct")
+        print(f"{label:>25}: {args.buyers} buyers, sold {outcome['sold']} (orders table {ordered}), stock left {left}, "
+              f"{outcome['refused']} refused, {outcome['sold'] / elapsed:.0f} orders/s")
+        assert outcome["sold"] == ordered == args.stock and left == 0, "oversold or lost stock"
+    order_queue.stop_writer()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+# Order lookups by product, by customer and by time range on a large orders table,
+# with and without the composite indexes, plus SQLite's query plan for each.
+#
+#   python benchmarks/order_queries.py --orders 10000000
+#   python benchmarks/order_queries.py --orders 1000000 --no-indexes
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from sqlalchemy import create_engine, func, insert, select, text
+from sqlalchemy.orm import sessionmaker
+
+import crud, models
+
+START = datetime(2024, 1, 1)
+
+def seed(engine, products: int, orders: int, customers: int, batch: int = 100000):
+    rng = random.Random(1)
+    prices = [round(rng.uniform(5, 500), 2) for _ in range(products)]
+    with engine.begin() as conn:
+        conn.execute(insert(models.Product), [{"name": f"Product {i}", "price": prices[i]} for i in range(products)])
+        for start in range(0, orders, batch):
+            rows = []
+            for i in range(start, min(start + batch, orders)):
+                product = rng.randrange(products)
+                customer = rng.randrange(customers)
+                rows.append({"product_id": product + 1, "quantity": 1, "unit_price": prices[product],
+                             "customer_name": f"Customer {customer}", "customer_email": f"c{customer}@example.com",
+                             "shipping_address": "1 Bench Street", "created_at": START + timedelta(seconds=i * 3)})
+            conn.execute(insert(models.Order), rows)
+            print(f"seeded {min(start + batch, orders)} orders", file=sys.stderr)
+
+def time_query(fn, repeat: int):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--orders", type=int, default=10_000_000)
+    parser.add_argument("--products", type=int, default=10000)
+    parser.add_argument("--customers", type=int, default=100000)
+    parser.add_argument("--limit", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--no-indexes", action="store_true", help="drop the order indexes to measure the old schema")
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(), "orders.db")
+    engine = create_engine(f"sqlite:///{path}")
+    models.Base.metadata.create_all(bind=engine)
+    if args.no_indexes:
+        for index in models.Order.__table__.indexes:
+            index.drop(engine)
+    seed(engine, args.products, args.orders, args.customers)
+    db = sessionmaker(bind=engine)()
+
+    window_start = START + timedelta(seconds=args.orders)
+    window_end = window_start + timedelta(hours=1)
+    revenue = select(func.sum(models.Order.quantity * models.Order.unit_price)).where(models.Order.product_id == 42)
+    queries = {
+        "by_product": lambda: crud.get_orders_for_product(db, 42, limit=args.limit),
+        "by_product_page": lambda: crud.get_orders_for_product(db, 42, limit=args.limit, after_id=args.orders // 2),
+        "by_customer": lambda: crud.get_orders_for_customer(db, "c42@example.com", limit=args.limit),
+        "time_range": lambda: db.query(models.Order).filter(models.Order.created_at >= window_start,
+                                                            models.Order.created_at < window_end).all(),
+        "product_revenue": lambda: db.execute(revenue).scalar(),
+    }
+    plans = {
+        "by_product": "SELECT * FROM orders WHERE product_id = 42 ORDER BY id LIMIT 100",
+        "by_customer": "SELECT * FROM orders WHERE customer_email = 'c42@example.com' ORDER BY id LIMIT 100",
+        "time_range": "SELECT * FROM orders WHERE created_at >= '2024-01-01' AND created_at < '2024-01-02'",
+    }
+
+    print(f"{'query':>16} {'median ms':>12}")
+    for name, fn in queries.items():
+        print(f"{name:>16} {time_query(fn, args.repeat):>12.3f}")
+    for name, sql in plans.items():
+        detail = "; ".join(row[-1] for row in db.execute(text("EXPLAIN QUERY PLAN " + sql)))
+        print(f"{name:>16}: {detail}")
+
+    db.close()
+
+if __name__ == "__main__":
+    main()
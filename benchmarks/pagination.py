@@ -0,0 +1,62 @@
+# Compare offset and keyset pagination latency at increasing page depths.
+#
+#   python benchmarks/pagination.py --rows 1000000 --pages 1 100 1000 10000
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+
+import crud, models
+
+def seed(engine, rows: int, batch: int = 50000):
+    with engine.begin() as conn:
+        for start in range(0, rows, batch):
+            conn.execute(insert(models.Product), [
+                {"name": f"Product {i}", "description": "Benchmark product", "price": i % 500 + 0.99}
+                for i in range(start, min(start + batch, rows))
+            ])
+
+def time_page(fn, repeat: int):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--limit", type=int, default=100)
+    parser.add_argument("--pages", type=int, nargs="+", default=[1, 10, 100, 1000, 10000])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(), "pagination.db")
+    engine = create_engine(f"sqlite:///{path}")
+    models.Base.metadata.create_all(bind=engine)
+    seed(engine, args.rows)
+    db = sessionmaker(bind=engine)()
+
+    print(f"{'page':>8} {'offset ms':>12} {'keyset ms':>12}")
+    for page in args.pages:
+        skip = (page - 1) * args.limit
+        if skip >= args.rows:
+            break
+        # The keyset cursor for page N is the last id of page N - 1; ids are dense here
+        after_id = skip
+        offset_ms = time_page(lambda: crud.get_products(db, skip=skip, limit=args.limit), args.repeat)
+        keyset_ms = time_page(lambda: crud.get_products(db, limit=args.limit, after_id=after_id), args.repeat)
+        print(f"{page:>8} {offset_ms:>12.3f} {keyset_ms:>12.3f}")
+
+    db.close()
+
+if __name__ == "__main__":
+    main()
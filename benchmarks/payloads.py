@@ -0,0 +1,90 @@
+# Payload size and encode time for the default JSON, field selection and the compact
+# encoding, each over identity, gzip and brotli.
+#
+#   python benchmarks/payloads.py --limit 1000 --repeat 50
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+import httpx
+from pydantic import TypeAdapter
+
+from suite import seed
+
+def median_ms(fn, repeat: int):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--products", type=int, default=5000)
+    parser.add_argument("--orders", type=int, default=5000)
+    parser.add_argument("--limit", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=30)
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    os.environ["DATABASE_URL"] = f"sqlite:///{path}"
+    seed(os.environ["DATABASE_URL"], args.products, args.orders)
+
+    import cache, catalog, compact, crud, database, schemas
+    from main import app
+    order_adapter = TypeAdapter(list[schemas.Order])
+
+    variants = {
+        "default": {},
+        "fields": {"fields": "id,name,price"},
+        "compact": {"format": "compact"},
+        "compact+fields": {"format": "compact", "fields": "id,name,price"},
+    }
+
+    # Encode time alone, on already loaded rows
+    with database.SessionLocal() as db:
+        products = [schemas.Product.model_validate(p) for p in crud.get_products(db, limit=args.limit)]
+        orders = crud.get_orders(db, limit=args.limit)
+        order_list = [schemas.Order.model_validate(o) for o in orders]
+    print(f"encode {args.limit} rows (median ms)", file=sys.stderr)
+    for name, params in variants.items():
+        product_fields = compact.parse(params.get("fields"), params.get("format", "objects"), schemas.Product)
+        order_fields = compact.parse(None, params.get("format", "objects"), schemas.Order)
+        products_ms = median_ms(lambda: catalog.encode_page(products, args.limit, None, product_fields, params.get("format", "objects")), args.repeat)
+        if order_fields is None:
+            orders_ms = median_ms(lambda: order_adapter.dump_json(order_list), args.repeat)
+        else:
+            orders_ms = median_ms(lambda: compact.dumps(compact.shape(orders, order_fields, params["format"])), args.repeat)
+        print(f"{name:>16}: products {products_ms:>7.3f}  orders {orders_ms:>7.3f}", file=sys.stderr)
+
+    async def measure(client, path, params, encoding):
+        sizes, times = [], []
+        for _ in range(args.repeat):
+            cache.page_cache.invalidate()
+            started = time.perf_counter()
+            response = await client.get(path, params={"limit": args.limit, **params}, headers={"Accept-Encoding": encoding})
+            await response.aread()
+            times.append((time.perf_counter() - started) * 1000)
+            sizes.append(response.num_bytes_downloaded)
+        return sizes[-1], statistics.median(times)
+
+    async def go():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+            print(f"\n{'endpoint':>10} {'variant':>16} {'encoding':>9} {'bytes':>9} {'median ms':>10}")
+            for path in ("/api/products", "/api/orders"):
+                for name, params in variants.items():
+                    if path == "/api/orders" and "fields" in params:
+                        params = dict(params, fields="id,product_id,quantity,unit_price")
+                    for encoding in ("identity", "gzip", "br"):
+                        size, ms = await measure(client, path, params, encoding)
+                        print(f"{path.rsplit('/', 1)[1]:>10} {name:>16} {encoding:>9} {size:>9} {ms:>10.2f}")
+
+    asyncio.run(go())
+
+if __name__ == "__main__":
+    main()
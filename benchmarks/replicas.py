@@ -0,0 +1,90 @@
+# Order POST latency while other clients run heavy order listings, with the listings served by
+# the primary and by SQLite read replicas kept in step by replicas.Replicator.
+#
+#   python benchmarks/replicas.py --readers 20 --writes 300
+#   python benchmarks/replicas.py --replicas 2 --policy least_loaded
+import argparse
+import asyncio
+import logging
+import os
+import random
+import statistics
+import tempfile
+import time
+
+import httpx
+
+from suite import ORDER, seed
+
+def percentile(samples, q: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--products", type=int, default=1000)
+    parser.add_argument("--orders", type=int, default=200000)
+    parser.add_argument("--readers", type=int, default=20)
+    parser.add_argument("--writes", type=int, default=300)
+    parser.add_argument("--replicas", type=int, default=2)
+    parser.add_argument("--policy", choices=["round_robin", "least_loaded"], default="round_robin")
+    parser.add_argument("--sync-interval", type=float, default=1.0)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    primary = os.path.join(directory, "primary.db")
+    replica_urls = [f"sqlite:///{os.path.join(directory, f'replica{i}.db')}" for i in range(args.replicas)]
+    os.environ["DATABASE_URL"] = f"sqlite:///{primary}"
+    os.environ["READ_REPLICA_URLS"] = ",".join(replica_urls)
+    os.environ["READ_REPLICA_POLICY"] = args.policy
+    os.environ["REPLICA_SYNC_INTERVAL"] = str(args.sync_interval)
+    seed(os.environ["DATABASE_URL"], args.products, args.orders)
+
+    import replicas
+    from main import app
+    logging.getLogger("ecommerce.sql").setLevel(logging.ERROR)
+    replicas.start_replicator()
+    configured = replicas.read_replicas
+    rng = random.Random(1)
+
+    async def reader(client, stop):
+        # Offset pages deep into the orders table: each one scans past `skip` rows
+        while not stop.is_set():
+            response = await client.get("/api/orders", params={"skip": rng.randrange(args.orders), "limit": 200})
+            response.raise_for_status()
+
+    async def writer(client):
+        latencies = []
+        for _ in range(args.writes):
+            started = time.perf_counter()
+            response = await client.post("/api/orders", json={**ORDER, "product_id": rng.randrange(1, args.products + 1)})
+            response.raise_for_status()
+            latencies.append((time.perf_counter() - started) * 1000)
+        return latencies
+
+    async def run(readers: int):
+        stop = asyncio.Event()
+        transport = httpx.ASGITransport(app=app)
+        # Readers and the writer are separate clients, so only the writer carries the sticky cookie
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as read_client, \
+                   httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as write_client:
+            tasks = [asyncio.create_task(reader(read_client, stop)) for _ in range(readers)]
+            latencies = await writer(write_client)
+            stop.set()
+            await asyncio.gather(*tasks)
+        return latencies
+
+    print(f"{'reads served by':>22} {'readers':>8} {'write p50 ms':>13} {'write p95 ms':>13} {'write p99 ms':>13}")
+    for label, readers, replica_set in (
+        ("no read load", 0, configured),
+        ("primary", args.readers, replicas.ReplicaSet([], None)),
+        (f"{args.replicas} replicas", args.readers, configured),
+    ):
+        replicas.read_replicas = replica_set
+        latencies = asyncio.run(run(readers))
+        print(f"{label:>22} {readers:>8} {statistics.median(latencies):>13.2f} "
+              f"{percentile(latencies, 0.95):>13.2f} {percentile(latencies, 0.99):>13.2f}")
+    replicas.stop_replicator()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+# Product search latency on a generated catalog.
+#
+#   python benchmarks/search.py --rows 1000000
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+
+import models, search
+
+ADJECTIVES = ["linen", "denim", "wool", "cotton", "silk", "leather", "summer", "winter", "classic", "slim",
+              "oversized", "vintage", "striped", "floral", "organic", "waterproof", "knitted", "cropped"]
+ITEMS = ["shirt", "jacket", "scarf", "dress", "jeans", "sweater", "hoodie", "skirt", "coat", "blazer",
+         "trousers", "shorts", "cardigan", "boots", "sneakers", "hat", "gloves", "socks"]
+COLOURS = ["black", "white", "navy", "red", "olive", "beige", "grey", "mustard", "teal", "burgundy"]
+
+def seed(engine, rows: int, batch: int = 50000):
+    rng = random.Random(42)
+    with engine.begin() as conn:
+        for start in range(0, rows, batch):
+            conn.execute(insert(models.Product), [
+                {
+                    "name": f"{rng.choice(ADJECTIVES)} {rng.choice(COLOURS)} {rng.choice(ITEMS)} {i}",
+                    "description": f"{rng.choice(ADJECTIVES)} {rng.choice(ITEMS)} in {rng.choice(COLOURS)}",
+                    "price": round(rng.uniform(5, 500), 2),
+                }
+                for i in range(start, min(start + batch, rows))
+            ])
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(), "search.db")
+    engine = create_engine(f"sqlite:///{path}")
+    models.Base.metadata.create_all(bind=engine)
+    started = time.perf_counter()
+    seed(engine, args.rows)
+    print(f"seeded {args.rows} products in {time.perf_counter() - started:.1f}s")
+
+    queries = [
+        {"q": "shirt"},
+        {"q": "lin"},
+        {"q": "navy wool coat"},
+        {"q": "jacket", "min_price": 100, "max_price": 150},
+        {"q": "", "min_price": 99.5, "max_price": 100},
+    ]
+    with sessionmaker(bind=engine)() as db:
+        for query in queries:
+            samples = []
+            for _ in range(args.repeat):
+                t = time.perf_counter()
+                results = search.search_products(db, limit=20, **query)
+                samples.append((time.perf_counter() - t) * 1000)
+            print(f"{str(query):>55}: median {statistics.median(samples):>8.2f} ms  ({len(results)} results)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+# Mixed read/write throughput on SQLite with the default rollback journal vs WAL + pragmas.
+# Reader threads page through products while writer threads commit single orders.
+#
+#   python benchmarks/sqlite_pragmas.py --readers 8 --writers 2 --seconds 5
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from sqlalchemy import insert
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+
+import crud, database, models, schemas
+
+def run(pragmas: bool, readers: int, writers: int, seconds: float):
+    path = os.path.join(tempfile.mkdtemp(), "mixed.db")
+    engine = database.create_db_engine(f"sqlite:///{path}", pragmas=pragmas)
+    models.Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(insert(models.Product), [{"name": f"Product {i}", "price": 9.99} for i in range(10000)])
+    Session = sessionmaker(bind=engine)
+    counts = {"reads": 0, "writes": 0, "errors": 0}
+    lock = threading.Lock()
+    stop = time.monotonic() + seconds
+
+    def reader(n):
+        with Session() as db:
+            while time.monotonic() < stop:
+                try:
+                    crud.get_products(db, limit=100, after_id=(n * 997) % 9900)
+                    db.rollback()
+                    key = "reads"
+                except OperationalError:
+                    db.rollback()
+                    key = "errors"
+                with lock:
+                    counts[key] += 1
+                n += 1
+
+    def writer(n):
+        order = schemas.OrderCreate(product_id=1, quantity=1, customer_name="Bench", customer_email="bench@example.com", shipping_address="1 Bench Street")
+        with Session() as db:
+            while time.monotonic() < stop:
+                try:
+                    crud.create_order(db, order, 9.99)
+                    key = "writes"
+                except OperationalError:
+                    db.rollback()
+                    key = "errors"
+                with lock:
+                    counts[key] += 1
+
+    threads = [threading.Thread(target=reader, args=(i,)) for i in range(readers)]
+    threads += [threading.Thread(target=writer, args=(i,)) for i in range(writers)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    engine.dispose()
+    return {k: v / seconds for k, v in counts.items()}
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--writers", type=int, default=2)
+    parser.add_argument("--seconds", type=float, default=5)
+    args = parser.parse_args()
+
+    for label, pragmas in (("default", False), ("wal+pragmas", True)):
+        r = run(pragmas, args.readers, args.writers, args.seconds)
+        print(f"{label:>12}: {r['reads']:>8.0f} reads/s {r['writes']:>8.0f} writes/s {r['errors']:>6.0f} errors/s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+# Cold start: time to import the app, and time from spawning a server process to its first
+# successful response, against a fresh and an existing database.
+#
+#   python benchmarks/startup.py --runs 10
+#   python benchmarks/startup.py --runs 10 --no-schema   # as deployed with `alembic upgrade head`
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+IMPORT_SNIPPET = "import time; t = time.perf_counter(); import main; print(time.perf_counter() - t)"
+
+def time_import(env):
+    out = subprocess.run([sys.executable, "-c", IMPORT_SNIPPET], cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+    return float(out.stdout.strip()) * 1000
+
+def time_first_response(env, port: int):
+    started = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "critical"],
+                            cwd=ROOT, env=env)
+    try:
+        deadline = time.monotonic() + 60
+        while time.monotonic() < deadline:
+            try:
+                if httpx.get(f"http://127.0.0.1:{port}/api/products", params={"limit": 1}).status_code == 200:
+                    return (time.perf_counter() - started) * 1000
+            except httpx.TransportError:
+                time.sleep(0.005)
+        raise RuntimeError("server did not answer")
+    finally:
+        proc.terminate()
+        proc.wait()
+
+def summary(samples):
+    samples = sorted(samples)
+    return {"median_ms": round(statistics.median(samples), 1), "min_ms": round(samples[0], 1), "max_ms": round(samples[-1], 1)}
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--port", type=int, default=8797)
+    parser.add_argument("--no-schema", action="store_true", help="SCHEMA_AUTO_CREATE=0 on the existing database")
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    existing = os.path.join(directory, "existing.db")
+    base_env = dict(os.environ, SCHEMA_AUTO_CREATE="0" if args.no_schema else "1")
+    # Build the existing database once, the way a deploy step would
+    subprocess.run([sys.executable, "-c", "import database; database.init_db()"], cwd=ROOT, check=True,
+                   env=dict(os.environ, DATABASE_URL=f"sqlite:///{existing}"))
+
+    results = {"import": [], "first_response_existing_db": [], "first_response_fresh_db": []}
+    for run in range(args.runs):
+        env = dict(base_env, DATABASE_URL=f"sqlite:///{existing}")
+        results["import"].append(time_import(env))
+        results["first_response_existing_db"].append(time_first_response(env, args.port))
+        if not args.no_schema:
+            fresh = os.path.join(directory, f"fresh{run}.db")
+            results["first_response_fresh_db"].append(time_first_response(dict(base_env, DATABASE_URL=f"sqlite:///{fresh}"), args.port))
+
+    report = {name: summary(samples) for name, samples in results.items() if samples}
+    for name, r in report.items():
+        print(f"{name:>28}: median {r['median_ms']:>8.1f} ms  min {r['min_ms']:>8.1f}  max {r['max_ms']:>8.1f}", file=sys.stderr)
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,243 @@
+# Load-testing and latency benchmark suite for the FastAPI app.
+#
+# Seeds a fresh SQLite database and a product image, drives every endpoint (releasing a
+# reservation aside, which needs one made first) at fixed concurrency levels and
+# reports throughput and p50/p95/p99 latency as JSON. Runs in-process through httpx's
+# ASGI transport by default, or against a uvicorn server with --server.
+#
+#   python benchmarks/suite.py --products 10000 --orders 50000 --concurrency 1 10 50
+#   python benchmarks/suite.py --save-baseline benchmarks/baseline.json
+#   python benchmarks/suite.py --baseline benchmarks/baseline.json --tolerance 0.25
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+
+IMAGE = "product.jpg"
+ORDER = {"quantity": 1, "customer_name": "Bench", "customer_email": "bench@example.com", "shipping_address": "1 Bench Street"}
+
+def scenarios(products: int):
+    # name -> function(rng) returning (method, path, params, json body)
+    import assets
+    script = assets.pipeline.url("script.js")
+    return {
+        "page_index": lambda rng: ("GET", "/", None, None),
+        "page_products": lambda rng: ("GET", "/products", None, None),
+        "page_order": lambda rng: ("GET", "/order", None, None),
+        "page_contact": lambda rng: ("GET", "/contact", None, None),
+        "static_script": lambda rng: ("GET", script, None, None),
+        "products_list": lambda rng: ("GET", "/api/products", {"skip": 0, "limit": 100}, None),
+        "products_offset": lambda rng: ("GET", "/api/products", {"skip": rng.randrange(products), "limit": 20}, None),
+        "products_ids": lambda rng: ("GET", "/api/products", {"ids": ",".join(str(rng.randrange(1, products + 1)) for _ in range(10))}, None),
+        "products_search": lambda rng: ("GET", "/api/products/search", {"q": rng.choice(["shirt", "jack", "wool scarf"])}, None),
+        "product_get": lambda rng: ("GET", f"/api/products/{rng.randrange(1, products + 1)}", None, None),
+        "product_stock": lambda rng: ("GET", f"/api/products/{rng.randrange(1, products + 1)}/stock", None, None),
+        "product_orders": lambda rng: ("GET", f"/api/products/{rng.randrange(1, products + 1)}/orders", {"limit": 20}, None),
+        "customer_orders": lambda rng: ("GET", "/api/orders/by-customer", {"email": ORDER["customer_email"], "limit": 20}, None),
+        "stats_product": lambda rng: ("GET", f"/api/stats/products/{rng.randrange(1, products + 1)}", None, None),
+        "stats_daily": lambda rng: ("GET", "/api/stats/daily", None, None),
+        "reservations_create": lambda rng: ("POST", "/api/reservations", None, {"product_id": rng.randrange(1, products + 1), "quantity": 1}),
+        "image_original": lambda rng: ("GET", f"/images/{IMAGE}", None, None),
+        # The first request renders the variant, the rest are disk cache hits
+        "image_resized": lambda rng: ("GET", f"/images/{IMAGE}", {"w": 320}, None),
+        "metrics": lambda rng: ("GET", "/metrics", None, None),
+        "orders_create": lambda rng: ("POST", "/api/orders", None, {"product_id": rng.randrange(1, products + 1), **ORDER}),
+        "orders_checkout": lambda rng: ("POST", "/api/orders/checkout", None, {
+            **{k: v for k, v in ORDER.items() if k != "quantity"},
+            "items": [{"product_id": rng.randrange(1, products + 1), "quantity": 1} for _ in range(5)]}),
+        "orders_bulk": lambda rng: ("POST", "/api/orders/bulk", None, [{"product_id": rng.randrange(1, products + 1), **ORDER} for _ in range(100)]),
+        "orders_list": lambda rng: ("GET", "/api/orders", {"cursor": "", "limit": 100}, None),
+        "orders_export": lambda rng: ("GET", "/api/orders/export", {"since_id": 0}, None),
+    }
+
+def seed(url: str, products: int, orders: int):
+    from sqlalchemy import create_engine, insert
+    import models, search
+    engine = create_engine(url)
+    models.Base.metadata.create_all(bind=engine)
+    search.ensure_index(engine)
+    rng = random.Random(1)
+    words = ["linen", "denim", "wool", "cotton", "shirt", "jacket", "scarf", "dress", "hoodie", "coat"]
+    with engine.begin() as conn:
+        for start in range(0, products, 50000):
+            conn.execute(insert(models.Product), [
+                {"name": f"{rng.choice(words)} {rng.choice(words)} {i}", "description": " ".join(rng.sample(words, 3)), "price": round(rng.uniform(5, 500), 2)}
+                for i in range(start, min(start + 50000, products))
+            ])
+        for start in range(0, orders, 50000):
+            conn.execute(insert(models.Order), [
+                {"product_id": rng.randrange(1, products + 1), "unit_price": 9.99, **ORDER}
+                for _ in range(start, min(start + 50000, orders))
+            ])
+    engine.dispose()
+
+def seed_image(directory: str):
+    # A photo-sized JPEG of noise, so resizing costs what it would for a real product shot
+    from PIL import Image
+    os.makedirs(directory, exist_ok=True)
+    Image.effect_noise((1600, 1200), 60).convert("RGB").save(os.path.join(directory, IMAGE), quality=90)
+
+def percentile(sorted_samples, q: float):
+    index = min(len(sorted_samples) - 1, int(round(q * (len(sorted_samples) - 1))))
+    return sorted_samples[index]
+
+async def run_scenario(client, make_request, concurrency: int, duration: float, seed_value: int):
+    latencies, errors = [], 0
+    deadline = time.perf_counter() + duration
+
+    async def worker(n):
+        nonlocal errors
+        rng = random.Random(seed_value * 1000 + n)
+        while time.perf_counter() < deadline:
+            method, path, params, body = make_request(rng)
+            started = time.perf_counter()
+            try:
+                response = await client.request(method, path, params=params, json=body)
+                await response.aread()
+                if response.status_code >= 400:
+                    errors += 1
+            except httpx.HTTPError:
+                errors += 1
+            latencies.append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(n) for n in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput_rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 0.50), 3),
+        "p95_ms": round(percentile(latencies, 0.95), 3),
+        "p99_ms": round(percentile(latencies, 0.99), 3),
+        "mean_ms": round(statistics.fmean(latencies), 3),
+    }
+
+async def run_suite(client, selected, concurrency_levels, duration: float, products: int):
+    results = {}
+    all_scenarios = scenarios(products)
+    for name in selected:
+        for concurrency in concurrency_levels:
+            key = f"{name}@{concurrency}"
+            results[key] = await run_scenario(client, all_scenarios[name], concurrency, duration, concurrency)
+            print(f"{key:>28}: {results[key]['throughput_rps']:>9.1f} req/s  p50 {results[key]['p50_ms']:>8.2f}  "
+                  f"p95 {results[key]['p95_ms']:>8.2f}  p99 {results[key]['p99_ms']:>8.2f} ms  errors {results[key]['errors']}",
+                  file=sys.stderr)
+    return results
+
+def compare(results, baseline, tolerance: float):
+    # A scenario regresses when p99 grows or throughput drops by more than `tolerance`
+    failures = []
+    for key, base in baseline.items():
+        current = results.get(key)
+        if current is None:
+            continue
+        if current["p99_ms"] > base["p99_ms"] * (1 + tolerance):
+            failures.append(f"{key}: p99 {current['p99_ms']}ms > baseline {base['p99_ms']}ms")
+        if current["throughput_rps"] < base["throughput_rps"] * (1 - tolerance):
+            failures.append(f"{key}: throughput {current['throughput_rps']} < baseline {base['throughput_rps']}")
+        if current["errors"] > base["errors"]:
+            failures.append(f"{key}: {current['errors']} errors > baseline {base['errors']}")
+    return failures
+
+def start_server(port: int, env):
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "critical"],
+        cwd=ROOT, env=env,
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/api/orders", params={"limit": 1})
+            return proc
+        except httpx.TransportError:
+            time.sleep(0.1)
+    proc.kill()
+    raise RuntimeError("uvicorn did not start")
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--products", type=int, default=10000)
+    parser.add_argument("--orders", type=int, default=50000)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 10, 50])
+    parser.add_argument("--duration", type=float, default=3.0, help="seconds per scenario and concurrency level")
+    parser.add_argument("--scenarios", nargs="+", help="subset of scenario names (default: all)")
+    parser.add_argument("--server", action="store_true", help="run against uvicorn instead of in-process ASGI")
+    parser.add_argument("--port", type=int, default=8799)
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    parser.add_argument("--baseline", help="fail when results regress against this JSON report")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    parser.add_argument("--save-baseline", help="write the results as a new baseline")
+    args = parser.parse_args()
+
+    # Point the app at a throwaway database before main is imported
+    path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    os.environ["DATABASE_URL"] = f"sqlite:///{path}"
+    os.environ.setdefault("ASYNC_DATABASE_URL", f"sqlite+aiosqlite:///{path}")
+    os.environ["IMAGE_DIR"] = os.path.join(os.path.dirname(path), "images")
+    os.environ["IMAGE_CACHE_DIR"] = os.path.join(os.path.dirname(path), "image_cache")
+    seed_image(os.environ["IMAGE_DIR"])
+    os.chdir(ROOT)
+    seed(os.environ["DATABASE_URL"], args.products, args.orders)
+
+    selected = args.scenarios or list(scenarios(args.products))
+    proc = None
+    try:
+        if args.server:
+            proc = start_server(args.port, dict(os.environ))
+            client = httpx.AsyncClient(base_url=f"http://127.0.0.1:{args.port}", timeout=30,
+                                       limits=httpx.Limits(max_connections=max(args.concurrency)))
+        else:
+            from main import app
+            client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=30)
+
+        async def go():
+            async with client:
+                return await run_suite(client, selected, args.concurrency, args.duration, args.products)
+
+        results = asyncio.run(go())
+    finally:
+        if proc is not None:
+            proc.terminate()
+            try:
+                proc.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+
+    report = {
+        "config": {"products": args.products, "orders": args.orders, "concurrency": args.concurrency,
+                   "duration": args.duration, "mode": "server" if args.server else "asgi"},
+        "results": results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            f.write(text + "\n")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+        failures = compare(results, baseline, args.tolerance)
+        if failures:
+            print("Performance regression:\n  " + "\n  ".join(failures), file=sys.stderr)
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+# Throughput against worker count, through server.py (gunicorn when installed), with and
+# without the shared catalog cache tier.
+#
+#   python benchmarks/workers.py --workers 1 2 4 8 --concurrency 64 --duration 10
+#   python benchmarks/workers.py --workers 4 --scenarios products_offset --no-shared-cache
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+from suite import ROOT, run_scenario, scenarios, seed
+
+def start_server(workers: int, port: int, env):
+    proc = subprocess.Popen([sys.executable, "server.py", "--workers", str(workers)], cwd=ROOT,
+                            env=dict(env, PORT=str(port)), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/api/orders", params={"limit": 1})
+            return proc
+        except httpx.TransportError:
+            time.sleep(0.2)
+    proc.kill()
+    raise RuntimeError("server did not start")
+
+def stop_server(proc):
+    proc.terminate()
+    try:
+        proc.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+
+def cache_hits(port: int):
+    # /metrics is per worker; sample it a few times to see more than one process
+    totals = {}
+    for _ in range(8):
+        for line in httpx.get(f"http://127.0.0.1:{port}/metrics").text.splitlines():
+            if line.startswith(("cache_hits_total", "cache_shared_hits_total", "cache_misses_total")):
+                name, value = line.rsplit(" ", 1)
+                totals[name] = max(totals.get(name, 0), float(value))
+    return totals
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--products", type=int, default=10000)
+    parser.add_argument("--orders", type=int, default=10000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--duration", type=float, default=5.0)
+    parser.add_argument("--scenarios", nargs="+", default=["products_list", "products_offset", "orders_create"])
+    parser.add_argument("--no-shared-cache", action="store_true")
+    parser.add_argument("--port", type=int, default=8798)
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    env = dict(os.environ, DATABASE_URL=f"sqlite:///{path}", ASYNC_DATABASE_URL=f"sqlite+aiosqlite:///{path}")
+    # Throughput per worker count, not shedding
+    env.setdefault("ADMISSION_CONTROL", "0")
+    if args.no_shared_cache:
+        env["CATALOG_SHARED_CACHE"] = ""
+    seed(env["DATABASE_URL"], args.products, args.orders)
+    all_scenarios = scenarios(args.products)
+
+    report = {}
+    for workers in args.workers:
+        proc = start_server(workers, args.port, env)
+        try:
+            async def go():
+                limits = httpx.Limits(max_connections=args.concurrency)
+                async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{args.port}", timeout=30, limits=limits) as client:
+                    return {name: await run_scenario(client, all_scenarios[name], args.concurrency, args.duration, 1)
+                            for name in args.scenarios}
+
+            results = asyncio.run(go())
+            results["cache"] = cache_hits(args.port)
+        finally:
+            stop_server(proc)
+        report[workers] = results
+        for name in args.scenarios:
+            r = results[name]
+            print(f"workers {workers:>2} {name:>16}: {r['throughput_rps']:>9.1f} req/s  p50 {r['p50_ms']:>8.2f}  "
+                  f"p99 {r['p99_ms']:>8.2f} ms  errors {r['errors']}", file=sys.stderr)
+    print(json.dumps({"config": vars(args), "results": report}, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+# Sustained orders/s with per-request commits vs the write-behind group-commit queue.
+# Each client thread places orders back to back, like concurrent checkouts.
+#
+#   python benchmarks/write_behind.py --clients 50 --seconds 5
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from sqlalchemy.orm import sessionmaker
+
+import crud, database, models, order_queue, schemas
+
+PRICE = 9.99
+ORDER = schemas.OrderCreate(product_id=1, quantity=1, customer_name="Bench", customer_email="bench@example.com", shipping_address="1 Bench Street")
+
+def run(mode: str, clients: int, seconds: float, batch_size: int, wait_ms: float):
+    path = os.path.join(tempfile.mkdtemp(), "orders.db")
+    engine = database.create_db_engine(f"sqlite:///{path}")
+    models.Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine)
+    with Session() as db:
+        crud.create_product(db, schemas.ProductCreate(name="Bench", price=PRICE))
+    writer = order_queue.OrderWriter(Session, batch_size=batch_size, max_wait_ms=wait_ms)
+    placed = [0] * clients
+    stop = time.monotonic() + seconds
+
+    def client(n):
+        with Session() as db:
+            while time.monotonic() < stop:
+                if mode == "write-behind":
+                    writer.submit(ORDER, PRICE).result(timeout=60)
+                else:
+                    crud.create_order(db, ORDER, PRICE)
+                placed[n] += 1
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    writer.stop()
+    engine.dispose()
+    return sum(placed) / seconds
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clients", type=int, default=50)
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--wait-ms", type=float, default=5)
+    args = parser.parse_args()
+
+    for mode in ("per-request", "write-behind"):
+        rate = run(mode, args.clients, args.seconds, args.batch_size, args.wait_ms)
+        print(f"{mode:>13}: {rate:>8.0f} orders/s")
+
+if __name__ == "__main__":
+    main()
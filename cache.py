@@ -0,0 +1,231 @@
+import asyncio
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+import metrics, shared_cache
+
+CATALOG_CACHE_SIZE = int(os.environ.get("CATALOG_CACHE_SIZE", "1024"))
+CATALOG_CACHE_TTL = float(os.environ.get("CATALOG_CACHE_TTL", "60"))
+CATALOG_PAGE_CACHE_SIZE = int(os.environ.get("CATALOG_PAGE_CACHE_SIZE", "256"))
+# Cross-worker second tier, see shared_cache.py. server.py turns it on when running several workers.
+CATALOG_SHARED_CACHE = os.environ.get("CATALOG_SHARED_CACHE", "")
+# How often a worker checks for invalidations made by other workers
+CATALOG_CACHE_SYNC_MS = float(os.environ.get("CATALOG_CACHE_SYNC_MS", "500"))
+# Concurrent misses on one key share a single load instead of each querying the database
+CATALOG_SINGLE_FLIGHT = os.environ.get("CATALOG_SINGLE_FLIGHT", "1") == "1"
+
+_MISSING = object()
+
+class TTLCache:
+    # Bounded LRU cache whose entries also expire after `ttl` seconds.
+    # `version` is bumped on every invalidation; a loader that started before an
+    # invalidation does not store its (possibly stale) result.
+    # With a `shared` store, local misses fall through to it and sets write through.
+    # `generation` counts invalidations across all workers sharing the store.
+    # `invalidated_at` is the wall-clock time of the last invalidation seen here, this worker's or
+    # another's, and of construction, since other workers may have written before this one started.
+    # With `single_flight`, get_or_load callers that miss while a load for the same key is
+    # running wait for that load's result (threads and coroutines alike).
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 60.0, clock=time.monotonic, shared=None, name: str = "cache",
+                 sync_interval: float = CATALOG_CACHE_SYNC_MS / 1000, single_flight: bool = CATALOG_SINGLE_FLIGHT):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self.shared = shared
+        self.name = name
+        self.sync_interval = sync_interval
+        self.single_flight = single_flight
+        self.version = 0
+        self.invalidated_at = time.time()
+        self.generation = shared.generation(name) if shared is not None else 0
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self._synced_at = clock()
+        self._data = OrderedDict()
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    def sync(self):
+        # Drop local entries once another worker has invalidated the shared namespace
+        if self.shared is None or self.clock() - self._synced_at < self.sync_interval:
+            return
+        self._synced_at = self.clock()
+        generation = self.shared.generation(self.name)
+        with self._lock:
+            if generation != self.generation:
+                self.generation = generation
+                self.version += 1
+                self.invalidated_at = time.time()
+                self._data.clear()
+                self._inflight.clear()
+
+    def _shared_key(self, key, generation: int) -> str:
+        return f"{self.name}:{generation}:{key!r}"
+
+    def get(self, key, default=None):
+        self.sync()
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is not _MISSING:
+                expires_at, value = entry
+                if expires_at > self.clock():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            version, generation = self.version, self.generation
+        if self.shared is not None:
+            value = self.shared.get(self._shared_key(key, generation))
+            if value is not None:
+                self._set_local(key, value, version)
+                with self._lock:
+                    self.shared_hits += 1
+                return value
+        with self._lock:
+            self.misses += 1
+        return default
+
+    def get_many(self, keys):
+        # {key: value} for the keys that are cached; the rest are left out
+        found = {}
+        for key in keys:
+            value = self.get(key, _MISSING)
+            if value is not _MISSING:
+                found[key] = value
+        return found
+
+    def set(self, key, value, version: int | None = None):
+        generation = self.generation
+        if self._set_local(key, value, version) and self.shared is not None:
+            self.shared.set(self._shared_key(key, generation), value, self.ttl)
+
+    def _set_local(self, key, value, version: int | None) -> bool:
+        with self._lock:
+            if version is not None and version != self.version:
+                return False
+            self._data[key] = (self.clock() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+            return True
+
+    def _join(self, key):
+        # Returns (future, version); version is None when another caller owns the load
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[0] > self.clock():
+                # Landed between our miss and now
+                future = Future()
+                future.set_result(entry[1])
+                return future, None
+            future = self._inflight.get(key) if self.single_flight else None
+            if future is not None:
+                self.coalesced += 1
+                return future, None
+            future = Future()
+            if self.single_flight:
+                self._inflight[key] = future
+            return future, self.version
+
+    def _land(self, key, future, version, value=None, error=None):
+        # Store before leaving the in-flight table so no new caller can miss both
+        if error is None and value is not None:
+            self.set(key, value, version=version)
+        with self._lock:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+        if error is None:
+            future.set_result(value)
+        else:
+            future.set_exception(error)
+
+    def get_or_load(self, key, loader):
+        value = self.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+        future, version = self._join(key)
+        if version is None:
+            return future.result()
+        try:
+            value = loader()
+        except Exception as e:
+            self._land(key, future, version, error=e)
+            raise
+        self._land(key, future, version, value)
+        return value
+
+    async def get_or_load_async(self, key, loader):
+        # `loader` is a coroutine function
+        value = self.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+        future, version = self._join(key)
+        if version is None:
+            return await asyncio.wrap_future(future)
+        try:
+            value = await loader()
+        except BaseException as e:
+            # Including cancellation, so waiters are never left hanging
+            self._land(key, future, version, error=e)
+            raise
+        self._land(key, future, version, value)
+        return value
+
+    def invalidate(self, predicate=None):
+        # Drop every entry, or only the keys matching `predicate`. Other workers drop
+        # their whole namespace on their next sync.
+        generation = self.shared.bump(self.name) if self.shared is not None else self.generation + 1
+        with self._lock:
+            self.version += 1
+            self.invalidated_at = time.time()
+            self.generation = generation
+            # Loads already running may return pre-invalidation data; later callers start afresh
+            self._inflight.clear()
+            if predicate is None:
+                self._data.clear()
+            else:
+                for key in [k for k in self._data if predicate(k)]:
+                    del self._data[key]
+
+    def stats(self):
+        with self._lock:
+            return {"size": len(self._data), "hits": self.hits, "shared_hits": self.shared_hits, "misses": self.misses,
+                    "coalesced": self.coalesced, "evictions": self.evictions}
+
+    def __len__(self):
+        return len(self._data)
+
+shared_store = shared_cache.open_store(CATALOG_SHARED_CACHE)
+
+catalog_cache = TTLCache(maxsize=CATALOG_CACHE_SIZE, ttl=CATALOG_CACHE_TTL, shared=shared_store, name="catalog")
+
+# Encoded JSON bodies of catalog pages with their ETags, keyed by catalog version so a
+# write makes every older page unreachable; those entries age out through LRU.
+page_cache = TTLCache(maxsize=CATALOG_PAGE_CACHE_SIZE, ttl=CATALOG_CACHE_TTL, shared=shared_store, name="page")
+
+def catalog_version() -> int:
+    # The generation, not the local version, so every worker builds the same page keys
+    catalog_cache.sync()
+    return catalog_cache.generation
+
+def invalidate_product(product_id: int):
+    # A product write changes its own entry and any page that may list it
+    catalog_cache.invalidate(lambda key: key[0] == "products" or key == ("product", product_id))
+
+def _cache_stats(field: str):
+    return lambda: {(name,): c.stats()[field] for name, c in (("catalog", catalog_cache), ("page", page_cache))}
+
+metrics.register_gauge("cache_entries", "Entries held by each in-process cache.", ("cache",), _cache_stats("size"))
+metrics.register_gauge("cache_hits_total", "Cache lookups served from memory.", ("cache",), _cache_stats("hits"), kind="counter")
+metrics.register_gauge("cache_shared_hits_total", "Local misses served by the cross-worker cache.", ("cache",), _cache_stats("shared_hits"), kind="counter")
+metrics.register_gauge("cache_misses_total", "Cache lookups that went to the database.", ("cache",), _cache_stats("misses"), kind="counter")
+metrics.register_gauge("cache_coalesced_total", "Misses that waited for a load already in flight instead of querying.", ("cache",), _cache_stats("coalesced"), kind="counter")
+metrics.register_gauge("cache_evictions_total", "Entries evicted by the LRU bound.", ("cache",), _cache_stats("evictions"), kind="counter")
@@ -0,0 +1,52 @@
+from fastapi import HTTPException, Request
+from pydantic import TypeAdapter
+
+import cache, compact, etag, pagination, schemas
+
+product_list_adapter = TypeAdapter(list[schemas.Product])
+
+MAX_LOOKUP_IDS = 100
+
+def parse_ids(ids: str) -> list[int]:
+    # ?ids=1,2,3 in request order, duplicates dropped
+    try:
+        parsed = list(dict.fromkeys(int(part) for part in ids.split(",") if part.strip()))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="ids must be a comma-separated list of integers")
+    if not parsed:
+        raise HTTPException(status_code=400, detail="ids must not be empty")
+    if len(parsed) > MAX_LOOKUP_IDS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_LOOKUP_IDS} ids per lookup")
+    return parsed
+
+def split_cached(product_ids):
+    # Cached products by id, the ids still to load, and the cache version to store them under
+    version = cache.catalog_cache.version
+    found = {key[1]: value for key, value in cache.catalog_cache.get_many([("product", i) for i in product_ids]).items()}
+    return found, [i for i in product_ids if i not in found], version
+
+def fill_cached(found, db_products, version):
+    for db_product in db_products:
+        product = found[db_product.id] = schemas.Product.model_validate(db_product)
+        cache.catalog_cache.set(("product", product.id), product, version=version)
+
+# Shared by the sync and async product listings: pages are cached as encoded JSON
+# per catalog version and served with a strong ETag.
+def page_key(skip: int, limit: int, cursor: str | None, after_id: int | None, fields=None, format: str = "objects"):
+    return (cache.catalog_version(), skip if cursor is None else None, limit, cursor is not None, after_id, fields, format)
+
+def encode_page(products, limit: int, cursor: str | None, fields=None, format: str = "objects"):
+    if fields is not None:
+        if cursor is None:
+            body = compact.dumps(compact.shape(products, fields, format))
+        else:
+            body = compact.dumps(compact.page(products, fields, format, pagination.next_cursor(products, limit)))
+    elif cursor is None:
+        body = product_list_adapter.dump_json(products)
+    else:
+        page = schemas.ProductPage(items=products, next_cursor=pagination.next_cursor(products, limit))
+        body = page.model_dump_json().encode()
+    return body, etag.make_etag(body)
+
+def page_response(request: Request, body: bytes, tag: str):
+    return etag.cached_response(request, body, tag, "application/json", {"Cache-Control": "no-cache"})
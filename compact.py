@@ -0,0 +1,55 @@
+import json
+
+from fastapi import HTTPException, Response
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Field selection and compact encodings for list endpoints.
+#   ?fields=id,name,price   only these keys per item
+#   ?format=compact         {"fields": [...], "rows": [[...], ...]}, keys sent once
+# Selected payloads are plain lists and dicts, encoded with orjson when it is installed.
+FORMATS = ("objects", "compact")
+
+def _default(value):
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+def dumps(value) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(value)
+    return json.dumps(value, separators=(",", ":"), default=_default).encode()
+
+class ORJSONResponse(Response):
+    media_type = "application/json"
+
+    def render(self, content) -> bytes:
+        return dumps(content)
+
+def parse(fields: str | None, format: str, schema):
+    # Returns the selected field names, or None when the full default encoding applies
+    if format not in FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported format, use one of: {', '.join(FORMATS)}")
+    if fields is None:
+        return tuple(schema.model_fields) if format == "compact" else None
+    names = tuple(dict.fromkeys(name.strip() for name in fields.split(",") if name.strip()))
+    unknown = [name for name in names if name not in schema.model_fields]
+    if not names or unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown) or fields!r}; "
+                                                     f"available: {', '.join(schema.model_fields)}")
+    return names
+
+def shape(items, fields, format: str):
+    if format == "compact":
+        return {"fields": list(fields), "rows": [[getattr(item, name) for name in fields] for item in items]}
+    return [{name: getattr(item, name) for name in fields} for item in items]
+
+def page(items, fields, format: str, next_cursor: str | None):
+    # Cursor-mode envelope: the items sit beside next_cursor as in ProductPage/OrderPage
+    body = shape(items, fields, format)
+    if format == "compact":
+        return {**body, "next_cursor": next_cursor}
+    return {"items": body, "next_cursor": next_cursor}
@@ -0,0 +1,109 @@
+import os
+import zlib
+
+from starlette.datastructures import Headers, MutableHeaders
+
+import etag
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# On-the-fly gzip/brotli for dynamic responses (JSON, NDJSON, CSV). Bodies below
+# COMPRESS_MIN_BYTES go out as they are, since compressing them costs more than it saves.
+# Responses that already carry a Content-Encoding, like the precompressed pages and
+# assets, pass through untouched, as do byte ranges: Content-Range counts identity bytes, so a
+# compressed 206 would be corrupt. Streaming bodies are flushed chunk by chunk.
+COMPRESS_MIN_BYTES = int(os.environ.get("COMPRESS_MIN_BYTES", "1024"))
+GZIP_LEVEL = int(os.environ.get("GZIP_LEVEL", "5"))
+BROTLI_QUALITY = int(os.environ.get("BROTLI_QUALITY", "4"))
+
+COMPRESSIBLE_TYPES = ("application/json", "application/x-ndjson", "text/")
+AVAILABLE = ("br", "gzip") if brotli is not None else ("gzip",)
+
+class _Gzip:
+
+    def __init__(self):
+        self._z = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+
+    def chunk(self, data: bytes) -> bytes:
+        return self._z.compress(data) + self._z.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self, data: bytes) -> bytes:
+        return self._z.compress(data) + self._z.flush()
+
+class _Brotli:
+
+    def __init__(self):
+        self._c = brotli.Compressor(quality=BROTLI_QUALITY)
+
+    def chunk(self, data: bytes) -> bytes:
+        return self._c.process(data) + self._c.flush()
+
+    def finish(self, data: bytes) -> bytes:
+        return self._c.process(data) + self._c.finish()
+
+def _compressible(start) -> bool:
+    headers = Headers(raw=start["headers"])
+    if start["status"] in (204, 206, 304) or "content-encoding" in headers or "content-range" in headers:
+        return False
+    return headers.get("content-type", "").startswith(COMPRESSIBLE_TYPES)
+
+class CompressionMiddleware:
+
+    def __init__(self, app, minimum_size: int = COMPRESS_MIN_BYTES):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        request_headers = Headers(scope=scope)
+        coding = etag.choose_encoding(request_headers.get("accept-encoding", ""), AVAILABLE)
+        if coding == "identity" or "range" in request_headers:
+            await self.app(scope, receive, send)
+            return
+
+        start = None
+        compressor = None
+        passthrough = False
+
+        async def send_wrapper(message):
+            nonlocal start, compressor, passthrough
+            if message["type"] == "http.response.start":
+                start = message
+                return
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+            body = message.get("body", b"")
+            more = message.get("more_body", False)
+            if compressor is None:
+                # The first body chunk decides
+                if not _compressible(start) or (not more and len(body) < self.minimum_size):
+                    passthrough = True
+                    await send(start)
+                    await send(message)
+                    return
+                compressor = _Brotli() if coding == "br" else _Gzip()
+                headers = MutableHeaders(raw=start["headers"])
+                headers["Content-Encoding"] = coding
+                headers.add_vary_header("Accept-Encoding")
+                # The bytes differ from the identity variant, so a strong ETag becomes weak
+                if "etag" in headers and not headers["etag"].startswith("W/"):
+                    headers["ETag"] = "W/" + headers["etag"]
+                if more:
+                    del headers["Content-Length"]
+                else:
+                    body = compressor.finish(body)
+                    headers["Content-Length"] = str(len(body))
+                    await send(start)
+                    await send({"type": "http.response.body", "body": body})
+                    return
+                await send(start)
+            data = compressor.chunk(body) if more else compressor.finish(body)
+            await send({"type": "http.response.body", "body": data, "more_body": more})
+
+        await self.app(scope, receive, send_wrapper)
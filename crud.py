@@ -1,26 +1,126 @@
+from sqlalchemy import insert, select
 from sqlalchemy.orm import Session
 
-import models, schemas
+import cache, catalog, models, schemas, stats
 
 def get_product(db: Session, product_id: int):
     return db.query(models.Product).filter(models.Product.id == product_id).first()
 
-def get_products(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(models.Product).offset(skip).limit(limit).all()
+def get_products(db: Session, skip: int = 0, limit: int = 100, after_id: int | None = None):
+    query = db.query(models.Product).order_by(models.Product.id)
+    # Keyset pagination seeks on the primary key instead of scanning past skip rows
+    if after_id is not None:
+        return query.filter(models.Product.id > after_id).limit(limit).all()
+    return query.offset(skip).limit(limit).all()
+
+# Read-through catalog cache. Entries are detached schema snapshots, never live ORM rows.
+def get_cached_product(db: Session, product_id: int):
+    def load():
+        db_product = get_product(db, product_id)
+        return schemas.Product.model_validate(db_product) if db_product is not None else None
+    return cache.catalog_cache.get_or_load(("product", product_id), load)
+
+def get_cached_products(db: Session, skip: int = 0, limit: int = 100, after_id: int | None = None):
+    def load():
+        return tuple(schemas.Product.model_validate(p) for p in get_products(db, skip=skip, limit=limit, after_id=after_id))
+    return list(cache.catalog_cache.get_or_load(("products", skip, limit, after_id), load))
+
+def get_products_by_ids(db: Session, product_ids):
+    # One IN query; unknown ids are simply absent from the result
+    ids = set(product_ids)
+    if not ids:
+        return []
+    return db.query(models.Product).filter(models.Product.id.in_(ids)).order_by(models.Product.id).all()
+
+def get_cached_products_by_ids(db: Session, product_ids: list[int]):
+    # Per-product cache entries first, one IN query for the misses; results follow the requested order
+    found, missing, version = catalog.split_cached(product_ids)
+    if missing:
+        catalog.fill_cached(found, get_products_by_ids(db, missing), version)
+    return [found[i] for i in product_ids if i in found]
 
 def create_product(db: Session, product: schemas.ProductCreate):
     db_product = models.Product(name=product.name, description=product.description, price=product.price, image_url=product.image_url)
     db.add(db_product)
     db.commit()
     db.refresh(db_product)
+    cache.invalidate_product(db_product.id)
     return db_product
 
-def create_order(db: Session, order: schemas.OrderCreate):
-    db_order = models.Order(product_id=order.product_id, quantity=order.quantity, customer_name=order.customer_name, customer_email=order.customer_email, shipping_address=order.shipping_address)
+def create_order(db: Session, order: schemas.OrderCreate, unit_price: float | None = None):
+    if unit_price is None:
+        unit_price = get_product_prices(db, [order.product_id])[order.product_id]
+    db_order = models.Order(product_id=order.product_id, quantity=order.quantity, unit_price=unit_price, customer_name=order.customer_name, customer_email=order.customer_email, shipping_address=order.shipping_address)
     db.add(db_order)
+    db.flush()
+    stats.record_sales(db, [(db_order.product_id, db_order.quantity, db_order.unit_price, db_order.created_at)])
     db.commit()
     db.refresh(db_order)
     return db_order
 
-def get_orders(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(models.Order).offset(skip).limit(limit).all()
+def get_product_prices(db: Session, product_ids):
+    # {product_id: price} for the ids that exist, in one IN query
+    ids = set(product_ids)
+    if not ids:
+        return {}
+    rows = db.query(models.Product.id, models.Product.price).filter(models.Product.id.in_(ids)).all()
+    return {row.id: row.price for row in rows}
+
+def create_orders_bulk(db: Session, orders: list[schemas.OrderCreate], unit_prices: list[float] | None = None):
+    # One executemany INSERT and a single commit for the whole batch; ids come back in input order
+    if not orders:
+        return []
+    if unit_prices is None:
+        prices = get_product_prices(db, [order.product_id for order in orders])
+        unit_prices = [prices[order.product_id] for order in orders]
+    inserted = insert_orders(db, orders, unit_prices)
+    db.commit()
+    return [row.id for row in inserted]
+
+def insert_orders(db: Session, orders: list[schemas.OrderCreate], unit_prices: list[float]):
+    # Rows of (id, created_at) in input order; the caller commits
+    stmt = insert(models.Order).returning(models.Order.id, models.Order.created_at, sort_by_parameter_order=True)
+    rows = [dict(order.model_dump(exclude={"reservation_id"}), unit_price=price) for order, price in zip(orders, unit_prices)]
+    inserted = db.execute(stmt, rows).all()
+    stats.record_sales(db, [(order.product_id, order.quantity, price, row.created_at)
+                            for order, price, row in zip(orders, unit_prices, inserted)])
+    return inserted
+
+def create_checkout(db: Session, orders: list[schemas.OrderCreate], unit_prices: list[float]):
+    # Every line of a cart in one INSERT and one commit
+    inserted = insert_orders(db, orders, unit_prices)
+    db.commit()
+    return [schemas.Order(id=row.id, created_at=row.created_at, unit_price=price, **order.model_dump(exclude={"reservation_id"}))
+            for order, price, row in zip(orders, unit_prices, inserted)]
+
+def get_orders(db: Session, skip: int = 0, limit: int = 100, after_id: int | None = None):
+    query = db.query(models.Order).order_by(models.Order.id)
+    if after_id is not None:
+        return query.filter(models.Order.id > after_id).limit(limit).all()
+    return query.offset(skip).limit(limit).all()
+
+def get_orders_for_product(db: Session, product_id: int, limit: int = 100, after_id: int | None = None):
+    # Served by ix_orders_product_id_id: an index range scan, no table scan
+    query = db.query(models.Order).filter(models.Order.product_id == product_id)
+    if after_id is not None:
+        query = query.filter(models.Order.id > after_id)
+    return query.order_by(models.Order.id).limit(limit).all()
+
+def get_orders_for_customer(db: Session, customer_email: str, limit: int = 100, after_id: int | None = None):
+    # Served by ix_orders_customer_email_id
+    query = db.query(models.Order).filter(models.Order.customer_email == customer_email)
+    if after_id is not None:
+        query = query.filter(models.Order.id > after_id)
+    return query.order_by(models.Order.id).limit(limit).all()
+
+def iter_orders(db: Session, since_id: int | None = None, since=None, batch_size: int = 1000):
+    # Plain rows streamed from a server-side cursor in batches; nothing is kept in the identity map
+    table = models.Order.__table__
+    stmt = select(table).order_by(table.c.id)
+    if since_id is not None:
+        stmt = stmt.where(table.c.id > since_id)
+    if since is not None:
+        stmt = stmt.where(table.c.created_at >= since)
+    result = db.execute(stmt.execution_options(stream_results=True, yield_per=batch_size))
+    for partition in result.partitions():
+        yield partition
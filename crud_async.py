@@ -0,0 +1,110 @@
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import cache, catalog, models, schemas, stats
+
+# Async counterparts of crud.py for DATABASE_MODE=async
+
+async def get_product(db: AsyncSession, product_id: int):
+    return await db.scalar(select(models.Product).where(models.Product.id == product_id))
+
+async def get_products(db: AsyncSession, skip: int = 0, limit: int = 100, after_id: int | None = None):
+    stmt = select(models.Product).order_by(models.Product.id)
+    if after_id is not None:
+        stmt = stmt.where(models.Product.id > after_id)
+    else:
+        stmt = stmt.offset(skip)
+    return (await db.scalars(stmt.limit(limit))).all()
+
+async def get_cached_product(db: AsyncSession, product_id: int):
+    async def load():
+        db_product = await get_product(db, product_id)
+        return schemas.Product.model_validate(db_product) if db_product is not None else None
+    return await cache.catalog_cache.get_or_load_async(("product", product_id), load)
+
+async def get_cached_products(db: AsyncSession, skip: int = 0, limit: int = 100, after_id: int | None = None):
+    async def load():
+        return tuple(schemas.Product.model_validate(p) for p in await get_products(db, skip=skip, limit=limit, after_id=after_id))
+    return list(await cache.catalog_cache.get_or_load_async(("products", skip, limit, after_id), load))
+
+async def get_products_by_ids(db: AsyncSession, product_ids):
+    ids = set(product_ids)
+    if not ids:
+        return []
+    return (await db.scalars(select(models.Product).where(models.Product.id.in_(ids)).order_by(models.Product.id))).all()
+
+async def get_cached_products_by_ids(db: AsyncSession, product_ids: list[int]):
+    found, missing, version = catalog.split_cached(product_ids)
+    if missing:
+        catalog.fill_cached(found, await get_products_by_ids(db, missing), version)
+    return [found[i] for i in product_ids if i in found]
+
+async def create_product(db: AsyncSession, product: schemas.ProductCreate):
+    db_product = models.Product(name=product.name, description=product.description, price=product.price, image_url=product.image_url)
+    db.add(db_product)
+    await db.commit()
+    await db.refresh(db_product)
+    cache.invalidate_product(db_product.id)
+    return db_product
+
+async def create_order(db: AsyncSession, order: schemas.OrderCreate, unit_price: float | None = None):
+    if unit_price is None:
+        unit_price = (await get_product_prices(db, [order.product_id]))[order.product_id]
+    db_order = models.Order(product_id=order.product_id, quantity=order.quantity, unit_price=unit_price, customer_name=order.customer_name, customer_email=order.customer_email, shipping_address=order.shipping_address)
+    db.add(db_order)
+    await db.flush()
+    await stats.record_sales_async(db, [(db_order.product_id, db_order.quantity, db_order.unit_price, db_order.created_at)])
+    await db.commit()
+    await db.refresh(db_order)
+    return db_order
+
+async def get_product_prices(db: AsyncSession, product_ids):
+    ids = set(product_ids)
+    if not ids:
+        return {}
+    rows = await db.execute(select(models.Product.id, models.Product.price).where(models.Product.id.in_(ids)))
+    return {row.id: row.price for row in rows}
+
+async def create_orders_bulk(db: AsyncSession, orders: list[schemas.OrderCreate], unit_prices: list[float] | None = None):
+    if not orders:
+        return []
+    if unit_prices is None:
+        prices = await get_product_prices(db, [order.product_id for order in orders])
+        unit_prices = [prices[order.product_id] for order in orders]
+    inserted = await insert_orders(db, orders, unit_prices)
+    await db.commit()
+    return [row.id for row in inserted]
+
+async def insert_orders(db: AsyncSession, orders: list[schemas.OrderCreate], unit_prices: list[float]):
+    stmt = insert(models.Order).returning(models.Order.id, models.Order.created_at, sort_by_parameter_order=True)
+    rows = [dict(order.model_dump(exclude={"reservation_id"}), unit_price=price) for order, price in zip(orders, unit_prices)]
+    inserted = (await db.execute(stmt, rows)).all()
+    await stats.record_sales_async(db, [(order.product_id, order.quantity, price, row.created_at)
+                                        for order, price, row in zip(orders, unit_prices, inserted)])
+    return inserted
+
+async def create_checkout(db: AsyncSession, orders: list[schemas.OrderCreate], unit_prices: list[float]):
+    inserted = await insert_orders(db, orders, unit_prices)
+    await db.commit()
+    return [schemas.Order(id=row.id, created_at=row.created_at, unit_price=price, **order.model_dump(exclude={"reservation_id"}))
+            for order, price, row in zip(orders, unit_prices, inserted)]
+
+async def get_orders_for_product(db: AsyncSession, product_id: int, limit: int = 100, after_id: int | None = None):
+    stmt = select(models.Order).where(models.Order.product_id == product_id)
+    if after_id is not None:
+        stmt = stmt.where(models.Order.id > after_id)
+    return (await db.scalars(stmt.order_by(models.Order.id).limit(limit))).all()
+
+async def get_orders_for_customer(db: AsyncSession, customer_email: str, limit: int = 100, after_id: int | None = None):
+    stmt = select(models.Order).where(models.Order.customer_email == customer_email)
+    if after_id is not None:
+        stmt = stmt.where(models.Order.id > after_id)
+    return (await db.scalars(stmt.order_by(models.Order.id).limit(limit))).all()
+
+async def get_orders(db: AsyncSession, skip: int = 0, limit: int = 100, after_id: int | None = None):
+    stmt = select(models.Order).order_by(models.Order.id)
+    if after_id is not None:
+        stmt = stmt.where(models.Order.id > after_id)
+    else:
+        stmt = stmt.offset(skip)
+    return (await db.scalars(stmt.limit(limit))).all()
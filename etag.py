@@ -0,0 +1,43 @@
+import hashlib
+
+from fastapi import Request, Response
+
+def make_etag(body: bytes) -> str:
+    return '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+def is_not_modified(request: Request, etag: str) -> bool:
+    return matches_if_none_match(request.headers.get("if-none-match"), etag)
+
+def matches_if_none_match(header: str | None, etag: str) -> bool:
+    # If-None-Match uses the weak comparison, so W/"x" matches "x"
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    candidates = {tag.strip().removeprefix("W/") for tag in header.split(",")}
+    return etag in candidates
+
+def choose_encoding(accept_encoding: str, available) -> str:
+    # Pick the best coding the client accepts, preferring br over gzip; q=0 excludes a coding
+    accepted = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[name.strip().lower()] = q
+    for coding in ("br", "gzip"):
+        q = accepted.get(coding, accepted.get("*", 0.0))
+        if coding in available and q > 0:
+            return coding
+    return "identity"
+
+def cached_response(request: Request, body: bytes, etag: str, media_type: str, headers: dict | None = None):
+    headers = {"ETag": etag, **(headers or {})}
+    if is_not_modified(request, etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type=media_type, headers=headers)
@@ -0,0 +1,41 @@
+import csv
+import io
+import json
+
+import crud
+from database import SessionLocal
+
+EXPORT_FORMATS = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+ORDER_FIELDS = ["id", "product_id", "quantity", "unit_price", "customer_name", "customer_email", "shipping_address", "created_at"]
+
+def _values(row):
+    mapping = row._mapping
+    return [mapping[f].isoformat() if hasattr(mapping[f], "isoformat") else mapping[f] for f in ORDER_FIELDS]
+
+def _ndjson(batches):
+    for rows in batches:
+        yield "".join(json.dumps(dict(zip(ORDER_FIELDS, _values(row)))) + "\n" for row in rows)
+
+def _csv(batches):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(ORDER_FIELDS)
+    for rows in batches:
+        writer.writerows(_values(row) for row in rows)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+# One chunk per fetched batch, so memory stays flat however many orders there are.
+# The session is opened here: FastAPI closes yield-dependencies before a streaming
+# body is sent, so get_db's session would already be gone.
+def export_orders(fmt: str, since_id: int | None = None, since=None, batch_size: int = 1000):
+    db = SessionLocal()
+    try:
+        batches = crud.iter_orders(db, since_id=since_id, since=since, batch_size=batch_size)
+        yield from (_csv(batches) if fmt == "csv" else _ndjson(batches))
+    finally:
+        db.close()
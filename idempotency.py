@@ -0,0 +1,132 @@
+import asyncio
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, TimeoutError
+
+from fastapi import HTTPException
+
+import cache, metrics
+
+# Idempotency-Key support for POST /api/orders. The first request with a key runs the write
+# path; repeats within IDEMPOTENCY_TTL get the stored result without touching the database,
+# and duplicates arriving while it runs wait for that one execution. Failed executions are
+# not stored, so a retry after an error runs again. The exception is an error carrying a
+# `pending` future (order_queue.CommitPending, a 504 from the write-behind queue): the order may
+# still be committed, so the key stays taken and resolves to that future's outcome.
+#
+# Keys live in a bounded in-process LRU. With the shared catalog tier enabled (several
+# workers), completed results are also written there so a retry landing on another worker
+# is answered too; only in-flight coalescing is per worker.
+IDEMPOTENCY_TTL = float(os.environ.get("IDEMPOTENCY_TTL", str(24 * 3600)))
+IDEMPOTENCY_MAX_KEYS = int(os.environ.get("IDEMPOTENCY_MAX_KEYS", "10000"))
+IDEMPOTENCY_WAIT_TIMEOUT = float(os.environ.get("IDEMPOTENCY_WAIT_TIMEOUT", "30"))
+MAX_KEY_LENGTH = 255
+
+requests_total = metrics.registry.register(metrics.Counter(
+    "idempotency_requests_total", "Requests carrying an Idempotency-Key, by outcome.", ("outcome",)))
+
+def fingerprint(payload) -> str:
+    # A key reused with a different body is a client bug, not a retry
+    return hashlib.sha256(payload.model_dump_json().encode()).hexdigest()
+
+class IdempotencyStore:
+
+    def __init__(self, maxsize: int = IDEMPOTENCY_MAX_KEYS, ttl: float = IDEMPOTENCY_TTL, clock=time.monotonic, shared=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self.shared = shared
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _claim(self, key: str, digest: str):
+        # Returns (future, outcome); outcome "new" means the caller must run the request
+        if len(key) > MAX_KEY_LENGTH:
+            raise HTTPException(status_code=400, detail=f"Idempotency-Key is longer than {MAX_KEY_LENGTH} characters")
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] <= self.clock():
+                del self._entries[key]
+                entry = None
+            if entry is None and self.shared is not None:
+                stored = self.shared.get(f"idempotency:{key}")
+                if stored is not None:
+                    future = Future()
+                    future.set_result(stored[1])
+                    entry = self._entries[key] = (self.clock() + self.ttl, stored[0], future)
+            if entry is not None:
+                _, stored_digest, future = entry
+                outcome = "conflict" if stored_digest != digest else "replayed" if future.done() else "coalesced"
+                requests_total.inc(outcome)
+                if outcome == "conflict":
+                    raise HTTPException(status_code=422, detail="Idempotency-Key was already used with a different request")
+                self._entries.move_to_end(key)
+                return future, outcome
+            future = Future()
+            self._entries[key] = (self.clock() + self.ttl, digest, future)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+            requests_total.inc("new")
+            return future, "new"
+
+    def _finish(self, key: str, digest: str, future: Future, result=None, error=None):
+        pending = getattr(error, "pending", None)
+        if pending is not None:
+            pending.add_done_callback(lambda done: self._settle(key, digest, future, done))
+            return
+        if error is not None:
+            with self._lock:
+                if self._entries.get(key, (None, None, None))[2] is future:
+                    del self._entries[key]
+            future.set_exception(error)
+            return
+        future.set_result(result)
+        if self.shared is not None:
+            self.shared.set(f"idempotency:{key}", (digest, result), self.ttl)
+
+    def _settle(self, key: str, digest: str, future: Future, done: Future):
+        try:
+            result = done.result()
+        except Exception as e:
+            self._finish(key, digest, future, error=e)
+            return
+        self._finish(key, digest, future, result)
+
+    def execute(self, key: str, digest: str, fn):
+        # Returns (result, replayed)
+        future, outcome = self._claim(key, digest)
+        if outcome == "new":
+            try:
+                result = fn()
+            except Exception as e:
+                self._finish(key, digest, future, error=e)
+                raise
+            self._finish(key, digest, future, result)
+            return result, False
+        try:
+            return future.result(timeout=IDEMPOTENCY_WAIT_TIMEOUT), True
+        except TimeoutError:
+            raise HTTPException(status_code=409, detail="A request with this Idempotency-Key is still in progress")
+
+    async def execute_async(self, key: str, digest: str, fn):
+        future, outcome = self._claim(key, digest)
+        if outcome == "new":
+            try:
+                result = await fn()
+            except Exception as e:
+                self._finish(key, digest, future, error=e)
+                raise
+            self._finish(key, digest, future, result)
+            return result, False
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), IDEMPOTENCY_WAIT_TIMEOUT), True
+        except asyncio.TimeoutError:
+            raise HTTPException(status_code=409, detail="A request with this Idempotency-Key is still in progress")
+
+    def __len__(self):
+        return len(self._entries)
+
+store = IdempotencyStore(shared=cache.shared_store)
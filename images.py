@@ -0,0 +1,243 @@
+import hashlib
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+
+from fastapi import HTTPException
+from starlette.responses import FileResponse, Response
+
+import etag, metrics
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = None
+
+# Product images from a local directory: an image_url of /images/shirt.jpg is IMAGE_DIR/shirt.jpg.
+# ?w= asks for a resized variant, snapped up to one of IMAGE_WIDTHS so clients cannot fill the
+# cache with every width, encoded as WebP or JPEG (?format=, else WebP when Accept allows it).
+# Variants are rendered in a process pool so resizing does not hold the GIL the request
+# threads share, and stored in IMAGE_CACHE_DIR under a hash of the source bytes and render
+# settings, so an edited original gets new files and old ones age out. Past
+# IMAGE_CACHE_MAX_BYTES the least recently served variants are deleted. Without Pillow the
+# original is served whatever the width.
+IMAGE_DIR = os.environ.get("IMAGE_DIR", "images")
+IMAGE_CACHE_DIR = os.environ.get("IMAGE_CACHE_DIR", "image_cache")
+IMAGE_CACHE_MAX_BYTES = int(os.environ.get("IMAGE_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+IMAGE_WIDTHS = tuple(sorted(int(width) for width in os.environ.get("IMAGE_WIDTHS", "160,320,640,1280").split(",")))
+IMAGE_QUALITY = int(os.environ.get("IMAGE_QUALITY", "80"))
+# Render processes; 0 renders in the request thread instead
+IMAGE_WORKERS = int(os.environ.get("IMAGE_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+SOURCE_TYPES = {".jpg": "image/jpeg", ".jpeg": "image/jpeg", ".png": "image/png", ".webp": "image/webp", ".gif": "image/gif"}
+FORMATS = {"webp": ("WEBP", "image/webp"), "jpeg": ("JPEG", "image/jpeg")}
+# URLs name the original rather than its content, so clients revalidate with the ETag after a
+# day and may keep showing the old image for a week meanwhile
+CACHE_CONTROL = "public, max-age=86400, stale-while-revalidate=604800"
+
+variants_total = metrics.registry.register(metrics.Counter(
+    "image_variants_total", "Resized image requests, by whether the variant was already on disk.", ("result",)))
+evictions_total = metrics.registry.register(metrics.Counter(
+    "image_cache_evictions_total", "Image variants deleted to keep the disk cache under its size limit."))
+
+def render(source: str, target: str, width: int, image_format: str, quality: int) -> int:
+    # Runs in a pool process; writes to a temporary file first so readers never see half an image
+    with Image.open(source) as image:
+        # JPEGs are decoded straight at a fraction of full size, still at least width on both sides
+        # whatever the EXIF rotation
+        image.draft(image.mode, (width, width))
+        image = ImageOps.exif_transpose(image)
+        # Bounded by width only; never enlarged
+        image.thumbnail((width, image.height), Image.Resampling.LANCZOS)
+        if image_format == "JPEG" and image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+        fd, temporary = tempfile.mkstemp(dir=os.path.dirname(target), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                if image_format == "JPEG":
+                    image.save(f, image_format, quality=quality, optimize=True, progressive=True)
+                else:
+                    image.save(f, image_format, quality=quality, method=4)
+            os.replace(temporary, target)
+        except BaseException:
+            os.unlink(temporary)
+            raise
+    return os.path.getsize(target)
+
+class DiskCache:
+    # Files at <directory>/<key[:2]>/<key>.<ext>. Serving a file bumps its mtime, and eviction
+    # deletes by oldest mtime until the cache is back under 90% of max_bytes. Files served or
+    # written in the last `grace` seconds may still be on their way out in a response, so they
+    # are kept even over the limit. Renders still being written (*.tmp) are neither counted nor
+    # evicted. Workers sharing the directory each keep a running total and rescan the directory
+    # before evicting.
+
+    def __init__(self, directory: str, max_bytes: int, grace: float = 60.0):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.grace = grace
+        self.size = None
+        self._lock = threading.Lock()
+
+    def path(self, key: str, ext: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.{ext}")
+
+    def get(self, key: str, ext: str) -> str | None:
+        path = self.path(key, ext)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def _entries(self):
+        for root, _, files in os.walk(self.directory):
+            for filename in files:
+                if filename.endswith(".tmp"):
+                    continue
+                path = os.path.join(root, filename)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                yield stat.st_mtime, stat.st_size, path
+
+    def added(self, size: int):
+        with self._lock:
+            if self.size is None:
+                # The first scan already includes the new file
+                self.size = sum(entry[1] for entry in self._entries())
+            else:
+                self.size += size
+            if self.size <= self.max_bytes:
+                return
+            entries = sorted(self._entries())
+            self.size = sum(entry[1] for entry in entries)
+            recent = time.time() - self.grace
+            for mtime, size, path in entries:
+                if self.size <= self.max_bytes * 0.9 or mtime > recent:
+                    break
+                try:
+                    os.unlink(path)
+                except FileNotFoundError:
+                    pass
+                self.size -= size
+                evictions_total.inc()
+
+class ImageStore:
+
+    def __init__(self, directory: str = IMAGE_DIR, cache_directory: str = IMAGE_CACHE_DIR,
+                 max_bytes: int = IMAGE_CACHE_MAX_BYTES, workers: int = IMAGE_WORKERS):
+        self.directory = directory
+        self.cache = DiskCache(cache_directory, max_bytes)
+        self.workers = workers
+        self._digests = {}
+        self._inflight = {}
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def source(self, name: str) -> str:
+        root = os.path.realpath(self.directory)
+        path = os.path.realpath(os.path.join(root, name))
+        if not path.startswith(root + os.sep) or os.path.splitext(path)[1].lower() not in SOURCE_TYPES or not os.path.isfile(path):
+            raise HTTPException(status_code=404, detail="Image not found")
+        return path
+
+    def digest(self, path: str) -> str:
+        # Hash of the file's bytes, recomputed only when its size or mtime changes
+        stat = os.stat(path)
+        stamp = (stat.st_mtime_ns, stat.st_size)
+        cached = self._digests.get(path)
+        if cached is not None and cached[0] == stamp:
+            return cached[1]
+        hasher = hashlib.blake2b(digest_size=16)
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                hasher.update(chunk)
+        self._digests[path] = (stamp, hasher.hexdigest())
+        return self._digests[path][1]
+
+    def _submit(self, *args) -> Future:
+        if self.workers <= 0:
+            future = Future()
+            try:
+                future.set_result(render(*args))
+            except Exception as e:
+                future.set_exception(e)
+            return future
+        if self._pool is None:
+            # forkserver/spawn: forking the request process would copy its threads' locks
+            methods = multiprocessing.get_all_start_methods()
+            context = multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+            self._pool = ProcessPoolExecutor(self.workers, mp_context=context)
+        return self._pool.submit(render, *args)
+
+    def variant(self, source: str, width: int, image_format: str, cached: bool = True) -> tuple[str, str]:
+        # Path and key of the variant, rendering it unless cached (or cached is False); concurrent
+        # misses on one variant share a single render
+        key = hashlib.blake2b(f"{self.digest(source)}:{width}:{image_format}:{IMAGE_QUALITY}".encode(), digest_size=16).hexdigest()
+        ext = image_format.lower()
+        path = self.cache.get(key, ext) if cached else None
+        if path is not None:
+            variants_total.inc("hit")
+            return path, key
+        variants_total.inc("miss")
+        path = self.cache.path(key, ext)
+        with self._lock:
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                future = self._inflight[key] = self._submit(source, path, width, image_format, IMAGE_QUALITY)
+        try:
+            size = future.result()
+        finally:
+            if owner:
+                with self._lock:
+                    self._inflight.pop(key, None)
+        if owner:
+            self.cache.added(size)
+        return path, key
+
+    def response(self, name: str, width: int | None, image_format: str | None, headers) -> Response:
+        source = self.source(name)
+        if width is not None and width < 1:
+            raise HTTPException(status_code=400, detail="w must be a positive width")
+        if image_format is not None and image_format not in FORMATS:
+            raise HTTPException(status_code=400, detail=f"format must be one of: {', '.join(FORMATS)}")
+        response_headers = {"Cache-Control": CACHE_CONTROL}
+        if width is None or Image is None:
+            path, media_type, tag = source, SOURCE_TYPES[os.path.splitext(source)[1].lower()], self.digest(source)
+        else:
+            if image_format is None:
+                image_format = "webp" if "image/webp" in headers.get("accept", "") else "jpeg"
+                response_headers["Vary"] = "Accept"
+            width = next((allowed for allowed in IMAGE_WIDTHS if allowed >= width), IMAGE_WIDTHS[-1])
+            path, tag = self.variant(source, width, FORMATS[image_format][0])
+            media_type = FORMATS[image_format][1]
+        response_headers["ETag"] = f'"{tag}"'
+        if etag.matches_if_none_match(headers.get("if-none-match"), response_headers["ETag"]):
+            return Response(status_code=304, headers=response_headers)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            if path == source:
+                raise HTTPException(status_code=404, detail="Image not found")
+            # Deleted since the lookup, e.g. by another worker's eviction: render it again
+            path, _ = self.variant(source, width, FORMATS[image_format][0], cached=False)
+            stat = os.stat(path)
+        # FileResponse streams from disk (sendfile where the server supports it)
+        return FileResponse(path, media_type=media_type, headers=response_headers, stat_result=stat)
+
+    def shutdown(self):
+        pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+
+store = ImageStore()
+
+metrics.register_gauge("image_cache_bytes", "Bytes of resized images in the disk cache, as last counted by this worker.", (),
+                       lambda: {} if store.cache.size is None else {(): store.cache.size})
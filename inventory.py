@@ -0,0 +1,422 @@
+import argparse
+import logging
+import os
+import random
+import threading
+import time
+from collections import Counter
+
+from fastapi import HTTPException
+from sqlalchemy import delete, func, insert, select, update
+
+import metrics, models, schemas
+
+# Stock for products that opt in; products.stock NULL means not tracked, which is the default.
+# Counts only ever change through conditional UPDATEs (stock = stock - q WHERE stock >= q), so
+# two buyers can never both get the last unit and nothing is locked between a read and a write.
+#
+# Flash-sale products can spread their stock over stock_shards rows. Each buyer decrements one
+# shard, starting from a random one, so on row-locking databases (PostgreSQL) concurrent orders
+# for the product update different rows. A line no single shard can fill is split over several
+# in the same transaction. SQLite has one write lock for the whole file, so there shards add
+# statements without adding concurrency; the conditional UPDATE keeps it correct.
+#
+# Whether a product is tracked or sharded is never cached: stock can be changed by another
+# process (python inventory.py set), so take reads it in the transaction that decrements.
+#
+# Reservations hold stock for RESERVATION_TTL seconds. An order carrying the reservation_id
+# consumes it; otherwise the reaper thread puts the stock back once it expires.
+RESERVATION_TTL = float(os.environ.get("RESERVATION_TTL", "600"))
+RESERVATION_SWEEP_INTERVAL = float(os.environ.get("RESERVATION_SWEEP_INTERVAL", "5"))
+RESERVATION_SWEEP_BATCH = 500
+MAX_STOCK_SHARDS = 64
+
+# _mode() of products without tracked stock; 0 is a single counter, above 0 the shard count
+UNTRACKED = -1
+
+logger = logging.getLogger("ecommerce.inventory")
+
+events = metrics.registry.register(metrics.Counter(
+    "inventory_events_total", "Sell-outs and reservation outcomes.", ("event",)))
+
+def _mode(row):
+    if row is None or (row.stock is None and not row.stock_shards):
+        return UNTRACKED
+    return row.stock_shards
+
+def _mode_statement(product_id: int):
+    return select(models.Product.stock, models.Product.stock_shards).where(models.Product.id == product_id)
+
+def _take_statement(product_id: int, quantity: int, shard: int | None):
+    if shard is None:
+        table = models.Product
+        stmt = update(table).where(table.id == product_id, table.stock >= quantity)
+    else:
+        table = models.StockShard
+        stmt = update(table).where(table.product_id == product_id, table.shard == shard, table.stock >= quantity)
+    return stmt.values(stock=table.stock - quantity).execution_options(synchronize_session=False)
+
+def _restore_statement(product_id: int, quantity: int, shard: int | None):
+    # NULL + quantity stays NULL, so untracked products are left alone
+    if shard is None:
+        table = models.Product
+        stmt = update(table).where(table.id == product_id)
+    else:
+        table = models.StockShard
+        stmt = update(table).where(table.product_id == product_id, table.shard == shard)
+    return stmt.values(stock=table.stock + quantity).execution_options(synchronize_session=False)
+
+def _shards_to_try(mode: int):
+    # No shard for a single counter; otherwise every shard, from a random start so buyers spread out
+    if mode == 0:
+        return [None]
+    start = random.randrange(mode)
+    return [(start + i) % mode for i in range(mode)]
+
+def _modes_statement(product_ids):
+    table = models.Product
+    return select(table.id, table.stock, table.stock_shards).where(table.id.in_(product_ids))
+
+def _tracked_lines(orders, rows):
+    # {product_id: (mode, [index, ...])} for the tracked products of orders without a reservation,
+    # in product id order so concurrent batches update rows in the same order
+    modes = {row.id: _mode(row) for row in rows}
+    lines = {}
+    for i, order in enumerate(orders):
+        mode = modes.get(order.product_id, UNTRACKED)
+        if order.reservation_id is None and mode != UNTRACKED:
+            lines.setdefault(order.product_id, (mode, []))[1].append(i)
+    return sorted(lines.items())
+
+def _shard_stock_statement(product_id: int):
+    table = models.StockShard
+    return select(table.shard, table.stock).where(table.product_id == product_id, table.stock > 0).order_by(table.stock.desc())
+
+def _split(rows, quantity: int):
+    # (shard, units) to take for a line no single shard could fill, fullest shards first
+    plan = []
+    for shard, stock in rows:
+        if quantity <= 0:
+            break
+        plan.append((shard, min(stock, quantity)))
+        quantity -= plan[-1][1]
+    return plan if quantity <= 0 else None
+
+def _sold_out(product_id: int):
+    events.inc("sold_out")
+    return HTTPException(status_code=409, detail=f"Product {product_id} is out of stock")
+
+def _consume_statement(order: schemas.OrderCreate, now: float):
+    table = models.Reservation
+    return delete(table).where(
+        table.id == order.reservation_id, table.product_id == order.product_id,
+        table.quantity == order.quantity, table.expires_at > now,
+    ).execution_options(synchronize_session=False)
+
+def _invalid_reservation():
+    return HTTPException(status_code=409, detail="Reservation has expired or does not match the order")
+
+def _release_statement(reservation_ids, now: float | None = None):
+    # DELETE ... RETURNING hands each reservation to exactly one releaser, even across workers
+    table = models.Reservation
+    stmt = delete(table).where(table.id.in_(reservation_ids))
+    if now is not None:
+        stmt = stmt.where(table.expires_at <= now)
+    return stmt.returning(table.product_id, table.quantity, table.shard).execution_options(synchronize_session=False)
+
+def _restore_statements(rows):
+    # One UPDATE per row to restore, in a fixed order so concurrent releasers lock rows alike
+    totals = Counter()
+    for row in rows:
+        totals[(row.product_id, -1 if row.shard is None else row.shard)] += row.quantity
+    return [_restore_statement(product_id, quantity, None if shard == -1 else shard)
+            for (product_id, shard), quantity in sorted(totals.items())]
+
+def _stock_statement(product_id: int):
+    shard_stock = select(func.sum(models.StockShard.stock)).where(models.StockShard.product_id == product_id).scalar_subquery()
+    reserved = select(func.coalesce(func.sum(models.Reservation.quantity), 0)).where(
+        models.Reservation.product_id == product_id, models.Reservation.expires_at > time.time()).scalar_subquery()
+    return select(models.Product.stock, models.Product.stock_shards, shard_stock.label("shard_stock"),
+                  reserved.label("reserved")).where(models.Product.id == product_id)
+
+def _stock_level(product_id: int, row):
+    if row is None:
+        return None
+    stock = row.shard_stock if row.stock_shards else row.stock
+    return schemas.StockLevel(product_id=product_id, stock=stock, shards=row.stock_shards, reserved=row.reserved)
+
+# Sync API. None of these commit except reserve, release, release_expired and set_stock;
+# a failed take or claim changes nothing, so the caller's transaction can carry on.
+
+def take(db, product_id: int, quantity: int) -> int | None:
+    # Returns the shard the units came from (None for the product row, or untracked stock), the
+    # first one when the line was split, so a released reservation returns them all there; 409
+    # when sold out.
+    # The product row is tried first: a write, so on SQLite the mode is then read under the
+    # transaction's write lock rather than from a snapshot that may fail to upgrade.
+    if db.execute(_take_statement(product_id, quantity, None)).rowcount:
+        return None
+    mode = _mode(db.execute(_mode_statement(product_id)).first())
+    if mode == UNTRACKED:
+        return None
+    if mode:
+        return _take_shards(db, product_id, quantity, mode)
+    raise _sold_out(product_id)
+
+def _take_shards(db, product_id: int, quantity: int, mode: int) -> int:
+    for shard in _shards_to_try(mode):
+        if db.execute(_take_statement(product_id, quantity, shard)).rowcount:
+            return shard
+    plan = _split(db.execute(_shard_stock_statement(product_id)).all(), quantity)
+    taken = []
+    for shard, units in plan or ():
+        if not db.execute(_take_statement(product_id, units, shard)).rowcount:
+            break
+        taken.append((shard, units))
+    if plan and len(taken) == len(plan):
+        return plan[0][0]
+    # A concurrent buyer got there first: put back what this line took
+    for shard, units in taken:
+        db.execute(_restore_statement(product_id, units, shard))
+    raise _sold_out(product_id)
+
+def claim(db, order: schemas.OrderCreate):
+    # Stock for one order: its reservation when it carries one, a fresh decrement otherwise
+    if order.reservation_id is None:
+        take(db, order.product_id, order.quantity)
+    elif db.execute(_consume_statement(order, time.time())).rowcount:
+        events.inc("consumed")
+    else:
+        raise _invalid_reservation()
+
+def claim_all(db, orders) -> list[str | None]:
+    # Error detail per order, None where stock was claimed. One IN query finds the tracked
+    # products, so untracked ones cost nothing more; each single counter then takes the sum of
+    # its lines in one UPDATE, going line by line (earlier lines first) only when that fails.
+    errors = [None] * len(orders)
+    for i, order in enumerate(orders):
+        if order.reservation_id is not None:
+            try:
+                claim(db, order)
+            except HTTPException as e:
+                errors[i] = e.detail
+    product_ids = {order.product_id for order in orders if order.reservation_id is None}
+    if not product_ids:
+        return errors
+    for product_id, (mode, lines) in _tracked_lines(orders, db.execute(_modes_statement(product_ids)).all()):
+        if not mode and db.execute(_take_statement(product_id, sum(orders[i].quantity for i in lines), None)).rowcount:
+            continue
+        for i in lines:
+            try:
+                if mode:
+                    _take_shards(db, product_id, orders[i].quantity, mode)
+                else:
+                    take(db, product_id, orders[i].quantity)
+            except HTTPException as e:
+                errors[i] = e.detail
+    return errors
+
+def reserve(db, product_id: int, quantity: int, ttl: float = RESERVATION_TTL) -> schemas.Reservation:
+    shard = take(db, product_id, quantity)
+    reservation = models.Reservation(product_id=product_id, quantity=quantity, shard=shard, expires_at=time.time() + ttl)
+    db.add(reservation)
+    db.flush()
+    result = schemas.Reservation.model_validate(reservation)
+    db.commit()
+    events.inc("reserved")
+    return result
+
+def release(db, reservation_id: int) -> bool:
+    rows = db.execute(_release_statement([reservation_id])).all()
+    for stmt in _restore_statements(rows):
+        db.execute(stmt)
+    db.commit()
+    if rows:
+        events.inc("released")
+    return bool(rows)
+
+def release_expired(db, now: float | None = None, batch_size: int = RESERVATION_SWEEP_BATCH) -> int:
+    now = time.time() if now is None else now
+    ids = db.scalars(select(models.Reservation.id).where(models.Reservation.expires_at <= now).limit(batch_size)).all()
+    if not ids:
+        return 0
+    rows = db.execute(_release_statement(ids, now)).all()
+    for stmt in _restore_statements(rows):
+        db.execute(stmt)
+    db.commit()
+    events.inc("expired", amount=len(rows))
+    return len(rows)
+
+def get_stock(db, product_id: int) -> schemas.StockLevel | None:
+    return _stock_level(product_id, db.execute(_stock_statement(product_id)).first())
+
+def set_stock(db, product_id: int, stock: int | None, shards: int = 0):
+    # stock None stops tracking. With shards, stock is split as evenly as possible.
+    if shards and stock is None:
+        raise ValueError("Sharded stock needs a count")
+    if not 0 <= shards <= MAX_STOCK_SHARDS:
+        raise ValueError(f"shards must be between 0 and {MAX_STOCK_SHARDS}")
+    db.execute(delete(models.StockShard).where(models.StockShard.product_id == product_id))
+    if shards:
+        base, extra = divmod(stock, shards)
+        db.execute(insert(models.StockShard), [
+            {"product_id": product_id, "shard": shard, "stock": base + (shard < extra)} for shard in range(shards)
+        ])
+        stock = None
+    db.execute(update(models.Product).where(models.Product.id == product_id).values(stock=stock, stock_shards=shards))
+    db.commit()
+
+# Async counterparts for DATABASE_MODE=async
+
+async def take_async(db, product_id: int, quantity: int) -> int | None:
+    if (await db.execute(_take_statement(product_id, quantity, None))).rowcount:
+        return None
+    mode = _mode((await db.execute(_mode_statement(product_id))).first())
+    if mode == UNTRACKED:
+        return None
+    if mode:
+        return await _take_shards_async(db, product_id, quantity, mode)
+    raise _sold_out(product_id)
+
+async def _take_shards_async(db, product_id: int, quantity: int, mode: int) -> int:
+    for shard in _shards_to_try(mode):
+        if (await db.execute(_take_statement(product_id, quantity, shard))).rowcount:
+            return shard
+    plan = _split((await db.execute(_shard_stock_statement(product_id))).all(), quantity)
+    taken = []
+    for shard, units in plan or ():
+        if not (await db.execute(_take_statement(product_id, units, shard))).rowcount:
+            break
+        taken.append((shard, units))
+    if plan and len(taken) == len(plan):
+        return plan[0][0]
+    for shard, units in taken:
+        await db.execute(_restore_statement(product_id, units, shard))
+    raise _sold_out(product_id)
+
+async def claim_async(db, order: schemas.OrderCreate):
+    if order.reservation_id is None:
+        await take_async(db, order.product_id, order.quantity)
+    elif (await db.execute(_consume_statement(order, time.time()))).rowcount:
+        events.inc("consumed")
+    else:
+        raise _invalid_reservation()
+
+async def claim_all_async(db, orders) -> list[str | None]:
+    errors = [None] * len(orders)
+    for i, order in enumerate(orders):
+        if order.reservation_id is not None:
+            try:
+                await claim_async(db, order)
+            except HTTPException as e:
+                errors[i] = e.detail
+    product_ids = {order.product_id for order in orders if order.reservation_id is None}
+    if not product_ids:
+        return errors
+    for product_id, (mode, lines) in _tracked_lines(orders, (await db.execute(_modes_statement(product_ids))).all()):
+        if not mode and (await db.execute(_take_statement(product_id, sum(orders[i].quantity for i in lines), None))).rowcount:
+            continue
+        for i in lines:
+            try:
+                if mode:
+                    await _take_shards_async(db, product_id, orders[i].quantity, mode)
+                else:
+                    await take_async(db, product_id, orders[i].quantity)
+            except HTTPException as e:
+                errors[i] = e.detail
+    return errors
+
+async def reserve_async(db, product_id: int, quantity: int, ttl: float = RESERVATION_TTL) -> schemas.Reservation:
+    shard = await take_async(db, product_id, quantity)
+    reservation = models.Reservation(product_id=product_id, quantity=quantity, shard=shard, expires_at=time.time() + ttl)
+    db.add(reservation)
+    await db.flush()
+    result = schemas.Reservation.model_validate(reservation)
+    await db.commit()
+    events.inc("reserved")
+    return result
+
+async def release_async(db, reservation_id: int) -> bool:
+    rows = (await db.execute(_release_statement([reservation_id]))).all()
+    for stmt in _restore_statements(rows):
+        await db.execute(stmt)
+    await db.commit()
+    if rows:
+        events.inc("released")
+    return bool(rows)
+
+async def get_stock_async(db, product_id: int) -> schemas.StockLevel | None:
+    return _stock_level(product_id, (await db.execute(_stock_statement(product_id))).first())
+
+class Reaper:
+    # Background thread returning the stock of expired reservations. Every worker may run one;
+    # the DELETE ... RETURNING in release_expired keeps them from releasing a row twice.
+
+    def __init__(self, session_factory, interval: float = RESERVATION_SWEEP_INTERVAL):
+        self.session_factory = session_factory
+        self.interval = interval
+        self._stopping = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._run, name="reservation-reaper", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 10):
+        thread, self._thread = self._thread, None
+        if thread is not None:
+            self._stopping.set()
+            thread.join(timeout)
+
+    def sweep(self) -> int:
+        released = 0
+        with self.session_factory() as db:
+            while True:
+                count = release_expired(db)
+                released += count
+                if count < RESERVATION_SWEEP_BATCH:
+                    return released
+
+    def _run(self):
+        while not self._stopping.wait(self.interval):
+            try:
+                self.sweep()
+            except Exception:
+                logger.exception("Releasing expired reservations failed")
+
+_reaper = None
+
+def start_reaper():
+    global _reaper
+    if RESERVATION_SWEEP_INTERVAL <= 0:
+        return
+    if _reaper is None:
+        from database import SessionLocal
+        _reaper = Reaper(SessionLocal)
+    _reaper.start()
+
+def stop_reaper():
+    if _reaper is not None:
+        _reaper.stop()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inventory maintenance")
+    sub = parser.add_subparsers(dest="command", required=True)
+    set_parser = sub.add_parser("set", help="set a product's stock")
+    set_parser.add_argument("product_id", type=int)
+    set_parser.add_argument("stock", type=int)
+    set_parser.add_argument("--shards", type=int, default=0)
+    untrack_parser = sub.add_parser("untrack", help="stop tracking a product's stock")
+    untrack_parser.add_argument("product_id", type=int)
+    sub.add_parser("sweep", help="release expired reservations now")
+    args = parser.parse_args()
+
+    from database import SessionLocal
+    if args.command == "sweep":
+        print(f"Released {Reaper(SessionLocal).sweep()} expired reservations")
+    else:
+        with SessionLocal() as db:
+            set_stock(db, args.product_id, args.stock if args.command == "set" else None, getattr(args, "shards", 0))
+            print(get_stock(db, args.product_id))
@@ -1,14 +1,42 @@
-from fastapi import FastAPI, Depends, HTTPException
-from fastapi.staticfiles import StaticFiles
-from fastapi.responses import HTMLResponse
+from contextlib import asynccontextmanager
+from datetime import date, datetime
+from typing import Any
+
+from fastapi import APIRouter, FastAPI, Depends, Header, HTTPException, Query, Request, Response
+from fastapi.responses import HTMLResponse, PlainTextResponse, StreamingResponse
 from sqlalchemy.orm import Session
 
-from . import models, schemas, crud
-from .database import SessionLocal, engine
+import schemas, crud, pagination, cache, catalog, compact, compression, orders, pages, assets, export, search, metrics, order_queue, stats, idempotency, inventory, replicas, admission, images
+import database
+from database import SessionLocal
+
+# Schema setup, asset fingerprinting and templates happen before the first request is
+# served, not at import, so importing the app never touches the database
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if database.SCHEMA_AUTO_CREATE:
+        database.init_db()
+    assets.pipeline.build()
+    pages.store.load_all()
+    inventory.start_reaper()
+    replicas.start_replicator()
+    yield
+    order_queue.stop_writer()
+    inventory.stop_reaper()
+    replicas.stop_replicator()
+    images.store.shutdown()
+
+app = FastAPI(lifespan=lifespan)
 
-models.Base.metadata.create_all(bind=engine)
+# gzip/brotli for dynamic responses above a size threshold; see compression.py
+app.add_middleware(compression.CompressionMiddleware)
 
-app = FastAPI()
+# Per-route-class concurrency limits and load shedding; order writes are admitted first. See admission.py
+app.add_middleware(admission.AdmissionMiddleware)
+
+# Per-route latency histograms and per-request query accounting, exposed on /metrics.
+# Added last so it is outermost and times compression and shed requests too.
+app.add_middleware(metrics.MetricsMiddleware)
 
 # Dependency to get DB session
 def get_db():
@@ -18,48 +46,229 @@ def get_db():
     finally:
         db.close()
 
-# Serve static files (CSS, JS)
-app.mount("/static", StaticFiles(directory="static"), name="static")
+# Listing endpoints read from a replica when READ_REPLICA_URLS is set, except for clients that
+# just placed an order; see replicas.py. Without replicas this is the primary session.
+def get_read_db(request: Request, db: Session = Depends(get_db)):
+    if not replicas.read_replicas or replicas.prefers_primary(request):
+        yield db
+        return
+    with replicas.replica_session() as replica_db:
+        yield replica_db
 
-# Serve HTML pages
+# The product listing fills the process-wide catalog caches, so it stays on the primary until the
+# replicas have caught up with the last invalidation; rows from a lagging replica would be cached
+# over the write that invalidated them.
+def get_catalog_read_db(request: Request, db: Session = Depends(get_db)):
+    cache.catalog_cache.sync()
+    if not replicas.caught_up(cache.catalog_cache.invalidated_at):
+        yield db
+        return
+    yield from get_read_db(request, db)
+
+# Serve static files (CSS, JS); fingerprinted names are cached as immutable
+app.mount("/static", assets.AssetFiles(assets.pipeline), name="static")
+
+# Serve HTML pages from memory; see pages.py
 @app.get("/", response_class=HTMLResponse)
-async def read_root():
-    with open("index.html") as f:
-        return HTMLResponse(content=f.read())
+async def read_root(request: Request):
+    return pages.store.response(request, "index.html")
 
 @app.get("/products", response_class=HTMLResponse)
-async def read_products_page():
-    with open("products.html") as f:
-        return HTMLResponse(content=f.read())
+async def read_products_page(request: Request):
+    return pages.store.response(request, "products.html")
 
 @app.get("/order", response_class=HTMLResponse)
-async def read_order_page():
-    with open("order.html") as f:
-        return HTMLResponse(content=f.read())
+async def read_order_page(request: Request):
+    return pages.store.response(request, "order.html")
 
 @app.get("/contact", response_class=HTMLResponse)
-async def read_contact_page():
+async def read_contact_page(request: Request):
+    return pages.store.response(request, "contact.html")
+
+# Product images from IMAGE_DIR; ?w= serves a resized, disk-cached variant. See images.py
+@app.get("/images/{name:path}")
+def read_image(request: Request, name: str, w: int | None = None, format: str | None = None):
+    return images.store.response(name, w, format, request.headers)
+
+# API Endpoints
+# These are the synchronous handlers; DATABASE_MODE=async swaps in async_api.router.
+api = APIRouter()
+
+# Passing `cursor` (empty for the first page) switches to keyset pagination and
+# wraps the page in {"items": [...], "next_cursor": ...}; `skip` keeps returning a plain list.
+# List endpoints take `fields` and `format`; see compact.py.
+# `ids=1,2,3` looks up those products instead, unknown ids left out, with one IN query for cache misses.
+@api.get("/api/products", response_model=list[schemas.Product] | schemas.ProductPage)
+def read_products(request: Request, skip: int = 0, limit: int = 100, cursor: str | None = None, fields: str | None = None,
+                  format: str = "objects", ids: str | None = None, db: Session = Depends(get_catalog_read_db)):
+    after_id = pagination.get_after_id(cursor)
+    selected = compact.parse(fields, format, schemas.Product)
+    if ids is not None:
+        products = crud.get_cached_products_by_ids(db, catalog.parse_ids(ids))
+        return products if selected is None else compact.ORJSONResponse(compact.shape(products, selected, format))
+
+    def encode():
+        products = crud.get_cached_products(db, skip=skip, limit=limit, after_id=after_id)
+        return catalog.encode_page(products, limit, cursor, selected, format)
+
+    body, tag = cache.page_cache.get_or_load(catalog.page_key(skip, limit, cursor, after_id, selected, format), encode)
+    return catalog.page_response(request, body, tag)
+
+# Prefix full-text search over name and description, ranked by bm25, with optional price range
+@api.get("/api/products/search", response_model=list[schemas.Product])
+def search_products(q: str = "", min_price: float | None = None, max_price: float | None = None,
+                    limit: int = Query(20, ge=1, le=search.MAX_RESULTS),
+                    fields: str | None = None, format: str = "objects", db: Session = Depends(get_db)):
+    selected = compact.parse(fields, format, schemas.Product)
+    results = search.search_products(db, q, min_price=min_price, max_price=max_price, limit=limit)
+    if selected is None:
+        return results
+    return compact.ORJSONResponse(compact.shape(results, selected, format))
+
+@api.get("/api/products/{product_id}", response_model=schemas.Product)
+def read_product(product_id: int, db: Session = Depends(get_db)):
+    product = crud.get_cached_product(db, product_id=product_id)
+    if product is None:
+        raise HTTPException(status_code=404, detail="Product not found")
+    return product
 
-@app.post("/api/orders", response_model=schemas.Order)
-def create_order(order: schemas.OrderCreate, db: Session = Depends(get_db)):
-    db_product = crud.get_product(db, product_id=order.product_id)
+def place_order(order: schemas.OrderCreate, db: Session):
+    db_product = crud.get_cached_product(db, product_id=order.product_id)
     if db_product is None:
         raise HTTPException(status_code=404, detail="Product not found")
-    return crud.create_order(db=db, order=order)
+    if order_queue.ORDER_WRITE_BEHIND:
+        return order_queue.result(order_queue.get_writer().submit(order, db_product.price))
+    # Stock comes off in the order's own transaction; see inventory.py
+    inventory.claim(db, order)
+    return schemas.Order.model_validate(crud.create_order(db=db, order=order, unit_price=db_product.price))
 
-@app.get("/api/orders", response_model=list[schemas.Order])
-def read_orders(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    orders = crud.get_orders(db, skip=skip, limit=limit)
-    return orders
-    with open("contact.html") as f:
-        return HTMLResponse(content=f.read())
+# Retries carrying the same Idempotency-Key get the first result back; see idempotency.py
+@api.post("/api/orders", response_model=schemas.Order)
+def create_order(order: schemas.OrderCreate, response: Response, idempotency_key: str | None = Header(None), db: Session = Depends(get_db)):
+    replicas.mark_write(response)
+    if idempotency_key is None:
+        return place_order(order, db)
+    result, replayed = idempotency.store.execute(idempotency_key, idempotency.fingerprint(order), lambda: place_order(order, db))
+    if replayed:
+        response.headers["Idempotent-Replayed"] = "true"
+    return result
 
-# API Endpoints
+def place_checkout(checkout: schemas.CheckoutCreate, db: Session):
+    prices = crud.get_product_prices(db, [line.product_id for line in checkout.items])
+    cart = orders.checkout_orders(checkout, prices)
+    # A line that cannot get its stock fails the cart; closing the session rolls back the others
+    orders.require_claimed(inventory.claim_all(db, cart))
+    return orders.checkout_result(crud.create_checkout(db, cart, [prices[order.product_id] for order in cart]))
+
+# A whole cart in one request: every product checked with one IN query and every line written
+# in one transaction. Carts skip the write-behind queue; they are already a single commit.
+@api.post("/api/orders/checkout", response_model=schemas.Checkout)
+def create_checkout(checkout: schemas.CheckoutCreate, response: Response, idempotency_key: str | None = Header(None), db: Session = Depends(get_db)):
+    replicas.mark_write(response)
+    if idempotency_key is None:
+        return place_checkout(checkout, db)
+    result, replayed = idempotency.store.execute(idempotency_key, idempotency.fingerprint(checkout), lambda: place_checkout(checkout, db))
+    if replayed:
+        response.headers["Idempotent-Replayed"] = "true"
+    return result
+
+# Marketplace imports: validate every item, check all product ids with one IN query and
+# insert the valid orders in a single transaction. Bad items are reported, not fatal.
+@api.post("/api/orders/bulk", response_model=schemas.BulkOrderResult)
+def create_orders_bulk(items: list[Any], response: Response, db: Session = Depends(get_db)):
+    replicas.mark_write(response)
+    if len(items) > orders.MAX_BULK_ORDERS:
+        raise HTTPException(status_code=413, detail=f"At most {orders.MAX_BULK_ORDERS} orders per batch")
+    results, valid = orders.parse_bulk_items(items)
+    prices = crud.get_product_prices(db, [order.product_id for _, order in valid])
+    accepted = orders.accept_known_products(results, valid, prices)
+    accepted = orders.accept_claimed(results, accepted, inventory.claim_all(db, [order for _, order in accepted]))
+    ids = crud.create_orders_bulk(db, [order for _, order in accepted], [prices[order.product_id] for _, order in accepted])
+    return orders.bulk_result(results, accepted, ids)
+
+@api.get("/api/orders", response_model=list[schemas.Order] | schemas.OrderPage)
+def read_orders(skip: int = 0, limit: int = 100, cursor: str | None = None, fields: str | None = None,
+                format: str = "objects", db: Session = Depends(get_read_db)):
+    after_id = pagination.get_after_id(cursor)
+    selected = compact.parse(fields, format, schemas.Order)
+    if cursor is None:
+        db_orders = crud.get_orders(db, skip=skip, limit=limit)
+        return db_orders if selected is None else compact.ORJSONResponse(compact.shape(db_orders, selected, format))
+    db_orders = crud.get_orders(db, limit=limit, after_id=after_id)
+    if selected is not None:
+        return compact.ORJSONResponse(compact.page(db_orders, selected, format, pagination.next_cursor(db_orders, limit)))
+    return {"items": db_orders, "next_cursor": pagination.next_cursor(db_orders, limit)}
+
+# Keyset-paginated order history for one product or one customer, each backed by a composite index
+@api.get("/api/products/{product_id}/orders", response_model=schemas.OrderPage)
+def read_product_orders(product_id: int, limit: int = 100, cursor: str | None = None, db: Session = Depends(get_read_db)):
+    db_orders = crud.get_orders_for_product(db, product_id, limit=limit, after_id=pagination.get_after_id(cursor))
+    return {"items": db_orders, "next_cursor": pagination.next_cursor(db_orders, limit)}
 
-@app.get("/api/products", response_model=list[schemas.Product])
-def read_products(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    products = crud.get_products(db, skip=skip, limit=limit)
-    return products
+@api.get("/api/orders/by-customer", response_model=schemas.OrderPage)
+def read_customer_orders(email: str, limit: int = 100, cursor: str | None = None, db: Session = Depends(get_read_db)):
+    db_orders = crud.get_orders_for_customer(db, email, limit=limit, after_id=pagination.get_after_id(cursor))
+    return {"items": db_orders, "next_cursor": pagination.next_cursor(db_orders, limit)}
+
+# Stock held for a buyer, e.g. while payment runs. An order with the reservation_id consumes it;
+# otherwise it is released on DELETE or when it expires.
+@api.get("/api/products/{product_id}/stock", response_model=schemas.StockLevel)
+def read_product_stock(product_id: int, db: Session = Depends(get_db)):
+    level = inventory.get_stock(db, product_id)
+    if level is None:
+        raise HTTPException(status_code=404, detail="Product not found")
+    return level
+
+@api.post("/api/reservations", response_model=schemas.Reservation)
+def create_reservation(reservation: schemas.ReservationCreate, db: Session = Depends(get_db)):
+    if crud.get_cached_product(db, product_id=reservation.product_id) is None:
+        raise HTTPException(status_code=404, detail="Product not found")
+    return inventory.reserve(db, reservation.product_id, reservation.quantity)
+
+@api.delete("/api/reservations/{reservation_id}", status_code=204)
+def delete_reservation(reservation_id: int, db: Session = Depends(get_db)):
+    if not inventory.release(db, reservation_id):
+        raise HTTPException(status_code=404, detail="Reservation not found")
+
+# Sales dashboards read the aggregates kept by the order write paths; see stats.py
+@api.get("/api/stats/products/{product_id}", response_model=schemas.ProductSales)
+def read_product_sales(product_id: int, db: Session = Depends(get_db)):
+    sales = stats.get_product_sales(db, product_id)
+    if sales is not None:
+        return sales
+    if crud.get_cached_product(db, product_id=product_id) is None:
+        raise HTTPException(status_code=404, detail="Product not found")
+    return schemas.ProductSales(product_id=product_id)
+
+@api.get("/api/stats/daily", response_model=list[schemas.DailySales])
+def read_daily_sales(start: date | None = None, end: date | None = None, limit: int = 90, db: Session = Depends(get_db)):
+    return stats.get_daily_sales(db, start, end, limit)
+
+# Prometheus text exposition format
+@app.get("/metrics", response_class=PlainTextResponse)
+def read_metrics():
+    return PlainTextResponse(metrics.registry.render(), media_type="text/plain; version=0.0.4")
+
+# Back-office export, streamed in either database mode. `since_id` and `since` (ISO timestamp)
+# select only newer orders for incremental pulls.
+@app.get("/api/orders/export")
+def export_orders(format: str = "ndjson", since_id: int | None = None, since: datetime | None = None):
+    if format not in export.EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported format, use one of: {', '.join(export.EXPORT_FORMATS)}")
+    return StreamingResponse(
+        export.export_orders(format, since_id=since_id, since=since),
+        media_type=export.EXPORT_FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="orders.{format}"'},
+    )
+
+if database.DATABASE_MODE == "async":
+    import async_api
+    app.include_router(async_api.router)
+else:
+    app.include_router(api)
 
-# Need to add endpoint for creating orders later
 # Need to add endpoint for creating products (admin)
+
+if __name__ == "__main__":
+    import server
+    server.main()
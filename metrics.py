@@ -0,0 +1,222 @@
+import contextvars
+import logging
+import os
+import threading
+import time
+from collections import Counter as _Tally
+
+from sqlalchemy import event
+
+logger = logging.getLogger("ecommerce.sql")
+
+# Queries slower than this are logged with their statement
+SLOW_QUERY_MS = float(os.environ.get("SLOW_QUERY_MS", "100"))
+# The same statement run this many times in one request is flagged as an N+1 pattern
+N_PLUS_ONE_THRESHOLD = int(os.environ.get("N_PLUS_ONE_THRESHOLD", "3"))
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 25, 50, 100)
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(names, values, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+class Counter:
+
+    def __init__(self, name: str, help: str, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels):
+        return self._values.get(labels, 0)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_labels(self.labelnames, labels)} {value}")
+        return lines
+
+class Gauge:
+    # Read at scrape time from a callback returning {label values tuple: number}.
+    # kind="counter" exposes monotonic values kept elsewhere, e.g. cache hit counts.
+
+    def __init__(self, name: str, help: str, labelnames=(), collect=None, kind: str = "gauge"):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.collect = collect
+        self.kind = kind
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for labels, value in sorted(self.collect().items()):
+            lines.append(f"{self.name}{_labels(self.labelnames, labels)} {value}")
+        return lines
+
+class Histogram:
+
+    def __init__(self, name: str, help: str, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * len(self.buckets), 0.0, 0]
+            counts = series[0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    def count(self, *labels):
+        series = self._series.get(labels)
+        return series[2] if series else 0
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for labels, (counts, total, count) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, counts):
+                    cumulative += bucket_count
+                    le = 'le="%s"' % bound
+                    lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}")
+                le = 'le="+Inf"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {count}")
+                lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {total}")
+                lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {count}")
+        return lines
+
+class Registry:
+
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+registry = Registry()
+
+http_request_duration = registry.register(Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route template, method and status.",
+    ("route", "method", "status")))
+db_query_duration = registry.register(Histogram(
+    "db_query_duration_seconds", "Database statement execution time by route.", ("route",)))
+db_queries_per_request = registry.register(Histogram(
+    "db_queries_per_request", "Statements executed while serving one request.", ("route",), buckets=QUERY_COUNT_BUCKETS))
+db_slow_queries = registry.register(Counter(
+    "db_slow_queries_total", f"Statements slower than SLOW_QUERY_MS ({SLOW_QUERY_MS}ms).", ("route",)))
+db_n_plus_one = registry.register(Counter(
+    "db_n_plus_one_total", "Requests that ran one statement at least N_PLUS_ONE_THRESHOLD times.", ("route",)))
+
+def register_gauge(name: str, help: str, labelnames, collect, kind: str = "gauge"):
+    return registry.register(Gauge(name, help, labelnames, collect, kind))
+
+class RequestStats:
+    # Per-request query accounting, carried in a contextvar into threadpool handlers
+
+    __slots__ = ("scope", "queries", "statements")
+
+    def __init__(self, scope):
+        self.scope = scope
+        self.queries = 0
+        self.statements = _Tally()
+
+    @property
+    def route(self):
+        return _route_of(self.scope)
+
+_current = contextvars.ContextVar("request_stats", default=None)
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_start"].pop()
+    stats = _current.get()
+    route = stats.route if stats is not None else "background"
+    db_query_duration.observe(elapsed, route)
+    if stats is not None:
+        stats.queries += 1
+        stats.statements[statement] += 1
+    if elapsed * 1000 >= SLOW_QUERY_MS:
+        db_slow_queries.inc(route)
+        logger.warning("Slow query (%.1fms) in %s: %s", elapsed * 1000, route, statement)
+
+def _handle_error(context):
+    # A failed statement never reaches after_cursor_execute
+    if context.connection is not None and context.connection.info.get("query_start"):
+        context.connection.info["query_start"].pop()
+
+def instrument_engine(engine):
+    # Accepts sync engines and the sync_engine of an AsyncEngine
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
+    return engine
+
+def _route_of(scope) -> str:
+    route = scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+class MetricsMiddleware:
+    # Plain ASGI middleware: one timer per request and no extra task or body buffering
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        stats = RequestStats(scope)
+        token = _current.set(stats)
+        status = 500
+        started = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current.reset(token)
+            route = stats.route
+            http_request_duration.observe(time.perf_counter() - started, route, scope["method"], str(status))
+            if stats.queries:
+                db_queries_per_request.observe(stats.queries, route)
+                statement, repeats = stats.statements.most_common(1)[0]
+                if repeats >= N_PLUS_ONE_THRESHOLD:
+                    db_n_plus_one.inc(route)
+                    logger.warning("Possible N+1 in %s %s: statement ran %d times: %s", scope["method"], route, repeats, statement)
@@ -0,0 +1,38 @@
+from logging.config import fileConfig
+
+from alembic import context
+from sqlalchemy import create_engine
+
+import database, models
+
+config = context.config
+if config.config_file_name is not None:
+    fileConfig(config.config_file_name)
+
+target_metadata = models.Base.metadata
+
+def include_name(name, type_, parent_names):
+    # products_fts and its shadow tables are raw FTS5 DDL from search.py, not models
+    return not (type_ == "table" and name.startswith("products_fts"))
+
+def run_migrations_offline():
+    context.configure(url=database.SQLALCHEMY_DATABASE_URL, target_metadata=target_metadata,
+                      literal_binds=True, render_as_batch=True, include_name=include_name)
+    with context.begin_transaction():
+        context.run_migrations()
+
+def run_migrations_online():
+    # A plain engine: no pool sizing or request metrics for a one-off migration run
+    engine = create_engine(database.SQLALCHEMY_DATABASE_URL)
+    with engine.connect() as connection:
+        # Batch mode rebuilds tables on SQLite, which cannot ALTER constraints in place
+        context.configure(connection=connection, target_metadata=target_metadata, render_as_batch=True,
+                          include_name=include_name)
+        with context.begin_transaction():
+            context.run_migrations()
+    engine.dispose()
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
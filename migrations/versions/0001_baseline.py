@@ -0,0 +1,36 @@
+"""baseline schema
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    # The schema the app created before migrations existed, so `alembic stamp 0001` fits it
+    op.create_table(
+        "products",
+        sa.Column("id", sa.Integer, primary_key=True),
+        sa.Column("name", sa.String),
+        sa.Column("description", sa.String),
+        sa.Column("price", sa.Float),
+        sa.Column("image_url", sa.String),
+    )
+    op.create_index("ix_products_id", "products", ["id"])
+    op.create_index("ix_products_name", "products", ["name"])
+    op.create_table(
+        "orders",
+        sa.Column("id", sa.Integer, primary_key=True),
+    )
+
+def downgrade():
+    op.drop_table("orders")
+    op.drop_index("ix_products_name", "products")
+    op.drop_index("ix_products_id", "products")
+    op.drop_table("products")
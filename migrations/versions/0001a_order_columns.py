@@ -0,0 +1,38 @@
+"""order columns and catalog index added before migrations existed
+
+Revision ID: 0001a
+Revises: 0001
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0001a"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+ORDER_COLUMNS = [
+    sa.Column("product_id", sa.Integer),
+    sa.Column("quantity", sa.Integer),
+    sa.Column("customer_name", sa.String),
+    sa.Column("customer_email", sa.String),
+    sa.Column("shipping_address", sa.String),
+    sa.Column("created_at", sa.DateTime, server_default=sa.func.now()),
+]
+
+def upgrade():
+    # Databases created by create_all after these landed already have some or all of them
+    inspector = sa.inspect(op.get_bind())
+    existing = {column["name"] for column in inspector.get_columns("orders")}
+    for column in ORDER_COLUMNS:
+        if column.name not in existing:
+            op.add_column("orders", column)
+    if "ix_products_price_id" not in {index["name"] for index in inspector.get_indexes("products")}:
+        op.create_index("ix_products_price_id", "products", ["price", "id"])
+
+def downgrade():
+    op.drop_index("ix_products_price_id", "products")
+    with op.batch_alter_table("orders") as batch:
+        for column in reversed(ORDER_COLUMNS):
+            batch.drop_column(column.name)
@@ -0,0 +1,42 @@
+"""denormalized orders: unit_price snapshot, product foreign key, lookup indexes
+
+Revision ID: 0002
+Revises: 0001a
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0002"
+down_revision = "0001a"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.add_column("orders", sa.Column("unit_price", sa.Float))
+    # Existing orders get the current product price; orders for deleted products keep 0
+    op.execute(
+        "UPDATE orders SET unit_price = COALESCE("
+        "(SELECT products.price FROM products WHERE products.id = orders.product_id), 0)"
+    )
+    op.execute("UPDATE orders SET created_at = CURRENT_TIMESTAMP WHERE created_at IS NULL")
+    with op.batch_alter_table("orders") as batch:
+        batch.alter_column("unit_price", existing_type=sa.Float, nullable=False)
+        batch.alter_column("product_id", existing_type=sa.Integer, nullable=False)
+        batch.alter_column("quantity", existing_type=sa.Integer, nullable=False)
+        batch.alter_column("customer_name", existing_type=sa.String, nullable=False)
+        batch.alter_column("customer_email", existing_type=sa.String, nullable=False)
+        batch.alter_column("shipping_address", existing_type=sa.String, nullable=False)
+        batch.alter_column("created_at", existing_type=sa.DateTime, nullable=False, existing_server_default=sa.func.now())
+        batch.create_foreign_key("fk_orders_product_id_products", "products", ["product_id"], ["id"])
+        batch.create_index("ix_orders_product_id_id", ["product_id", "id"])
+        batch.create_index("ix_orders_customer_email_id", ["customer_email", "id"])
+        batch.create_index("ix_orders_created_at", ["created_at"])
+
+def downgrade():
+    with op.batch_alter_table("orders") as batch:
+        batch.drop_index("ix_orders_created_at")
+        batch.drop_index("ix_orders_customer_email_id")
+        batch.drop_index("ix_orders_product_id_id")
+        batch.drop_constraint("fk_orders_product_id_products", type_="foreignkey")
+        batch.drop_column("unit_price")
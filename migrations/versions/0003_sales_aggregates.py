@@ -0,0 +1,42 @@
+"""sales aggregates per product and per day
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table(
+        "product_sales",
+        sa.Column("product_id", sa.Integer, sa.ForeignKey("products.id"), primary_key=True),
+        sa.Column("orders", sa.Integer, nullable=False),
+        sa.Column("units", sa.Integer, nullable=False),
+        sa.Column("revenue", sa.Float, nullable=False),
+    )
+    op.create_table(
+        "daily_sales",
+        sa.Column("day", sa.Date, primary_key=True),
+        sa.Column("orders", sa.Integer, nullable=False),
+        sa.Column("units", sa.Integer, nullable=False),
+        sa.Column("revenue", sa.Float, nullable=False),
+    )
+    # Backfill from existing orders; later drift is repaired with `python stats.py rebuild`
+    op.execute(
+        "INSERT INTO product_sales (product_id, orders, units, revenue) "
+        "SELECT product_id, COUNT(*), SUM(quantity), SUM(quantity * unit_price) FROM orders GROUP BY product_id"
+    )
+    op.execute(
+        "INSERT INTO daily_sales (day, orders, units, revenue) "
+        "SELECT DATE(created_at), COUNT(*), SUM(quantity), SUM(quantity * unit_price) FROM orders GROUP BY DATE(created_at)"
+    )
+
+def downgrade():
+    op.drop_table("daily_sales")
+    op.drop_table("product_sales")
@@ -0,0 +1,41 @@
+"""inventory: optional product stock, stock shards and reservations
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    # Existing products stay untracked (stock NULL) until stock is set for them
+    op.add_column("products", sa.Column("stock", sa.Integer, nullable=True))
+    op.add_column("products", sa.Column("stock_shards", sa.Integer, nullable=False, server_default="0"))
+    op.create_table(
+        "stock_shards",
+        sa.Column("product_id", sa.Integer, sa.ForeignKey("products.id"), primary_key=True),
+        sa.Column("shard", sa.Integer, primary_key=True),
+        sa.Column("stock", sa.Integer, nullable=False),
+    )
+    op.create_table(
+        "reservations",
+        sa.Column("id", sa.Integer, primary_key=True),
+        sa.Column("product_id", sa.Integer, sa.ForeignKey("products.id"), nullable=False),
+        sa.Column("quantity", sa.Integer, nullable=False),
+        sa.Column("shard", sa.Integer, nullable=True),
+        sa.Column("expires_at", sa.Float, nullable=False),
+    )
+    op.create_index("ix_reservations_expires_at", "reservations", ["expires_at"])
+
+def downgrade():
+    op.drop_index("ix_reservations_expires_at", table_name="reservations")
+    op.drop_table("reservations")
+    op.drop_table("stock_shards")
+    with op.batch_alter_table("products") as batch:
+        batch.drop_column("stock_shards")
+        batch.drop_column("stock")
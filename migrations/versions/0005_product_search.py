@@ -0,0 +1,29 @@
+"""product search: SQLite FTS5 index over product names and descriptions
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18
+"""
+from alembic import op
+
+import search
+
+revision = "0005"
+down_revision = "0004"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    # The same DDL create_all runs for new SQLite databases; other backends have no index yet
+    if op.get_bind().dialect.name != "sqlite":
+        return
+    for ddl in search.FTS_DDL:
+        op.execute(ddl)
+    op.execute("INSERT INTO products_fts(products_fts) VALUES ('rebuild')")
+
+def downgrade():
+    if op.get_bind().dialect.name != "sqlite":
+        return
+    for trigger in ("products_fts_au", "products_fts_ad", "products_fts_ai"):
+        op.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+    op.execute("DROP TABLE IF EXISTS products_fts")
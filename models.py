@@ -1,12 +1,28 @@
-from sqlalchemy import Column, Integer, String, Float
-from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy import Column, Date, DateTime, ForeignKey, Index, Integer, String, Float, func
 
-Base = declarative_base()
+from database import Base
 
 class Order(Base):
     __tablename__ = "orders"
 
     id = Column(Integer, primary_key=True)
+    product_id = Column(Integer, ForeignKey("products.id"), nullable=False)
+    quantity = Column(Integer, nullable=False)
+    # Product price when the order was placed, so revenue needs no join
+    unit_price = Column(Float, nullable=False)
+    customer_name = Column(String, nullable=False)
+    customer_email = Column(String, nullable=False)
+    shipping_address = Column(String, nullable=False)
+    created_at = Column(DateTime, server_default=func.now(), nullable=False)
+
+    __table_args__ = (
+        # Keyset pages of one product's or one customer's orders, and time-range scans
+        Index("ix_orders_product_id_id", "product_id", "id"),
+        Index("ix_orders_customer_email_id", "customer_email", "id"),
+        Index("ix_orders_created_at", "created_at"),
+    )
+    # created_at comes back from the INSERT so sales can be bucketed by day before commit
+    __mapper_args__ = {"eager_defaults": True}
 
 class Product(Base):
     __tablename__ = "products"
@@ -15,4 +31,49 @@ class Product(Base):
     name = Column(String, index=True)
     description = Column(String)
     price = Column(Float)
-    image_url = Column(String, nullable=True)
\ No newline at end of file
+    image_url = Column(String, nullable=True)
+    # Units available; NULL means stock is not tracked. See inventory.py.
+    stock = Column(Integer, nullable=True)
+    # Above zero, stock lives in that many stock_shards rows instead of `stock`
+    stock_shards = Column(Integer, nullable=False, default=0, server_default="0")
+
+    __table_args__ = (
+        # Serves price range filters in product search
+        Index("ix_products_price_id", "price", "id"),
+    )
+
+# Sales aggregates maintained by the order write paths in the same transaction; see stats.py
+class ProductSales(Base):
+    __tablename__ = "product_sales"
+
+    product_id = Column(Integer, ForeignKey("products.id"), primary_key=True)
+    orders = Column(Integer, nullable=False, default=0)
+    units = Column(Integer, nullable=False, default=0)
+    revenue = Column(Float, nullable=False, default=0)
+
+class DailySales(Base):
+    __tablename__ = "daily_sales"
+
+    day = Column(Date, primary_key=True)
+    orders = Column(Integer, nullable=False, default=0)
+    units = Column(Integer, nullable=False, default=0)
+    revenue = Column(Float, nullable=False, default=0)
+
+# Stock of a flash-sale product split over several rows, so concurrent buyers update different rows
+class StockShard(Base):
+    __tablename__ = "stock_shards"
+
+    product_id = Column(Integer, ForeignKey("products.id"), primary_key=True)
+    shard = Column(Integer, primary_key=True)
+    stock = Column(Integer, nullable=False)
+
+# Stock held for a buyer until an order consumes it or expires_at (unix time) passes
+class Reservation(Base):
+    __tablename__ = "reservations"
+
+    id = Column(Integer, primary_key=True)
+    product_id = Column(Integer, ForeignKey("products.id"), nullable=False)
+    quantity = Column(Integer, nullable=False)
+    # Shard the units came from, so they go back to the same row
+    shard = Column(Integer, nullable=True)
+    expires_at = Column(Float, nullable=False, index=True)
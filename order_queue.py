@@ -0,0 +1,160 @@
+import asyncio
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from fastapi import HTTPException
+
+import crud, inventory, metrics, models, schemas
+from database import SessionLocal
+
+# Write-behind mode for POST /api/orders: requests enqueue validated orders and a single
+# writer thread commits them in groups, so concurrent checkouts share one SQLite write
+# lock acquisition and one fsync. A request is answered only after its group commits.
+# One that waits longer than ORDER_COMMIT_TIMEOUT is withdrawn if the writer has not taken
+# it yet (503, safe to retry); otherwise its outcome is unknown (504).
+ORDER_WRITE_BEHIND = os.environ.get("ORDER_WRITE_BEHIND", "0") == "1"
+ORDER_BATCH_SIZE = int(os.environ.get("ORDER_BATCH_SIZE", "100"))
+ORDER_BATCH_WAIT_MS = float(os.environ.get("ORDER_BATCH_WAIT_MS", "5"))
+ORDER_COMMIT_TIMEOUT = float(os.environ.get("ORDER_COMMIT_TIMEOUT", "30"))
+
+BATCH_SIZE_BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000)
+
+commit_batch_size = metrics.registry.register(metrics.Histogram(
+    "order_commit_batch_size", "Orders written per group commit.", buckets=BATCH_SIZE_BUCKETS))
+commit_failures = metrics.registry.register(metrics.Counter(
+    "order_commit_failures_total", "Group commits that failed and were reported to every waiting request."))
+
+_STOP = object()
+
+class OrderWriter:
+
+    def __init__(self, session_factory, batch_size: int = ORDER_BATCH_SIZE, max_wait_ms: float = ORDER_BATCH_WAIT_MS):
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="order-writer", daemon=True)
+                self._thread.start()
+
+    def stop(self, timeout: float = 10):
+        # Drains what is already queued, then exits
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self.queue.put(_STOP)
+            thread.join(timeout)
+
+    def submit(self, order: schemas.OrderCreate, unit_price: float | None = None) -> Future:
+        # unit_price is the price the request validated against; None looks it up at commit
+        self.start()
+        future = Future()
+        self.queue.put((order, unit_price, future))
+        return future
+
+    def depth(self) -> int:
+        return self.queue.qsize()
+
+    def _next_batch(self):
+        # Block for the first order, then gather more until the batch is full or max_wait passes
+        first = self.queue.get()
+        if first is _STOP:
+            return None, True
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self.queue.get(timeout=remaining) if remaining > 0 else self.queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            batch, stopping = self._next_batch()
+            # Orders whose request gave up before this point are dropped unwritten
+            batch = [item for item in batch or () if item[2].set_running_or_notify_cancel()]
+            if batch:
+                self._commit(batch)
+
+    def _commit(self, batch):
+        try:
+            with self.session_factory() as db:
+                # Orders that cannot get their stock fail alone; the rest of the group commits
+                errors = inventory.claim_all(db, [order for order, _, _ in batch])
+                for (_, _, future), error in zip(batch, errors):
+                    if error is not None:
+                        future.set_exception(HTTPException(status_code=409, detail=error))
+                batch = [item for item, error in zip(batch, errors) if error is None]
+                if not batch:
+                    return
+                unit_prices = [price for _, price, _ in batch]
+                if None in unit_prices:
+                    prices = crud.get_product_prices(db, [order.product_id for order, _, _ in batch])
+                    unit_prices = [prices[order.product_id] if price is None else price for order, price, _ in batch]
+                ids = crud.create_orders_bulk(db, [order for order, _, _ in batch], unit_prices)
+                rows = {row.id: row for row in db.query(models.Order).filter(models.Order.id.in_(ids))}
+                results = [schemas.Order.model_validate(rows[order_id]) for order_id in ids]
+        except Exception as e:
+            commit_failures.inc()
+            for _, _, future in batch:
+                future.set_exception(e)
+            return
+        commit_batch_size.observe(len(batch))
+        for (_, _, future), result in zip(batch, results):
+            future.set_result(result)
+
+class CommitPending(HTTPException):
+    # 504 for an order the writer took but had not committed in time; `pending` is its future,
+    # which idempotency.py follows so a retry with the same key gets the committed order
+
+    def __init__(self, pending: Future):
+        super().__init__(status_code=504, detail="Order may have been placed but did not finish committing in time; "
+                                                 "check your orders before retrying")
+        self.pending = pending
+
+def timed_out(future: Future) -> HTTPException:
+    if future.cancel():
+        return HTTPException(status_code=503, detail="Order was not placed: the order queue is backed up, retry later")
+    return CommitPending(future)
+
+def result(future: Future, timeout: float | None = None):
+    try:
+        return future.result(timeout=ORDER_COMMIT_TIMEOUT if timeout is None else timeout)
+    except TimeoutError:
+        raise timed_out(future) from None
+
+async def result_async(future: Future, timeout: float | None = None):
+    # shield: timing out must not cancel an order the writer may already be committing
+    try:
+        return await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)), ORDER_COMMIT_TIMEOUT if timeout is None else timeout)
+    except TimeoutError:
+        raise timed_out(future) from None
+
+_writer = None
+
+def get_writer() -> OrderWriter:
+    global _writer
+    if _writer is None:
+        _writer = OrderWriter(SessionLocal)
+    return _writer
+
+def stop_writer():
+    if _writer is not None:
+        _writer.stop()
+
+metrics.register_gauge("order_queue_depth", "Orders waiting for the next group commit.", (),
+                       lambda: {(): _writer.depth() if _writer is not None else 0})
@@ -0,0 +1,63 @@
+from typing import Any
+
+from fastapi import HTTPException
+from pydantic import ValidationError
+
+import schemas
+
+MAX_BULK_ORDERS = 10000
+
+# Helpers for POST /api/orders/bulk, shared by the sync and async handlers.
+# Every item gets a result slot; validation and product checks fill in errors. Items are
+# taken as any JSON value, so one that is not an object fails alone rather than the batch.
+def parse_bulk_items(items: list[Any]):
+    results = [schemas.BulkOrderItemResult(index=i) for i in range(len(items))]
+    valid = []
+    for i, item in enumerate(items):
+        try:
+            valid.append((i, schemas.OrderCreate.model_validate(item)))
+        except ValidationError as e:
+            results[i].error = str(e)
+    return results, valid
+
+def accept_known_products(results, valid, known_ids):
+    accepted = []
+    for i, order in valid:
+        if order.product_id in known_ids:
+            accepted.append((i, order))
+        else:
+            results[i].error = "Product not found"
+    return accepted
+
+def accept_claimed(results, accepted, errors):
+    # errors from inventory.claim_all, one per accepted item
+    claimed = []
+    for (i, order), error in zip(accepted, errors):
+        if error is None:
+            claimed.append((i, order))
+        else:
+            results[i].error = error
+    return claimed
+
+def bulk_result(results, accepted, ids):
+    for (i, _), order_id in zip(accepted, ids):
+        results[i].id = order_id
+    return {"created": len(ids), "failed": len(results) - len(ids), "results": results}
+
+# POST /api/orders/checkout: one order row per cart line, all for the same customer.
+# An unknown product fails the whole cart; nothing is written.
+def checkout_orders(checkout: schemas.CheckoutCreate, prices):
+    missing = sorted({line.product_id for line in checkout.items} - prices.keys())
+    if missing:
+        raise HTTPException(status_code=404, detail=f"Products not found: {', '.join(map(str, missing))}")
+    customer = checkout.model_dump(exclude={"items"})
+    return [schemas.OrderCreate(**line.model_dump(), **customer) for line in checkout.items]
+
+def require_claimed(errors):
+    # errors from inventory.claim_all; a line that cannot get its stock fails the cart
+    failed = next((error for error in errors if error is not None), None)
+    if failed is not None:
+        raise HTTPException(status_code=409, detail=failed)
+
+def checkout_result(placed):
+    return {"orders": placed, "total": round(sum(order.unit_price * order.quantity for order in placed), 2)}
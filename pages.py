@@ -0,0 +1,80 @@
+import gzip
+import os
+import threading
+from email.utils import formatdate, parsedate_to_datetime
+
+from fastapi import Request, Response
+
+import assets, etag
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# PAGES_RELOAD=1 re-checks file mtimes on every request (development only)
+PAGES_RELOAD = os.environ.get("PAGES_RELOAD", "0") == "1"
+
+PAGES = ["index.html", "products.html", "order.html", "contact.html"]
+
+class Page:
+    # One HTML template held in memory with its precompressed variants
+
+    def __init__(self, path: str, transform=None):
+        self.path = path
+        self.mtime = os.stat(path).st_mtime
+        with open(path, "rb") as f:
+            self.body = f.read()
+        if transform is not None:
+            self.body = transform(self.body)
+        self.etag = etag.make_etag(self.body)
+        self.last_modified = formatdate(self.mtime, usegmt=True)
+        self.variants = {"identity": self.body, "gzip": gzip.compress(self.body, compresslevel=9, mtime=0)}
+        if brotli is not None:
+            self.variants["br"] = brotli.compress(self.body, quality=11)
+
+class PageStore:
+
+    def __init__(self, names, reload: bool = PAGES_RELOAD, transform=None):
+        self.names = names
+        self.reload = reload
+        self.transform = transform
+        self.pages = {}
+        self._lock = threading.Lock()
+
+    def load_all(self):
+        for name in self.names:
+            self.get(name)
+
+    def get(self, name: str) -> Page:
+        page = self.pages.get(name)
+        if page is None or (self.reload and os.stat(name).st_mtime != page.mtime):
+            with self._lock:
+                page = self.pages[name] = Page(name, self.transform)
+        return page
+
+    def response(self, request: Request, name: str):
+        page = self.get(name)
+        coding = etag.choose_encoding(request.headers.get("accept-encoding", ""), page.variants)
+        tag = page.etag if coding == "identity" else page.etag[:-1] + "-" + coding + '"'
+        headers = {"ETag": tag, "Last-Modified": page.last_modified, "Vary": "Accept-Encoding", "Cache-Control": "no-cache"}
+        if is_fresh(request, tag, page.mtime):
+            return Response(status_code=304, headers=headers)
+        if coding != "identity":
+            headers["Content-Encoding"] = coding
+        return Response(content=page.variants[coding], media_type="text/html; charset=utf-8", headers=headers)
+
+def is_fresh(request: Request, tag: str, mtime: float) -> bool:
+    # If-None-Match takes precedence; If-Modified-Since only applies without it
+    if "if-none-match" in request.headers:
+        return etag.is_not_modified(request, tag)
+    since = request.headers.get("if-modified-since")
+    if not since:
+        return False
+    try:
+        return int(mtime) <= parsedate_to_datetime(since).timestamp()
+    except (TypeError, ValueError):
+        return False
+
+# Asset references in the templates point at fingerprinted /static names
+store = PageStore(PAGES, transform=assets.pipeline.rewrite)
@@ -0,0 +1,38 @@
+import base64
+import json
+
+from fastapi import HTTPException
+
+
+# Opaque keyset cursors: the last seen primary key, base64-encoded so clients
+# treat it as a token rather than building offsets themselves.
+def encode_cursor(last_id: int) -> str:
+    raw = json.dumps({"id": last_id}, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> int | None:
+    # An empty cursor asks for the first page in cursor mode
+    if not cursor:
+        return None
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        last_id = json.loads(base64.urlsafe_b64decode(padded))["id"]
+    except (ValueError, TypeError, KeyError):
+        raise ValueError("Invalid cursor")
+    if not isinstance(last_id, int):
+        raise ValueError("Invalid cursor")
+    return last_id
+
+def next_cursor(rows, limit: int) -> str | None:
+    # A short page means there is nothing after it
+    if len(rows) < limit or not rows:
+        return None
+    return encode_cursor(rows[-1].id)
+
+def get_after_id(cursor: str | None):
+    if cursor is None:
+        return None
+    try:
+        return decode_cursor(cursor)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
@@ -0,0 +1,229 @@
+import itertools
+import logging
+import math
+import os
+import sqlite3
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import Session
+
+import database, metrics
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# Read replicas for the product and order listings; writes and every other endpoint use the
+# primary. READ_REPLICA_URLS (and ASYNC_READ_REPLICA_URLS for DATABASE_MODE=async) are
+# comma-separated, e.g. a Postgres streaming replica, or SQLite files kept in step with a SQLite
+# primary by the Replicator below. The product listing fills the catalog caches, so after an
+# invalidation it reads the primary until caught_up() says the replicas have the write.
+READ_REPLICA_URLS = [url.strip() for url in os.environ.get("READ_REPLICA_URLS", "").split(",") if url.strip()]
+ASYNC_READ_REPLICA_URLS = [url.strip() for url in os.environ.get("ASYNC_READ_REPLICA_URLS", "").split(",") if url.strip()]
+# round_robin, or least_loaded: the replica with the fewest read sessions open in this worker
+READ_REPLICA_POLICY = os.environ.get("READ_REPLICA_POLICY", "round_robin")
+POLICIES = ("round_robin", "least_loaded")
+# After a client places an order its reads stay on the primary this long, so its own order is
+# listed despite replication lag. Keep it above the replicas' lag.
+READ_YOUR_WRITES_SECONDS = float(os.environ.get("READ_YOUR_WRITES_SECONDS", "5"))
+STICKY_COOKIE = "read_primary_until"
+# Seconds between copies of a SQLite primary into SQLite replica files; 0 turns the stand-in off
+REPLICA_SYNC_INTERVAL = float(os.environ.get("REPLICA_SYNC_INTERVAL", "1"))
+
+logger = logging.getLogger("ecommerce.replicas")
+
+reads_total = metrics.registry.register(metrics.Counter(
+    "db_read_sessions_total", "Sessions opened by the listing endpoints, by target.", ("target",)))
+
+class ReplicaSet:
+    # Engines are built on first use, like the primary's
+
+    def __init__(self, urls, make_engine, policy: str = READ_REPLICA_POLICY):
+        if policy not in POLICIES:
+            raise ValueError(f"READ_REPLICA_POLICY must be one of: {', '.join(POLICIES)}")
+        self.urls = list(urls)
+        self.make_engine = make_engine
+        self.policy = policy
+        self.in_use = [0] * len(self.urls)
+        self._engines = [None] * len(self.urls)
+        self._turn = itertools.count()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.urls)
+
+    def engine(self, index: int):
+        with self._lock:
+            if self._engines[index] is None:
+                self._engines[index] = self.make_engine(self.urls[index])
+            return self._engines[index]
+
+    def acquire(self) -> int:
+        # Ties go to the next replica in turn, so least_loaded still spreads an idle start
+        with self._lock:
+            start = next(self._turn)
+            order = [(start + i) % len(self.urls) for i in range(len(self.urls))]
+            index = min(order, key=self.in_use.__getitem__) if self.policy == "least_loaded" else order[0]
+            self.in_use[index] += 1
+            return index
+
+    def release(self, index: int):
+        with self._lock:
+            self.in_use[index] -= 1
+
+    def dispose(self):
+        for engine in self._engines:
+            if engine is not None:
+                engine.dispose()
+
+def _sync_engine(url: str):
+    return metrics.instrument_engine(database.create_db_engine(url))
+
+def _async_engine(url: str):
+    from sqlalchemy.ext.asyncio import create_async_engine
+    engine = create_async_engine(url, **database.engine_options(url))
+    database.configure_engine(engine.sync_engine)
+    metrics.instrument_engine(engine.sync_engine)
+    return engine
+
+read_replicas = ReplicaSet(READ_REPLICA_URLS, _sync_engine)
+async_read_replicas = ReplicaSet(ASYNC_READ_REPLICA_URLS, _async_engine)
+
+def prefers_primary(request) -> bool:
+    try:
+        return float(request.cookies.get(STICKY_COOKIE, "0")) > time.time()
+    except ValueError:
+        return False
+
+def mark_write(response):
+    # On responses to order writes; the cookie keeps this client's listings on the primary
+    if read_replicas or async_read_replicas:
+        response.set_cookie(STICKY_COOKIE, f"{time.time() + READ_YOUR_WRITES_SECONDS:.3f}",
+                            max_age=math.ceil(READ_YOUR_WRITES_SECONDS), httponly=True, samesite="lax")
+
+@contextmanager
+def replica_session():
+    index = read_replicas.acquire()
+    reads_total.inc("replica")
+    try:
+        with Session(bind=read_replicas.engine(index), autoflush=False) as db:
+            yield db
+    finally:
+        read_replicas.release(index)
+
+@asynccontextmanager
+async def async_replica_session():
+    from sqlalchemy.ext.asyncio import AsyncSession
+    index = async_read_replicas.acquire()
+    reads_total.inc("replica")
+    try:
+        async with AsyncSession(async_read_replicas.engine(index), autoflush=False, expire_on_commit=False) as db:
+            yield db
+    finally:
+        async_read_replicas.release(index)
+
+def _sqlite_file(url: str) -> str | None:
+    url = make_url(url)
+    if url.get_backend_name() != "sqlite" or url.database in (None, "", ":memory:"):
+        return None
+    return url.database
+
+class Replicator:
+    # Local stand-in for streaming replication: copies the SQLite primary into each SQLite replica
+    # file with the online backup API every `interval` seconds, so replicas lag by up to one
+    # interval. Each copy is a full one, which is fine for development-sized databases. With
+    # several workers a lock file lets only one of them copy.
+
+    def __init__(self, source: str, targets, interval: float = REPLICA_SYNC_INTERVAL):
+        self.source = source
+        self.targets = list(targets)
+        self.interval = interval
+        self.synced_at = None
+        self._lock_file = None
+        self._stopping = threading.Event()
+        self._thread = None
+
+    def _leader(self) -> bool:
+        if fcntl is None:
+            return True
+        if self._lock_file is None:
+            self._lock_file = open(self.targets[0] + ".lock", "a")
+        try:
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return False
+        return True
+
+    def sync(self):
+        # synced_at is when the copy started: the replicas have every write committed before it
+        started = time.time()
+        source = sqlite3.connect(self.source)
+        try:
+            for target in self.targets:
+                replica = sqlite3.connect(target, timeout=database.SQLITE_BUSY_TIMEOUT_MS / 1000)
+                try:
+                    source.backup(replica)
+                finally:
+                    replica.close()
+        finally:
+            source.close()
+        self.synced_at = started
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._run, name="replicator", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 10):
+        thread, self._thread = self._thread, None
+        if thread is not None:
+            self._stopping.set()
+            thread.join(timeout)
+
+    def _run(self):
+        while not self._stopping.wait(self.interval):
+            try:
+                if self._leader():
+                    self.sync()
+            except Exception:
+                logger.exception("Copying the primary to the replicas failed")
+
+_replicator = None
+
+def start_replicator():
+    # From the lifespan: only for a SQLite file primary with SQLite file replicas
+    global _replicator
+    source = _sqlite_file(database.SQLALCHEMY_DATABASE_URL)
+    targets = [path for path in map(_sqlite_file, READ_REPLICA_URLS + ASYNC_READ_REPLICA_URLS) if path is not None]
+    if REPLICA_SYNC_INTERVAL <= 0 or source is None or not targets:
+        return
+    if _replicator is None:
+        _replicator = Replicator(source, dict.fromkeys(targets))
+        # Replicas have the schema and data before the first read
+        if _replicator._leader():
+            _replicator.sync()
+    _replicator.start()
+
+def stop_replicator():
+    if _replicator is not None:
+        _replicator.stop()
+
+def caught_up(since: float) -> bool:
+    # Whether the replicas have every write committed before `since` (wall-clock). Known for the
+    # SQLite replicas this worker copies; otherwise assumed once READ_YOUR_WRITES_SECONDS, which is
+    # kept above the replicas' lag, has passed.
+    if _replicator is not None and _replicator.synced_at is not None:
+        return _replicator.synced_at > since
+    return time.time() - READ_YOUR_WRITES_SECONDS > since
+
+def _lag():
+    if _replicator is None or _replicator.synced_at is None:
+        return {}
+    return {(): time.time() - _replicator.synced_at}
+
+metrics.register_gauge("replica_lag_seconds", "Seconds since the SQLite replicas were last copied from the primary.", (), _lag)
@@ -1,14 +1,72 @@
-from pydantic import BaseModel
+from datetime import date, datetime
+
+from pydantic import BaseModel, Field
 
 class OrderBase(BaseModel):
     product_id: int
-    quantity: int
+    quantity: int = Field(gt=0)
     customer_name: str
     customer_email: str
     shipping_address: str
 
+class OrderCreate(OrderBase):
+    # Consumes a reservation from POST /api/reservations instead of taking fresh stock
+    reservation_id: int | None = None
+
 class Order(OrderBase):
-    pass
+    id: int
+    unit_price: float
+    created_at: datetime | None = None
+
+    class Config:
+        from_attributes = True
+
+class OrderPage(BaseModel):
+    items: list[Order]
+    next_cursor: str | None = None
+
+class OrderLine(BaseModel):
+    product_id: int
+    quantity: int = Field(gt=0)
+    reservation_id: int | None = None
+
+class CheckoutCreate(BaseModel):
+    customer_name: str
+    customer_email: str
+    shipping_address: str
+    items: list[OrderLine] = Field(min_length=1, max_length=100)
+
+class Checkout(BaseModel):
+    orders: list[Order]
+    total: float
+
+class BulkOrderItemResult(BaseModel):
+    index: int
+    id: int | None = None
+    error: str | None = None
+
+class BulkOrderResult(BaseModel):
+    created: int
+    failed: int
+    results: list[BulkOrderItemResult]
+
+class ProductSales(BaseModel):
+    product_id: int
+    orders: int = 0
+    units: int = 0
+    revenue: float = 0
+
+    class Config:
+        from_attributes = True
+
+class DailySales(BaseModel):
+    day: date
+    orders: int
+    units: int
+    revenue: float
+
+    class Config:
+        from_attributes = True
 
 class ProductBase(BaseModel):
     name: str
@@ -23,4 +81,26 @@ class Product(ProductBase):
     id: int
 
     class Config:
-        orm_mode = True
\ No newline at end of file
+        from_attributes = True
+
+class ReservationCreate(BaseModel):
+    product_id: int
+    quantity: int = Field(gt=0)
+
+class Reservation(ReservationCreate):
+    id: int
+    expires_at: datetime
+
+    class Config:
+        from_attributes = True
+
+class StockLevel(BaseModel):
+    product_id: int
+    # None when the product's stock is not tracked
+    stock: int | None = None
+    shards: int = 0
+    reserved: int = 0
+
+class ProductPage(BaseModel):
+    items: list[Product]
+    next_cursor: str | None = None
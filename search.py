@@ -0,0 +1,83 @@
+import re
+
+from sqlalchemy import event, select, text
+
+import models
+
+# Full-text search over products.name/description with SQLite FTS5. The index is an
+# external-content table kept in sync with `products` by triggers, so crud.create_product
+# and bulk inserts need no extra writes.
+FTS_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS products_fts USING fts5("
+    "name, description, content='products', content_rowid='id', tokenize='unicode61', prefix='2 3')",
+    "CREATE TRIGGER IF NOT EXISTS products_fts_ai AFTER INSERT ON products BEGIN "
+    "INSERT INTO products_fts(rowid, name, description) VALUES (new.id, new.name, new.description); END",
+    "CREATE TRIGGER IF NOT EXISTS products_fts_ad AFTER DELETE ON products BEGIN "
+    "INSERT INTO products_fts(products_fts, rowid, name, description) VALUES ('delete', old.id, old.name, old.description); END",
+    "CREATE TRIGGER IF NOT EXISTS products_fts_au AFTER UPDATE ON products BEGIN "
+    "INSERT INTO products_fts(products_fts, rowid, name, description) VALUES ('delete', old.id, old.name, old.description); "
+    "INSERT INTO products_fts(rowid, name, description) VALUES (new.id, new.name, new.description); END",
+]
+
+# bm25 column weights: a match in the name counts ten times one in the description
+RANK = "bm25(products_fts, 10.0, 1.0)"
+
+MAX_RESULTS = 100
+
+def create_index(connection):
+    for ddl in FTS_DDL:
+        connection.exec_driver_sql(ddl)
+
+@event.listens_for(models.Product.__table__, "after_create")
+def _create_index_with_products(target, connection, **kw):
+    if connection.dialect.name == "sqlite":
+        create_index(connection)
+
+def ensure_index(engine):
+    # For databases created before search existed: build the index and backfill it once
+    if engine.dialect.name != "sqlite":
+        return
+    with engine.begin() as connection:
+        exists = connection.exec_driver_sql("SELECT 1 FROM sqlite_master WHERE name = 'products_fts'").first()
+        if exists is None:
+            create_index(connection)
+            connection.exec_driver_sql("INSERT INTO products_fts(products_fts) VALUES ('rebuild')")
+
+def build_match(q: str) -> str | None:
+    # Every word must match and the last one is a prefix (search-as-you-type);
+    # quoting keeps FTS5 operators out of user input
+    terms = [f'"{term}"' for term in re.findall(r"\w+", q.lower())]
+    if not terms:
+        return None
+    return " ".join(terms) + "*"
+
+def search_statement(q: str, min_price: float | None = None, max_price: float | None = None, limit: int = 20):
+    params = {"limit": min(limit, MAX_RESULTS)}
+    price = ""
+    if min_price is not None:
+        price += " AND products.price >= :min_price"
+        params["min_price"] = min_price
+    if max_price is not None:
+        price += " AND products.price <= :max_price"
+        params["max_price"] = max_price
+    match = build_match(q)
+    if match is None:
+        # Price-only browsing is served by the (price, id) composite index
+        sql = f"SELECT products.* FROM products WHERE 1 = 1{price} ORDER BY products.price, products.id LIMIT :limit"
+    else:
+        # Every match is price-filtered and ranked before the limit, so a broad query still
+        # returns the best hits in range rather than the best of whichever rows FTS yields first
+        params["match"] = match
+        sql = (
+            "SELECT products.* FROM products_fts JOIN products ON products.id = products_fts.rowid "
+            f"WHERE products_fts MATCH :match{price} ORDER BY {RANK} LIMIT :limit"
+        )
+    return select(models.Product).from_statement(text(sql)), params
+
+def search_products(db, q: str, min_price: float | None = None, max_price: float | None = None, limit: int = 20):
+    stmt, params = search_statement(q, min_price, max_price, limit)
+    return db.scalars(stmt, params).all()
+
+async def search_products_async(db, q: str, min_price: float | None = None, max_price: float | None = None, limit: int = 20):
+    stmt, params = search_statement(q, min_price, max_price, limit)
+    return (await db.scalars(stmt, params)).all()
@@ -0,0 +1,98 @@
+import argparse
+import gc
+import importlib.util
+import os
+
+# Production entry point: python server.py
+#
+# Runs gunicorn with uvicorn workers when gunicorn is installed (Linux/macOS), otherwise
+# uvicorn's own process manager. Worker count defaults to the CPUs this process may use.
+# With gunicorn the app is imported once in the master and forked, so workers share the
+# loaded code and templates copy-on-write; `kill -HUP <master>` replaces workers gracefully,
+# and with --no-preload that also picks up new code. --reload is for development only.
+#
+# When more than one worker runs, the catalog cache gets a shared second tier (shared_cache.py)
+# unless CATALOG_SHARED_CACHE is already set.
+
+def cpu_count() -> int:
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+WEB_CONCURRENCY = int(os.environ.get("WEB_CONCURRENCY", "0")) or cpu_count()
+HOST = os.environ.get("HOST", "0.0.0.0")
+PORT = int(os.environ.get("PORT", "8000"))
+GRACEFUL_TIMEOUT = int(os.environ.get("GRACEFUL_TIMEOUT", "30"))
+
+def post_fork(server, worker):
+    import database
+    database.dispose_after_fork()
+
+def prepare_database():
+    # Create the schema once here instead of in every worker's lifespan at the same time
+    import database
+    if database.SCHEMA_AUTO_CREATE:
+        database.init_db()
+        database.get_engine().dispose()
+        database.SCHEMA_AUTO_CREATE = False
+        os.environ["SCHEMA_AUTO_CREATE"] = "0"
+
+def pre_fork(server, worker):
+    # Keep the preloaded heap out of the collector so it does not dirty shared pages
+    gc.freeze()
+
+def run_gunicorn(workers: int, preload: bool):
+    from gunicorn.app.base import BaseApplication
+
+    class Application(BaseApplication):
+
+        def load_config(self):
+            options = {
+                "bind": f"{HOST}:{PORT}",
+                "workers": workers,
+                "worker_class": "uvicorn_worker.UvicornWorker",
+                "preload_app": preload,
+                "graceful_timeout": GRACEFUL_TIMEOUT,
+                "post_fork": post_fork,
+                "pre_fork": pre_fork,
+            }
+            for key, value in options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            from main import app
+            return app
+
+    Application().run()
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the shop API")
+    parser.add_argument("--workers", type=int, default=WEB_CONCURRENCY)
+    parser.add_argument("--reload", action="store_true", help="single process, restart on code changes")
+    parser.add_argument("--no-preload", action="store_true", help="import the app in each worker instead of the master")
+    parser.add_argument("--uvicorn", action="store_true", help="use uvicorn's process manager even if gunicorn is installed")
+    args = parser.parse_args()
+
+    import uvicorn
+    if args.reload:
+        uvicorn.run("main:app", host=HOST, port=PORT, reload=True)
+        return
+    if args.workers > 1 and "CATALOG_SHARED_CACHE" not in os.environ:
+        import shared_cache
+        # Start empty: entries left by a previous run may predate database changes
+        path = shared_cache.default_path()
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+        os.environ["CATALOG_SHARED_CACHE"] = path
+    prepare_database()
+    if not (importlib.util.find_spec("gunicorn") and importlib.util.find_spec("uvicorn_worker")):
+        args.uvicorn = True
+    if args.uvicorn:
+        uvicorn.run("main:app", host=HOST, port=PORT, workers=args.workers, timeout_graceful_shutdown=GRACEFUL_TIMEOUT)
+    else:
+        run_gunicorn(args.workers, preload=not args.no_preload)
+
+if __name__ == "__main__":
+    main()
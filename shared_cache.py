@@ -0,0 +1,94 @@
+import os
+import pickle
+import sqlite3
+import tempfile
+import threading
+import time
+
+# Second cache tier shared by every worker process on a host, so scaling out workers does not
+# split the catalog hit rate N ways. Values are pickled. Each namespace has a generation number:
+# invalidating bumps it, which makes every older entry unreachable in all workers at once.
+#
+# CATALOG_SHARED_CACHE selects the backend:
+#   ""                        disabled (single process)
+#   redis://localhost:6379/0  Redis or any server speaking its protocol; needs the `redis` package
+#   /dev/shm/ecommerce.cache  a SQLite file, ideally on a tmpfs
+
+PRUNE_EVERY = 256
+
+def default_path() -> str:
+    directory = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+    return os.path.join(directory, "ecommerce-cache.db")
+
+class SQLiteStore:
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._sets = 0
+        with self._connect() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, value BLOB NOT NULL, expires_at REAL NOT NULL)")
+            conn.execute("CREATE TABLE IF NOT EXISTS generations (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+
+    def _connect(self):
+        # One connection per thread; losing cache writes on a power cut is fine
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=OFF")
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def get(self, key: str):
+        row = self._connect().execute("SELECT value, expires_at FROM entries WHERE key = ?", (key,)).fetchone()
+        if row is None or row[1] <= time.time():
+            return None
+        return pickle.loads(row[0])
+
+    def set(self, key: str, value, ttl: float):
+        conn = self._connect()
+        now = time.time()
+        conn.execute("INSERT OR REPLACE INTO entries (key, value, expires_at) VALUES (?, ?, ?)",
+                     (key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL), now + ttl))
+        self._sets += 1
+        if self._sets % PRUNE_EVERY == 0:
+            conn.execute("DELETE FROM entries WHERE expires_at <= ?", (now,))
+
+    def generation(self, name: str) -> int:
+        row = self._connect().execute("SELECT value FROM generations WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else 0
+
+    def bump(self, name: str) -> int:
+        return self._connect().execute(
+            "INSERT INTO generations (name, value) VALUES (?, 1) "
+            "ON CONFLICT(name) DO UPDATE SET value = value + 1 RETURNING value", (name,)).fetchone()[0]
+
+class RedisStore:
+
+    def __init__(self, url: str):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("CATALOG_SHARED_CACHE points at Redis but the `redis` package is not installed")
+        self.client = redis.Redis.from_url(url)
+
+    def get(self, key: str):
+        value = self.client.get(key)
+        return pickle.loads(value) if value is not None else None
+
+    def set(self, key: str, value, ttl: float):
+        self.client.set(key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL), px=int(ttl * 1000))
+
+    def generation(self, name: str) -> int:
+        return int(self.client.get(f"generation:{name}") or 0)
+
+    def bump(self, name: str) -> int:
+        return self.client.incr(f"generation:{name}")
+
+def open_store(url: str):
+    if not url:
+        return None
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisStore(url)
+    return SQLiteStore(url)
@@ -4,10 +4,17 @@ document.addEventListener('DOMContentLoaded', () => {
     const orderForm = document.getElementById('orderForm');
     const contactForm = document.getElementById('contactForm');
 
+    // Local product images are resized by the server; see images.py
+    const thumbnail = (url, width) => {
+        if (!url) return 'placeholder.jpg';
+        return url.startsWith('/images/') ? `${url}?w=${width}` : url;
+    };
+
     // Function to fetch and display products
     const fetchProducts = async () => {
         try {
-            const response = await fetch('/api/products');
+            // The order form's dropdown only needs id, name and price
+            const response = await fetch(productListDiv ? '/api/products' : '/api/products?fields=id,name,price');
             const products = await response.json();
 
             if (productListDiv) {
@@ -16,7 +23,7 @@ document.addEventListener('DOMContentLoaded', () => {
                     const productItem = document.createElement('div');
                     productItem.classList.add('product-item');
                     productItem.innerHTML = `
-                        <img src="${product.image_url || 'placeholder.jpg'}" alt="${product.name}">
+                        <img src="${thumbnail(product.image_url, 320)}" srcset="${thumbnail(product.image_url, 640)} 2x" alt="${product.name}" loading="lazy">
                         <h3>${product.name}</h3>
                         <p>${product.description || ''}</p>
                         <p class="price">$${product.price.toFixed(2)}</p>
@@ -47,10 +54,15 @@ document.addEventListener('DOMContentLoaded', () => {
         fetchProducts();
     }
 
-    // Handle order form submission
+    // Handle order form submission. Resubmitting the same order (e.g. after a timeout)
+    // reuses its Idempotency-Key, so the server places it at most once.
     if (orderForm) {
+        let idempotencyKey = null;
+        orderForm.addEventListener('input', () => { idempotencyKey = null; });
+
         orderForm.addEventListener('submit', async (event) => {
             event.preventDefault();
+            idempotencyKey = idempotencyKey || crypto.randomUUID();
 
             const formData = new FormData(orderForm);
             const orderData = {
@@ -62,10 +74,11 @@ document.addEventListener('DOMContentLoaded', () => {
             };
 
             try {
-                const response = await fetch('/api/orders/', {
+                const response = await fetch('/api/orders', {
                     method: 'POST',
                     headers: {
                         'Content-Type': 'application/json',
+                        'Idempotency-Key': idempotencyKey,
                     },
                     body: JSON.stringify(orderData),
                 });
@@ -73,6 +86,7 @@ document.addEventListener('DOMContentLoaded', () => {
                 if (response.ok) {
                     alert('Order placed successfully!');
                     orderForm.reset();
+                    idempotencyKey = null;
                 } else {
                     const errorData = await response.json();
                     alert(`Failed to place order: ${errorData.detail || response.statusText}`);
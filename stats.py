@@ -0,0 +1,104 @@
+import argparse
+from collections import defaultdict
+
+from sqlalchemy import delete, select
+
+import models
+
+# Per-product and per-day sales totals. The order write paths fold each batch into these
+# rows inside the order transaction, so dashboards read one row instead of aggregating
+# `orders`. `python stats.py rebuild` recomputes them from scratch after a restore or a
+# manual edit to orders.
+
+def _insert(dialect_name: str, model):
+    # ON CONFLICT DO UPDATE has the same shape on SQLite and PostgreSQL. Imported here:
+    # the PostgreSQL dialect alone adds tens of milliseconds to app import.
+    if dialect_name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert(model)
+
+def tally(entries):
+    # entries are (product_id, quantity, unit_price, created_at); totals are [orders, units, revenue]
+    products = defaultdict(lambda: [0, 0, 0.0])
+    days = defaultdict(lambda: [0, 0, 0.0])
+    for product_id, quantity, unit_price, created_at in entries:
+        for totals in (products[product_id], days[created_at.date()]):
+            totals[0] += 1
+            totals[1] += quantity
+            totals[2] += quantity * unit_price
+    return products, days
+
+def upsert_statements(dialect_name: str, products, days):
+    statements = []
+    for model, key, totals in ((models.ProductSales, "product_id", products), (models.DailySales, "day", days)):
+        if not totals:
+            continue
+        stmt = _insert(dialect_name, model)
+        stmt = stmt.on_conflict_do_update(index_elements=[key], set_={
+            "orders": model.orders + stmt.excluded.orders,
+            "units": model.units + stmt.excluded.units,
+            "revenue": model.revenue + stmt.excluded.revenue,
+        })
+        # Sorted keys give concurrent writers the same row lock order
+        rows = [{key: k, "orders": o, "units": u, "revenue": r} for k, (o, u, r) in sorted(totals.items())]
+        statements.append((stmt, rows))
+    return statements
+
+def record_sales(db, entries):
+    # Call before the order transaction commits
+    products, days = tally(entries)
+    for stmt, rows in upsert_statements(db.get_bind().dialect.name, products, days):
+        db.execute(stmt, rows)
+
+async def record_sales_async(db, entries):
+    products, days = tally(entries)
+    for stmt, rows in upsert_statements(db.get_bind().dialect.name, products, days):
+        await db.execute(stmt, rows)
+
+def daily_statement(start=None, end=None, limit: int = 90):
+    stmt = select(models.DailySales).order_by(models.DailySales.day)
+    if start is not None:
+        stmt = stmt.where(models.DailySales.day >= start)
+    if end is not None:
+        stmt = stmt.where(models.DailySales.day <= end)
+    return stmt.limit(limit)
+
+def get_product_sales(db, product_id: int):
+    return db.get(models.ProductSales, product_id)
+
+def get_daily_sales(db, start=None, end=None, limit: int = 90):
+    return db.scalars(daily_statement(start, end, limit)).all()
+
+async def get_product_sales_async(db, product_id: int):
+    return await db.get(models.ProductSales, product_id)
+
+async def get_daily_sales_async(db, start=None, end=None, limit: int = 90):
+    return (await db.scalars(daily_statement(start, end, limit))).all()
+
+def rebuild(db, batch_size: int = 10000):
+    # One streaming pass over orders; memory grows with products and days, not orders.
+    # Run with order writes paused: on SQLite a concurrent commit makes this fail rather
+    # than silently drop the newer orders.
+    table = models.Order.__table__
+    stmt = select(table.c.product_id, table.c.quantity, table.c.unit_price, table.c.created_at)
+    result = db.execute(stmt.execution_options(stream_results=True, yield_per=batch_size))
+    products, days = tally(row for partition in result.partitions() for row in partition)
+    db.execute(delete(models.ProductSales))
+    db.execute(delete(models.DailySales))
+    for stmt, rows in upsert_statements(db.get_bind().dialect.name, products, days):
+        db.execute(stmt, rows)
+    db.commit()
+    return len(products), len(days)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sales aggregate maintenance")
+    parser.add_argument("command", choices=["rebuild"])
+    parser.add_argument("--batch-size", type=int, default=10000)
+    args = parser.parse_args()
+
+    from database import SessionLocal
+    with SessionLocal() as db:
+        products, days = rebuild(db, args.batch_size)
+    print(f"Rebuilt sales for {products} products over {days} days")
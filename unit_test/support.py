@@ -0,0 +1,44 @@
+import unittest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+import cache, models
+from main import app, get_db
+
+CUSTOMER = dict(customer_name='Test Customer', customer_email='test@example.com', shipping_address='Test Address')
+
+def order(product_id, quantity=1, **overrides):
+    return dict(CUSTOMER, product_id=product_id, quantity=quantity, **overrides)
+
+def memory_engine():
+    # One shared connection, so every session sees the same in-memory database
+    return create_engine('sqlite://', connect_args={"check_same_thread": False}, poolclass=StaticPool)
+
+class AppTestCase(unittest.TestCase):
+    # The app on a fresh in-memory database, seeded by seed(), with an empty catalog cache
+
+    def setUp(self):
+        cache.catalog_cache.invalidate()
+        self.addCleanup(cache.catalog_cache.invalidate)
+        self.engine = memory_engine()
+        self.addCleanup(self.engine.dispose)
+        models.Base.metadata.create_all(self.engine)
+        self.Session = sessionmaker(bind=self.engine)
+        with self.Session() as db:
+            self.seed(db)
+
+        def override_get_db():
+            db = self.Session()
+            try:
+                yield db
+            finally:
+                db.close()
+
+        app.dependency_overrides[get_db] = override_get_db
+        self.addCleanup(app.dependency_overrides.clear)
+        self.client = TestClient(app)
+
+    def seed(self, db):
+        pass
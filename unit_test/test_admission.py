@@ -0,0 +1,154 @@
+import asyncio
+import unittest
+from unittest.mock import patch
+
+import admission
+from unit_test.support import AppTestCase
+
+def route_classes(wait_ms=1000):
+    return {route_class.name: route_class for route_class in (
+        admission.RouteClass("orders", 0, 2, wait_ms),
+        admission.RouteClass("api", 1, 1, wait_ms),
+        admission.RouteClass("batch", 3, 1, wait_ms),
+    )}
+
+async def settle():
+    # Lets woken waiters run
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+class TestClassify(unittest.TestCase):
+
+    def test_route_classes(self):
+        self.assertEqual(admission.classify("POST", "/api/orders"), "orders")
+        self.assertEqual(admission.classify("POST", "/api/orders/checkout"), "orders")
+        self.assertEqual(admission.classify("DELETE", "/api/reservations/abc"), "orders")
+        self.assertEqual(admission.classify("GET", "/api/orders"), "api")
+        self.assertEqual(admission.classify("POST", "/api/orders/bulk"), "batch")
+        self.assertEqual(admission.classify("GET", "/api/orders/export"), "batch")
+        self.assertEqual(admission.classify("GET", "/products"), "pages")
+        self.assertIsNone(admission.classify("GET", "/static/script.js"))
+        self.assertIsNone(admission.classify("GET", "/metrics"))
+
+class TestAdmissionController(unittest.TestCase):
+
+    def test_priority_and_class_limits(self):
+        async def scenario():
+            controller = admission.AdmissionController(capacity=2, queue_size=4, classes=route_classes())
+            classes = controller.classes
+            await controller.acquire(classes["api"])
+            # api is at its own limit but orders still has room
+            await controller.acquire(classes["orders"])
+            admitted = []
+
+            async def request(name):
+                await controller.acquire(classes[name])
+                admitted.append(name)
+
+            tasks = [asyncio.create_task(request(name)) for name in ("batch", "api", "orders")]
+            await asyncio.sleep(0)
+            self.assertEqual(controller.queued(), 3)
+            controller.release(classes["api"], 0.01)
+            await settle()
+            # The freed slot goes to the order, not the earlier arrivals
+            self.assertEqual(admitted, ["orders"])
+            controller.release(classes["orders"], 0.01)
+            await settle()
+            self.assertEqual(admitted, ["orders", "api"])
+            controller.release(classes["orders"], 0.01)
+            await asyncio.gather(*tasks)
+            self.assertEqual(admitted, ["orders", "api", "batch"])
+            self.assertEqual(controller.in_flight, {"orders": 0, "api": 1, "batch": 1})
+
+        asyncio.run(scenario())
+
+    def test_full_queue_evicts_lower_priority(self):
+        async def scenario():
+            controller = admission.AdmissionController(capacity=1, queue_size=1, classes=route_classes())
+            classes = controller.classes
+            await controller.acquire(classes["orders"])
+            batch = asyncio.create_task(controller.acquire(classes["batch"]))
+            await asyncio.sleep(0)
+            order = asyncio.create_task(controller.acquire(classes["orders"]))
+            await asyncio.sleep(0)
+            with self.assertRaises(admission.Shed) as shed:
+                await batch
+            self.assertEqual(shed.exception.reason, "evicted")
+            # A full queue of orders turns away further batch work
+            with self.assertRaises(admission.Shed) as shed:
+                await controller.acquire(classes["batch"])
+            self.assertEqual(shed.exception.reason, "queue_full")
+            controller.release(classes["orders"], 0.01)
+            await order
+
+        asyncio.run(scenario())
+
+    def test_deadline(self):
+        async def scenario():
+            controller = admission.AdmissionController(capacity=1, queue_size=8, classes=route_classes(wait_ms=20))
+            classes = controller.classes
+            await controller.acquire(classes["orders"])
+            with self.assertRaises(admission.Shed) as shed:
+                await controller.acquire(classes["api"])
+            self.assertEqual(shed.exception.reason, "deadline")
+            self.assertEqual(controller.queued(), 0)
+            # Slow requests make the estimate exceed the deadline, so the next one is refused at once
+            controller.service_time = 1.0
+            loop = asyncio.get_running_loop()
+            started = loop.time()
+            with self.assertRaises(admission.Shed):
+                await controller.acquire(classes["api"])
+            self.assertLess(loop.time() - started, 0.01)
+
+        asyncio.run(scenario())
+
+class TestRateLimiter(unittest.TestCase):
+
+    def test_token_bucket(self):
+        now = [0.0]
+        limiter = admission.RateLimiter(rate=2, burst=2, max_clients=2, clock=lambda: now[0])
+        self.assertEqual([limiter.take("a") for _ in range(3)], [0, 0, 0.5])
+        self.assertEqual(limiter.take("b"), 0)
+        now[0] = 0.5
+        self.assertEqual(limiter.take("a"), 0)
+        # "b" is forgotten once a third client shows up
+        limiter.take("c")
+        self.assertNotIn("b", limiter._buckets)
+
+class TestAdmissionMiddleware(AppTestCase):
+
+    def test_busy_server_sheds(self):
+        controller = admission.AdmissionController(capacity=1, classes=dict(route_classes(wait_ms=0), pages=admission.RouteClass("pages", 2, 1, 0)))
+        controller.total = 1
+        patcher = patch.object(admission, "controller", controller)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        before = admission.shed_total.value("api", "deadline")
+        response = self.client.get("/api/products")
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.headers["retry-after"], "1")
+        self.assertEqual(admission.shed_total.value("api", "deadline") - before, 1)
+        self.assertEqual(self.client.get("/static/script.js").status_code, 200)
+        controller.total = 0
+        self.assertEqual(self.client.get("/api/products").status_code, 200)
+        self.assertEqual(controller.total, 0)
+
+    def test_rate_limited_client(self):
+        patcher = patch.object(admission, "limiter", admission.RateLimiter(rate=0.5, burst=2))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        codes = [self.client.get("/api/products").status_code for _ in range(3)]
+        self.assertEqual(codes, [200, 200, 429])
+        self.assertEqual(self.client.get("/api/products").headers["retry-after"], "2")
+
+    def test_disabled(self):
+        controller = admission.AdmissionController(capacity=1, classes=route_classes(wait_ms=0))
+        controller.total = 1
+        for name, value in (("controller", controller), ("ADMISSION_CONTROL", False)):
+            patcher = patch.object(admission, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.assertEqual(self.client.get("/api/products").status_code, 200)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,47 @@
+import unittest
+
+import models
+from unit_test.support import AppTestCase, order
+
+class TestBulkOrders(AppTestCase):
+
+    def seed(self, db):
+        db.add_all([models.Product(name=f'Product {i}', price=1.0) for i in range(3)])
+        db.commit()
+
+    def test_bulk_insert(self):
+        response = self.client.post("/api/orders/bulk", json=[order(1), order(2), order(3, quantity=5)])
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual((body["created"], body["failed"]), (3, 0))
+        with self.Session() as db:
+            self.assertEqual(db.query(models.Order).count(), 3)
+            ids = [r["id"] for r in body["results"]]
+            self.assertEqual(db.get(models.Order, ids[2]).quantity, 5)
+
+    def test_per_item_errors(self):
+        response = self.client.post("/api/orders/bulk", json=[order(1), order(99), {"product_id": 2}, order(2)])
+        body = response.json()
+        self.assertEqual((body["created"], body["failed"]), (2, 2))
+        results = body["results"]
+        self.assertIsNotNone(results[0]["id"])
+        self.assertEqual(results[1]["error"], "Product not found")
+        self.assertIsNone(results[2]["id"])
+        self.assertIsNotNone(results[2]["error"])
+        self.assertIsNotNone(results[3]["id"])
+
+    def test_items_that_are_not_objects(self):
+        response = self.client.post("/api/orders/bulk", json=[order(1), None, "x", [1], order(2)])
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual((body["created"], body["failed"]), (2, 3))
+        self.assertTrue(all(r["error"] for r in body["results"][1:4]))
+        with self.Session() as db:
+            self.assertEqual(db.query(models.Order).count(), 2)
+
+    def test_batch_too_large(self):
+        response = self.client.post("/api/orders/bulk", json=[order(1)] * 10001)
+        self.assertEqual(response.status_code, 413)
+
+if __name__ == '__main__':
+    unittest.main()
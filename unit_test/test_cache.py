@@ -0,0 +1,182 @@
+import asyncio
+import os
+import tempfile
+import threading
+import time
+import unittest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import cache, crud, models, schemas, shared_cache
+from cache import TTLCache
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+class TestTTLCache(unittest.TestCase):
+
+    def test_lru_eviction(self):
+        c = TTLCache(maxsize=2)
+        c.set('a', 1)
+        c.set('b', 2)
+        c.get('a')
+        c.set('c', 3)
+        self.assertIsNone(c.get('b'))
+        self.assertEqual(c.get('a'), 1)
+        self.assertEqual(c.stats()['evictions'], 1)
+
+    def test_ttl_expiry(self):
+        clock = FakeClock()
+        c = TTLCache(ttl=10, clock=clock)
+        c.set('a', 1)
+        clock.now = 9
+        self.assertEqual(c.get('a'), 1)
+        clock.now = 11
+        self.assertIsNone(c.get('a'))
+        self.assertEqual((c.hits, c.misses), (1, 1))
+
+    def test_load_racing_invalidation_is_not_stored(self):
+        c = TTLCache()
+
+        def loader():
+            c.invalidate()
+            return 'stale'
+
+        self.assertEqual(c.get_or_load('a', loader), 'stale')
+        self.assertIsNone(c.get('a'))
+
+class TestSingleFlight(unittest.TestCase):
+
+    def test_concurrent_misses_share_one_load(self):
+        c = TTLCache()
+        calls, results = [], []
+
+        def loader():
+            calls.append(1)
+            time.sleep(0.1)
+            return 'page'
+
+        threads = [threading.Thread(target=lambda: results.append(c.get_or_load('k', loader))) for _ in range(20)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, ['page'] * 20)
+        self.assertEqual(c.coalesced, 19)
+
+    def test_async_misses_share_one_load(self):
+        c = TTLCache()
+        calls = []
+
+        async def loader():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return 'page'
+
+        async def burst():
+            return await asyncio.gather(*(c.get_or_load_async('k', loader) for _ in range(50)))
+
+        self.assertEqual(asyncio.run(burst()), ['page'] * 50)
+        self.assertEqual(len(calls), 1)
+
+    def test_error_reaches_waiters_and_is_not_cached(self):
+        c = TTLCache()
+        started = threading.Event()
+        errors = []
+
+        def failing():
+            started.set()
+            time.sleep(0.05)
+            raise RuntimeError('database down')
+
+        def call():
+            try:
+                c.get_or_load('k', failing)
+            except RuntimeError as e:
+                errors.append(e)
+
+        owner = threading.Thread(target=call)
+        owner.start()
+        started.wait(5)
+        waiter = threading.Thread(target=call)
+        waiter.start()
+        owner.join()
+        waiter.join()
+        self.assertEqual(len(errors), 2)
+        self.assertEqual(c.get_or_load('k', lambda: 'ok'), 'ok')
+
+    def test_disabled(self):
+        c = TTLCache(single_flight=False)
+        calls = []
+
+        async def loader():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return 'page'
+
+        async def burst():
+            return await asyncio.gather(*(c.get_or_load_async('k', loader) for _ in range(5)))
+
+        asyncio.run(burst())
+        self.assertEqual(len(calls), 5)
+
+class TestSharedTier(unittest.TestCase):
+
+    def setUp(self):
+        path = os.path.join(tempfile.mkdtemp(), 'cache.db')
+        # Two caches over one store stand in for two worker processes
+        self.a = TTLCache(shared=shared_cache.SQLiteStore(path), name='catalog', sync_interval=0)
+        self.b = TTLCache(shared=shared_cache.SQLiteStore(path), name='catalog', sync_interval=0)
+
+    def test_miss_is_served_by_other_worker(self):
+        self.a.set(('product', 1), schemas.Product(id=1, name='Shirt', price=1.0))
+        self.assertEqual(self.b.get(('product', 1)).name, 'Shirt')
+        self.assertEqual((self.b.shared_hits, self.b.misses), (1, 0))
+        self.assertEqual(self.b.get(('product', 1)).name, 'Shirt')
+        self.assertEqual(self.b.hits, 1)
+
+    def test_invalidation_reaches_other_worker(self):
+        self.a.set('k', 1)
+        self.assertEqual(self.b.get('k'), 1)
+        self.a.invalidate(lambda key: key == 'k')
+        self.assertIsNone(self.b.get('k'))
+        self.assertEqual(self.a.generation, self.b.generation)
+
+    def test_expired_entries_are_not_served(self):
+        self.a.shared.set('catalog:0:1', 'old', ttl=-1)
+        self.assertIsNone(self.b.get(1))
+
+class TestCatalogCache(unittest.TestCase):
+
+    def setUp(self):
+        cache.catalog_cache.invalidate()
+        engine = create_engine('sqlite:///:memory:')
+        models.Base.metadata.create_all(engine)
+        self.session = sessionmaker(bind=engine)()
+
+    def tearDown(self):
+        self.session.close()
+
+    def test_read_through(self):
+        crud.create_product(self.session, schemas.ProductCreate(name='Shirt', price=10.0))
+        before = cache.catalog_cache.stats()
+        crud.get_cached_product(self.session, 1)
+        crud.get_cached_product(self.session, 1)
+        after = cache.catalog_cache.stats()
+        self.assertEqual(after['misses'] - before['misses'], 1)
+        self.assertEqual(after['hits'] - before['hits'], 1)
+
+    def test_create_product_invalidates_pages(self):
+        crud.create_product(self.session, schemas.ProductCreate(name='Shirt', price=10.0))
+        self.assertEqual(len(crud.get_cached_products(self.session)), 1)
+        crud.create_product(self.session, schemas.ProductCreate(name='Hat', price=5.0))
+        self.assertEqual([p.name for p in crud.get_cached_products(self.session)], ['Shirt', 'Hat'])
+
+if __name__ == '__main__':
+    unittest.main()
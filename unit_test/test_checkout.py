@@ -0,0 +1,75 @@
+import unittest
+from sqlalchemy import event
+
+import models
+from unit_test.support import CUSTOMER, AppTestCase
+
+class TestProductLookup(AppTestCase):
+
+    def seed(self, db):
+        db.add_all([models.Product(name=f'Product {i}', price=float(i)) for i in range(1, 6)])
+        db.commit()
+
+    def setUp(self):
+        super().setUp()
+        self.queries = []
+        event.listen(self.engine, "before_cursor_execute", self.count)
+
+    def count(self, conn, cursor, statement, parameters, context, executemany):
+        self.queries.append(statement)
+
+    def test_ids_in_request_order(self):
+        response = self.client.get("/api/products", params={"ids": "3,1,99,3"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([p["id"] for p in response.json()], [3, 1])
+
+    def test_misses_load_with_one_query(self):
+        self.client.get("/api/products/2")
+        self.queries.clear()
+        self.client.get("/api/products", params={"ids": "1,2,3,4"})
+        self.assertEqual(len(self.queries), 1)
+        self.assertIn(" IN ", self.queries[0])
+        # Now all cached
+        self.queries.clear()
+        response = self.client.get("/api/products", params={"ids": "4,3", "fields": "id,price"})
+        self.assertEqual(response.json(), [{"id": 4, "price": 4.0}, {"id": 3, "price": 3.0}])
+        self.assertEqual(self.queries, [])
+
+    def test_bad_ids(self):
+        self.assertEqual(self.client.get("/api/products", params={"ids": "1,x"}).status_code, 400)
+        self.assertEqual(self.client.get("/api/products", params={"ids": ","}).status_code, 400)
+        self.assertEqual(self.client.get("/api/products", params={"ids": ",".join(map(str, range(101)))}).status_code, 400)
+
+    def test_single_product(self):
+        response = self.client.get("/api/products/2")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["name"], "Product 2")
+        self.assertEqual(self.client.get("/api/products/99").status_code, 404)
+
+    def test_checkout(self):
+        response = self.client.post("/api/orders/checkout", json=dict(CUSTOMER, items=[
+            {"product_id": 1, "quantity": 2}, {"product_id": 4, "quantity": 1}]))
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual(body["total"], 6.0)
+        self.assertEqual([(o["product_id"], o["quantity"], o["unit_price"]) for o in body["orders"]], [(1, 2, 1.0), (4, 1, 4.0)])
+        self.assertTrue(all(o["customer_email"] == "test@example.com" and o["created_at"] for o in body["orders"]))
+        with self.Session() as db:
+            self.assertEqual(db.query(models.Order).count(), 2)
+            self.assertEqual(db.get(models.ProductSales, 1).units, 2)
+
+    def test_checkout_unknown_product_writes_nothing(self):
+        response = self.client.post("/api/orders/checkout", json=dict(CUSTOMER, items=[
+            {"product_id": 1, "quantity": 1}, {"product_id": 98, "quantity": 1}, {"product_id": 99, "quantity": 1}]))
+        self.assertEqual(response.status_code, 404)
+        self.assertIn("98, 99", response.json()["detail"])
+        with self.Session() as db:
+            self.assertEqual(db.query(models.Order).count(), 0)
+
+    def test_checkout_validation(self):
+        self.assertEqual(self.client.post("/api/orders/checkout", json=dict(CUSTOMER, items=[])).status_code, 422)
+        response = self.client.post("/api/orders/checkout", json=dict(CUSTOMER, items=[{"product_id": 1, "quantity": 0}]))
+        self.assertEqual(response.status_code, 422)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,114 @@
+import gzip
+import unittest
+from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from fastapi.testclient import TestClient
+
+import compact, compression, models
+from unit_test.support import AppTestCase
+
+class TestFieldSelection(AppTestCase):
+
+    def seed(self, db):
+        db.add_all([models.Product(name=f'Product {i}', description='A long description ' * 5, price=i + 0.5) for i in range(3)])
+        db.add(models.Order(product_id=1, quantity=2, unit_price=0.5, customer_name='C', customer_email='c@example.com', shipping_address='S'))
+        db.commit()
+
+    def test_fields(self):
+        products = self.client.get('/api/products', params={'fields': 'id,name,price'}).json()
+        self.assertEqual(products[0], {'id': 1, 'name': 'Product 0', 'price': 0.5})
+        # The default encoding is cached separately and unchanged
+        self.assertIn('description', self.client.get('/api/products').json()[0])
+
+    def test_compact_page(self):
+        page = self.client.get('/api/products', params={'fields': 'id,price', 'format': 'compact', 'cursor': '', 'limit': 2}).json()
+        self.assertEqual(page['fields'], ['id', 'price'])
+        self.assertEqual(page['rows'], [[1, 0.5], [2, 1.5]])
+        rest = self.client.get('/api/products', params={'fields': 'id,price', 'format': 'compact', 'cursor': page['next_cursor']}).json()
+        self.assertEqual(rest['rows'], [[3, 2.5]])
+
+    def test_compact_orders(self):
+        body = self.client.get('/api/orders', params={'format': 'compact'}).json()
+        self.assertEqual(body['fields'][:2], ['product_id', 'quantity'])
+        row = dict(zip(body['fields'], body['rows'][0]))
+        self.assertEqual((row['quantity'], row['unit_price']), (2, 0.5))
+
+    def test_search_fields(self):
+        results = self.client.get('/api/products/search', params={'q': 'product', 'fields': 'name'}).json()
+        self.assertEqual(sorted(r['name'] for r in results), ['Product 0', 'Product 1', 'Product 2'])
+
+    def test_bad_selection(self):
+        self.assertEqual(self.client.get('/api/products', params={'fields': 'id,secret'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/orders', params={'format': 'xml'}).status_code, 400)
+
+    def test_fallback_encoder(self):
+        orjson = compact.orjson
+        compact.orjson = None
+        try:
+            self.assertEqual(compact.dumps({'a': [1, 'b']}), b'{"a":[1,"b"]}')
+        finally:
+            compact.orjson = orjson
+
+class TestCompressionMiddleware(unittest.TestCase):
+
+    def setUp(self):
+        test_app = FastAPI()
+        test_app.add_middleware(compression.CompressionMiddleware, minimum_size=100)
+
+        @test_app.get('/big')
+        def big():
+            return {'items': ['x' * 20] * 50}
+
+        @test_app.get('/small')
+        def small():
+            return {'ok': True}
+
+        @test_app.get('/stream')
+        def stream():
+            return StreamingResponse((f'{{"n": {i}}}\n' for i in range(100)), media_type='application/x-ndjson')
+
+        @test_app.get('/encoded')
+        def encoded():
+            return PlainTextResponse(gzip.compress(b'x' * 500), headers={'Content-Encoding': 'gzip'})
+
+        @test_app.get('/partial')
+        def partial():
+            return PlainTextResponse('x' * 500, status_code=206, headers={'Content-Range': 'bytes 0-499/1000'})
+
+        self.client = TestClient(test_app)
+
+    def test_gzip_above_threshold(self):
+        response = self.client.get('/big', headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(response.headers['content-encoding'], 'gzip')
+        self.assertLess(int(response.headers['content-length']), 200)
+        self.assertEqual(len(response.json()['items']), 50)
+
+    def test_brotli_preferred(self):
+        if compression.brotli is None:
+            self.skipTest('brotli not installed')
+        response = self.client.get('/big', headers={'Accept-Encoding': 'gzip, br'})
+        self.assertEqual(response.headers['content-encoding'], 'br')
+
+    def test_small_and_identity_untouched(self):
+        self.assertNotIn('content-encoding', self.client.get('/small', headers={'Accept-Encoding': 'gzip'}).headers)
+        self.assertNotIn('content-encoding', self.client.get('/big', headers={'Accept-Encoding': 'identity'}).headers)
+
+    def test_streaming(self):
+        response = self.client.get('/stream', headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(response.headers['content-encoding'], 'gzip')
+        self.assertEqual(len(response.text.splitlines()), 100)
+
+    def test_already_encoded_passes_through(self):
+        response = self.client.get('/encoded', headers={'Accept-Encoding': 'br, gzip'})
+        self.assertEqual(response.headers['content-encoding'], 'gzip')
+        self.assertEqual(response.text, 'x' * 500)
+
+    def test_ranges_pass_through(self):
+        response = self.client.get('/partial', headers={'Accept-Encoding': 'gzip'})
+        self.assertNotIn('content-encoding', response.headers)
+        self.assertEqual(response.text, 'x' * 500)
+        response = self.client.get('/big', headers={'Accept-Encoding': 'gzip', 'Range': 'bytes=0-9'})
+        self.assertNotIn('content-encoding', response.headers)
+
+if __name__ == '__main__':
+    unittest.main()
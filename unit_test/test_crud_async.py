@@ -0,0 +1,86 @@
+import unittest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import StaticPool
+
+import async_api, cache, crud_async, inventory, models, schemas, stats
+from database import get_async_db
+from unit_test.support import CUSTOMER, order
+
+def order_create(product_id):
+    return schemas.OrderCreate(**order(product_id))
+
+class TestAsyncCrud(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        cache.catalog_cache.invalidate()
+        self.engine = create_async_engine('sqlite+aiosqlite://', poolclass=StaticPool)
+        async with self.engine.begin() as conn:
+            await conn.run_sync(models.Base.metadata.create_all)
+        self.Session = async_sessionmaker(self.engine, expire_on_commit=False)
+
+    async def asyncTearDown(self):
+        await self.engine.dispose()
+
+    async def test_products(self):
+        async with self.Session() as db:
+            for name in ('Shirt', 'Hat', 'Scarf'):
+                await crud_async.create_product(db, schemas.ProductCreate(name=name, price=1.0))
+            self.assertEqual((await crud_async.get_product(db, 2)).name, 'Hat')
+            page = await crud_async.get_products(db, limit=5, after_id=1)
+            self.assertEqual([p.id for p in page], [2, 3])
+            cached = await crud_async.get_cached_products(db, skip=1, limit=1)
+            self.assertEqual([p.name for p in cached], ['Hat'])
+
+    async def test_orders(self):
+        async with self.Session() as db:
+            await crud_async.create_product(db, schemas.ProductCreate(name='Shirt', price=1.0))
+            await crud_async.create_order(db, order_create(1))
+            ids = await crud_async.create_orders_bulk(db, [order_create(1), order_create(1)])
+            self.assertEqual(ids, [2, 3])
+            self.assertEqual(await crud_async.get_product_prices(db, [1, 7]), {1: 1.0})
+            self.assertEqual(len(await crud_async.get_orders(db)), 3)
+            self.assertEqual((await stats.get_product_sales_async(db, 1)).orders, 3)
+
+    async def test_router(self):
+        app = FastAPI()
+        app.include_router(async_api.router)
+
+        async def override_get_async_db():
+            async with self.Session() as db:
+                yield db
+
+        app.dependency_overrides[get_async_db] = override_get_async_db
+        async with self.Session() as db:
+            await crud_async.create_product(db, schemas.ProductCreate(name='Shirt', price=1.0))
+        with TestClient(app) as client:
+            response = client.post("/api/orders", json=order(1))
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(client.post("/api/orders", json=order(9)).status_code, 404)
+            self.assertEqual([p["name"] for p in client.get("/api/products").json()], ['Shirt'])
+            self.assertEqual([p["id"] for p in client.get("/api/products", params={"ids": "9,1"}).json()], [1])
+            self.assertEqual(client.get("/api/products/1").json()["name"], 'Shirt')
+            cart = dict(CUSTOMER, items=[{"product_id": 1, "quantity": 3}])
+            response = client.post("/api/orders/checkout", json=cart)
+            self.assertEqual(response.json()["total"], 3.0)
+
+    async def test_inventory(self):
+        self.addCleanup(cache.catalog_cache.invalidate)
+        async with self.Session() as db:
+            await crud_async.create_product(db, schemas.ProductCreate(name='Shirt', price=1.0))
+            await db.run_sync(lambda session: inventory.set_stock(session, 1, 3, shards=2))
+            reservation = await inventory.reserve_async(db, 1, 2)
+            self.assertEqual((await inventory.get_stock_async(db, 1)).reserved, 2)
+            await inventory.claim_async(db, order_create(1))
+            self.assertEqual(await inventory.claim_all_async(db, [order_create(1)]), ["Product 1 is out of stock"])
+            self.assertTrue(await inventory.release_async(db, reservation.id))
+            await db.commit()
+            self.assertEqual((await inventory.get_stock_async(db, 1)).stock, 2)
+            # 1/1/1: the line is split over all three shards
+            await db.run_sync(lambda session: inventory.set_stock(session, 1, 3, shards=3))
+            await inventory.take_async(db, 1, 3)
+            self.assertEqual((await inventory.get_stock_async(db, 1)).stock, 0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+from unittest.mock import patch
+from sqlalchemy import inspect, text
+
+import database, models
+
+COLD_START = """
+import os, sys
+import main
+assert not os.path.exists(sys.argv[1]), 'import touched the database'
+from fastapi.testclient import TestClient
+with TestClient(main.app) as client:
+    assert client.get('/api/products').status_code == 200
+"""
+
+SEARCH_MIGRATED = """
+import main
+from fastapi.testclient import TestClient
+with TestClient(main.app) as client:
+    response = client.get('/api/products/search', params={'q': 'shirt'})
+    assert [p['name'] for p in response.json()] == ['Linen Shirt'], response.text
+"""
+
+class TestEngineConfiguration(unittest.TestCase):
+
+    def test_sqlite_file_pragmas(self):
+        path = os.path.join(tempfile.mkdtemp(), 'test.db')
+        engine = database.create_db_engine(f'sqlite:///{path}')
+        with engine.connect() as conn:
+            self.assertEqual(conn.execute(text('PRAGMA journal_mode')).scalar(), 'wal')
+            self.assertEqual(conn.execute(text('PRAGMA synchronous')).scalar(), 1)
+            self.assertEqual(conn.execute(text('PRAGMA busy_timeout')).scalar(), database.SQLITE_BUSY_TIMEOUT_MS)
+            self.assertEqual(conn.execute(text('PRAGMA foreign_keys')).scalar(), 1)
+        self.assertEqual(engine.pool.size(), database.POOL_SIZE)
+        engine.dispose()
+
+    def test_pragmas_can_be_disabled(self):
+        path = os.path.join(tempfile.mkdtemp(), 'test.db')
+        engine = database.create_db_engine(f'sqlite:///{path}', pragmas=False)
+        with engine.connect() as conn:
+            self.assertEqual(conn.execute(text('PRAGMA journal_mode')).scalar(), 'delete')
+        engine.dispose()
+
+    def test_memory_database_skips_pool_sizing(self):
+        self.assertNotIn('pool_size', database.engine_options('sqlite://'))
+        engine = database.create_db_engine('sqlite://')
+        with engine.connect() as conn:
+            self.assertEqual(conn.execute(text('SELECT 1')).scalar(), 1)
+
+    def test_server_database_pool_options(self):
+        options = database.engine_options('postgresql://user@localhost/ecommerce')
+        self.assertEqual(options['pool_size'], database.POOL_SIZE)
+        self.assertEqual(options['max_overflow'], database.MAX_OVERFLOW)
+        self.assertNotIn('connect_args', options)
+
+class TestLazySetup(unittest.TestCase):
+
+    def test_single_metadata(self):
+        self.assertIs(models.Base, database.Base)
+
+    def test_session_builds_engine(self):
+        # Without the lifespan (SCHEMA_AUTO_CREATE=0) the first session still gets a bind
+        with patch.object(database, '_engine', None), \
+             patch.object(database, 'SessionLocal', database.LazySessionMaker()):
+            with database.SessionLocal() as db:
+                self.assertIs(db.get_bind(), database._engine)
+            database._engine.dispose()
+
+    def test_import_does_not_touch_database(self):
+        path = os.path.join(tempfile.mkdtemp(), 'cold.db')
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        env = dict(os.environ, DATABASE_URL=f'sqlite:///{path}', CATALOG_SHARED_CACHE='')
+        subprocess.run([sys.executable, '-c', COLD_START, path], cwd=root, env=env, check=True, capture_output=True)
+        # The lifespan created the schema
+        engine = database.create_db_engine(f'sqlite:///{path}')
+        self.assertIn('orders', inspect(engine).get_table_names())
+        engine.dispose()
+
+    def test_migrations_match_models(self):
+        # upgrade head then serve without create_all: the schema, including the search index,
+        # comes from the migrations alone
+        path = os.path.join(tempfile.mkdtemp(), 'migrated.db')
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        env = dict(os.environ, DATABASE_URL=f'sqlite:///{path}', SCHEMA_AUTO_CREATE='0', CATALOG_SHARED_CACHE='')
+        for command in (['upgrade', 'head'], ['check']):
+            subprocess.run([sys.executable, '-m', 'alembic', *command], cwd=root, env=env, check=True, capture_output=True)
+        engine = database.create_db_engine(f'sqlite:///{path}')
+        with engine.begin() as conn:
+            conn.execute(text("INSERT INTO products (name, price) VALUES ('Linen Shirt', 5.0)"))
+        engine.dispose()
+        subprocess.run([sys.executable, '-c', SEARCH_MIGRATED], cwd=root, env=env, check=True, capture_output=True)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,35 @@
+import unittest
+
+import crud, schemas
+from unit_test.support import AppTestCase
+
+class TestCatalogETag(AppTestCase):
+
+    def seed(self, db):
+        crud.create_product(db, schemas.ProductCreate(name='Shirt', price=10.0))
+
+    def test_conditional_get(self):
+        first = self.client.get("/api/products")
+        self.assertEqual(first.status_code, 200)
+        tag = first.headers["etag"]
+        second = self.client.get("/api/products", headers={"If-None-Match": tag})
+        self.assertEqual(second.status_code, 304)
+        self.assertEqual(second.content, b"")
+        self.assertEqual(second.headers["etag"], tag)
+
+    def test_weak_validator_matches(self):
+        tag = self.client.get("/api/products").headers["etag"]
+        response = self.client.get("/api/products", headers={"If-None-Match": f'"other", W/{tag}'})
+        self.assertEqual(response.status_code, 304)
+
+    def test_write_changes_etag(self):
+        tag = self.client.get("/api/products").headers["etag"]
+        with self.Session() as db:
+            crud.create_product(db, schemas.ProductCreate(name='Hat', price=5.0))
+        response = self.client.get("/api/products", headers={"If-None-Match": tag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.headers["etag"], tag)
+        self.assertEqual([p["name"] for p in response.json()], ["Shirt", "Hat"])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,55 @@
+import csv
+import io
+import json
+import unittest
+from datetime import datetime
+from unittest.mock import patch
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import sessionmaker
+
+import export, models
+from main import app
+from unit_test.support import memory_engine
+
+class TestOrderExport(unittest.TestCase):
+
+    def setUp(self):
+        engine = memory_engine()
+        models.Base.metadata.create_all(engine)
+        self.Session = sessionmaker(bind=engine)
+        with self.Session() as db:
+            db.add_all([
+                models.Order(product_id=1, quantity=i, unit_price=2.5, customer_name=f'Customer {i}', customer_email='c@example.com',
+                             shipping_address='1 Main St, Springfield', created_at=datetime(2024, 1, i + 1))
+                for i in range(5)
+            ])
+            db.commit()
+        patcher = patch.object(export, 'SessionLocal', self.Session)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client = TestClient(app)
+
+    def test_ndjson(self):
+        response = self.client.get('/api/orders/export')
+        self.assertEqual(response.headers['content-type'], 'application/x-ndjson')
+        rows = [json.loads(line) for line in response.text.splitlines()]
+        self.assertEqual([r['id'] for r in rows], [1, 2, 3, 4, 5])
+        self.assertEqual(rows[0]['created_at'], '2024-01-01T00:00:00')
+
+    def test_csv_small_batches(self):
+        body = ''.join(export.export_orders('csv', batch_size=2))
+        rows = list(csv.DictReader(io.StringIO(body)))
+        self.assertEqual(len(rows), 5)
+        self.assertEqual(rows[4]['shipping_address'], '1 Main St, Springfield')
+
+    def test_since_filters(self):
+        by_id = self.client.get('/api/orders/export', params={'since_id': 3}).text.splitlines()
+        self.assertEqual([json.loads(line)['id'] for line in by_id], [4, 5])
+        by_time = self.client.get('/api/orders/export', params={'format': 'csv', 'since': '2024-01-04T00:00:00'}).text
+        self.assertEqual(len(list(csv.DictReader(io.StringIO(by_time)))), 2)
+
+    def test_unknown_format(self):
+        self.assertEqual(self.client.get('/api/orders/export', params={'format': 'xml'}).status_code, 400)
+
+if __name__ == '__main__':
+    unittest.main()
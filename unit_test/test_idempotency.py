@@ -0,0 +1,150 @@
+import os
+import tempfile
+import threading
+import unittest
+from unittest.mock import patch
+from fastapi import HTTPException
+
+import idempotency, models, order_queue, shared_cache
+from idempotency import IdempotencyStore
+from unit_test.support import AppTestCase, order
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+class TestIdempotencyStore(unittest.TestCase):
+
+    def test_repeat_is_replayed(self):
+        store = IdempotencyStore()
+        calls = []
+        self.assertEqual(store.execute('k', 'a', lambda: calls.append(1) or 'first'), ('first', False))
+        self.assertEqual(store.execute('k', 'a', lambda: calls.append(1) or 'second'), ('first', True))
+        self.assertEqual(len(calls), 1)
+
+    def test_key_reused_with_other_request(self):
+        store = IdempotencyStore()
+        store.execute('k', 'a', lambda: 1)
+        with self.assertRaises(HTTPException) as ctx:
+            store.execute('k', 'b', lambda: 2)
+        self.assertEqual(ctx.exception.status_code, 422)
+
+    def test_failure_is_not_stored(self):
+        store = IdempotencyStore()
+        with self.assertRaises(ValueError):
+            store.execute('k', 'a', lambda: (_ for _ in ()).throw(ValueError()))
+        self.assertEqual(store.execute('k', 'a', lambda: 'ok'), ('ok', False))
+
+    def test_concurrent_duplicates_coalesce(self):
+        store = IdempotencyStore()
+        started, release = threading.Event(), threading.Event()
+        calls, results = [], []
+
+        def slow():
+            calls.append(1)
+            started.set()
+            release.wait(5)
+            return 'order'
+
+        first = threading.Thread(target=lambda: results.append(store.execute('k', 'a', slow)))
+        first.start()
+        started.wait(5)
+        others = [threading.Thread(target=lambda: results.append(store.execute('k', 'a', slow))) for _ in range(5)]
+        for t in others:
+            t.start()
+        release.set()
+        for t in [first] + others:
+            t.join()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(sorted(results), [('order', False)] + [('order', True)] * 5)
+
+    def test_bounded_and_expiring(self):
+        clock = FakeClock()
+        store = IdempotencyStore(maxsize=2, ttl=10, clock=clock)
+        for key in 'abc':
+            store.execute(key, 'x', lambda: key)
+        self.assertEqual(len(store), 2)
+        self.assertEqual(store.execute('a', 'x', lambda: 'again'), ('again', False))
+        clock.now = 11
+        self.assertEqual(store.execute('c', 'x', lambda: 'fresh'), ('fresh', False))
+
+    def test_shared_tier_answers_other_worker(self):
+        path = os.path.join(tempfile.mkdtemp(), 'cache.db')
+        first = IdempotencyStore(shared=shared_cache.SQLiteStore(path))
+        second = IdempotencyStore(shared=shared_cache.SQLiteStore(path))
+        first.execute('k', 'a', lambda: {'id': 1})
+        self.assertEqual(second.execute('k', 'a', lambda: {'id': 2}), ({'id': 1}, True))
+
+class TestIdempotentOrders(AppTestCase):
+
+    def seed(self, db):
+        db.add(models.Product(name='Shirt', price=10.0))
+        db.commit()
+
+    def setUp(self):
+        super().setUp()
+        patcher = patch.object(idempotency, 'store', IdempotencyStore())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_retry_returns_first_order(self):
+        headers = {'Idempotency-Key': 'order-123'}
+        first = self.client.post('/api/orders', json=order(1), headers=headers)
+        retry = self.client.post('/api/orders', json=order(1), headers=headers)
+        self.assertEqual(first.json(), retry.json())
+        self.assertNotIn('idempotent-replayed', first.headers)
+        self.assertEqual(retry.headers['idempotent-replayed'], 'true')
+        with self.Session() as db:
+            self.assertEqual(db.query(models.Order).count(), 1)
+
+    def test_retry_after_commit_timeout(self):
+        # The writer has the order but stalls past the timeout: 504, and the retry gets the order
+        # once it is committed instead of placing a second one
+        committing, release = threading.Event(), threading.Event()
+
+        def slow_session():
+            committing.set()
+            release.wait(10)
+            return self.Session()
+
+        writer = order_queue.OrderWriter(slow_session, batch_size=1, max_wait_ms=0)
+        self.addCleanup(writer.stop)
+        self.addCleanup(release.set)
+        for name, value in (('ORDER_WRITE_BEHIND', True), ('ORDER_COMMIT_TIMEOUT', 0.5), ('_writer', writer)):
+            patcher = patch.object(order_queue, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        headers = {'Idempotency-Key': 'order-789'}
+        first = self.client.post('/api/orders', json=order(1), headers=headers)
+        self.assertEqual(first.status_code, 504)
+        self.assertTrue(committing.is_set())
+        retries = []
+        retry = threading.Thread(target=lambda: retries.append(self.client.post('/api/orders', json=order(1), headers=headers)))
+        retry.start()
+        release.set()
+        retry.join(10)
+        self.assertEqual(retries[0].status_code, 200)
+        self.assertEqual(retries[0].headers['idempotent-replayed'], 'true')
+        again = self.client.post('/api/orders', json=order(1), headers=headers)
+        self.assertEqual(again.json(), retries[0].json())
+        with self.Session() as db:
+            self.assertEqual(db.query(models.Order).count(), 1)
+
+    def test_without_key_every_request_writes(self):
+        self.client.post('/api/orders', json=order(1))
+        self.client.post('/api/orders', json=order(1))
+        with self.Session() as db:
+            self.assertEqual(db.query(models.Order).count(), 2)
+
+    def test_changed_body_is_rejected(self):
+        headers = {'Idempotency-Key': 'order-456'}
+        self.client.post('/api/orders', json=order(1), headers=headers)
+        response = self.client.post('/api/orders', json=order(1, 2), headers=headers)
+        self.assertEqual(response.status_code, 422)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,142 @@
+import io
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+from PIL import Image
+
+import images
+from main import app
+
+class TestImages(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.cache_directory = tempfile.mkdtemp()
+        Image.new("RGBA", (800, 600), (200, 30, 30, 128)).save(os.path.join(self.directory, "shirt.png"))
+        self.store = images.ImageStore(self.directory, self.cache_directory, max_bytes=1 << 20, workers=0)
+        patcher = patch.object(images, "store", self.store)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client = TestClient(app)
+
+    def cached_files(self):
+        return [name for _, _, files in os.walk(self.cache_directory) for name in files]
+
+    def test_original(self):
+        response = self.client.get("/images/shirt.png")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers["content-type"], "image/png")
+        self.assertEqual(response.headers["cache-control"], images.CACHE_CONTROL)
+        revalidated = self.client.get("/images/shirt.png", headers={"If-None-Match": response.headers["etag"]})
+        self.assertEqual(revalidated.status_code, 304)
+        self.assertEqual(self.client.get("/images/missing.png").status_code, 404)
+
+    def test_resized_variant_is_cached(self):
+        before = images.variants_total.value("hit")
+        response = self.client.get("/images/shirt.png", params={"w": 300}, headers={"Accept": "image/avif,image/webp,*/*"})
+        self.assertEqual(response.headers["content-type"], "image/webp")
+        self.assertEqual(response.headers["vary"], "Accept")
+        # Snapped up to the next configured width
+        self.assertEqual(Image.open(io.BytesIO(response.content)).size, (320, 240))
+        again = self.client.get("/images/shirt.png", params={"w": 320}, headers={"Accept": "image/webp"})
+        self.assertEqual(again.content, response.content)
+        self.assertEqual(again.headers["etag"], response.headers["etag"])
+        self.assertEqual(images.variants_total.value("hit") - before, 1)
+        self.assertEqual(len(self.cached_files()), 1)
+
+    def test_jpeg_and_no_upscaling(self):
+        response = self.client.get("/images/shirt.png", params={"w": 5000, "format": "jpeg"})
+        self.assertEqual(response.headers["content-type"], "image/jpeg")
+        self.assertNotIn("vary", response.headers)
+        self.assertEqual(Image.open(io.BytesIO(response.content)).size, (800, 600))
+        self.assertEqual(self.client.get("/images/shirt.png", params={"w": 100, "format": "gif"}).status_code, 400)
+        self.assertEqual(self.client.get("/images/shirt.png", params={"w": 0}).status_code, 400)
+
+    def test_edited_original_gets_new_variant(self):
+        first = self.client.get("/images/shirt.png", params={"w": 160, "format": "jpeg"})
+        Image.new("RGB", (400, 400), (0, 0, 255)).save(os.path.join(self.directory, "shirt.png"))
+        os.utime(os.path.join(self.directory, "shirt.png"), ns=(1, 1))
+        second = self.client.get("/images/shirt.png", params={"w": 160, "format": "jpeg"})
+        self.assertNotEqual(first.headers["etag"], second.headers["etag"])
+        self.assertEqual(Image.open(io.BytesIO(second.content)).size, (160, 160))
+
+    def test_only_image_files_in_the_directory(self):
+        with open(os.path.join(self.directory, "notes.txt"), "w") as f:
+            f.write("secret")
+        outside = os.path.join(self.cache_directory, "outside.png")
+        Image.new("RGB", (10, 10)).save(outside)
+        for name in ("../" + os.path.basename(self.cache_directory) + "/outside.png", outside, "notes.txt"):
+            with self.assertRaises(HTTPException):
+                self.store.source(name)
+
+    def test_without_pillow_serves_original(self):
+        with patch.object(images, "Image", None):
+            response = self.client.get("/images/shirt.png", params={"w": 160})
+        self.assertEqual(response.headers["content-type"], "image/png")
+        self.assertEqual(self.cached_files(), [])
+
+    def test_process_pool(self):
+        store = images.ImageStore(self.directory, self.cache_directory, workers=1)
+        self.addCleanup(store.shutdown)
+        path, _ = store.variant(os.path.join(self.directory, "shirt.png"), 160, "WEBP")
+        self.assertEqual(Image.open(path).size, (160, 120))
+
+    def test_variant_deleted_after_lookup(self):
+        first = self.client.get("/images/shirt.png", params={"w": 160, "format": "jpeg"})
+        lookup = self.store.cache.get
+
+        def evicted_meanwhile(key, ext):
+            path = lookup(key, ext)
+            os.unlink(path)
+            return path
+
+        with patch.object(self.store.cache, "get", evicted_meanwhile):
+            again = self.client.get("/images/shirt.png", params={"w": 160, "format": "jpeg"})
+        self.assertEqual(again.status_code, 200)
+        self.assertEqual(again.content, first.content)
+        self.assertEqual(len(self.cached_files()), 1)
+
+class TestDiskCache(unittest.TestCase):
+
+    def test_evicts_least_recently_served(self):
+        cache = images.DiskCache(tempfile.mkdtemp(), max_bytes=250)
+        for i, key in enumerate(["aa1", "bb2", "cc3"]):
+            path = cache.path(key, "webp")
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "wb") as f:
+                f.write(b"x" * 100)
+            os.utime(path, (i, i))
+            if i < 2:
+                cache.added(100)
+        # Serving "aa1" makes "bb2" the oldest
+        self.assertIsNotNone(cache.get("aa1", "webp"))
+        cache.added(100)
+        self.assertIsNone(cache.get("bb2", "webp"))
+        self.assertIsNotNone(cache.get("cc3", "webp"))
+        self.assertEqual(cache.size, 200)
+
+    def test_keeps_renders_in_progress_and_recently_served(self):
+        cache = images.DiskCache(tempfile.mkdtemp(), max_bytes=150)
+        paths = [cache.path("aa1", "webp"), cache.path("bb2", "webp") + ".tmp"]
+        for path in paths:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "wb") as f:
+                f.write(b"x" * 100)
+            os.utime(path, (0, 0))
+        cache.added(100)
+        self.assertEqual(cache.size, 100)
+        self.assertTrue(os.path.exists(paths[1]))
+        # Over the limit, but "aa1" may still be streaming out
+        cache.get("aa1", "webp")
+        os.makedirs(os.path.dirname(cache.path("cc3", "webp")))
+        with open(cache.path("cc3", "webp"), "wb") as f:
+            f.write(b"x" * 100)
+        cache.added(100)
+        self.assertTrue(all(os.path.exists(path) for path in paths))
+        self.assertEqual(cache.size, 200)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,197 @@
+import os
+import tempfile
+import threading
+import unittest
+from fastapi import HTTPException
+from sqlalchemy import event
+from sqlalchemy.orm import sessionmaker
+
+import cache, database, inventory, models
+from unit_test.support import CUSTOMER, AppTestCase, order
+
+class TestInventory(AppTestCase):
+
+    def seed(self, db):
+        db.add_all([models.Product(name=f'Product {i}', price=2.0) for i in range(3)])
+        db.commit()
+
+    def stock(self, product_id):
+        with self.Session() as db:
+            return inventory.get_stock(db, product_id).stock
+
+    def set_stock(self, product_id, stock, shards=0):
+        with self.Session() as db:
+            inventory.set_stock(db, product_id, stock, shards)
+
+    def test_untracked_by_default(self):
+        for _ in range(3):
+            self.assertEqual(self.client.post("/api/orders", json=order(1, 5)).status_code, 200)
+        self.assertIsNone(self.stock(1))
+
+    def test_sells_down_to_zero(self):
+        self.set_stock(1, 3)
+        self.assertEqual(self.client.post("/api/orders", json=order(1, 2)).status_code, 200)
+        response = self.client.post("/api/orders", json=order(1, 2))
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(self.client.post("/api/orders", json=order(1, 1)).status_code, 200)
+        self.assertEqual(self.client.get("/api/products/1/stock").json(), {"product_id": 1, "stock": 0, "shards": 0, "reserved": 0})
+        self.assertEqual(self.client.get("/api/products/9/stock").status_code, 404)
+
+    def test_sharded_stock(self):
+        self.set_stock(1, 10, shards=4)
+        with self.Session() as db:
+            self.assertEqual(sorted(s.stock for s in db.query(models.StockShard)), [2, 2, 3, 3])
+        codes = [self.client.post("/api/orders", json=order(1)).status_code for _ in range(11)]
+        self.assertEqual(codes, [200] * 10 + [409])
+        self.assertEqual(self.stock(1), 0)
+        # Back to a single counter
+        self.set_stock(1, 1)
+        with self.Session() as db:
+            self.assertEqual(db.query(models.StockShard).count(), 0)
+        self.assertEqual(self.client.post("/api/orders", json=order(1)).status_code, 200)
+
+    def test_quantity_must_be_positive(self):
+        self.set_stock(1, 2)
+        for quantity in (-100, 0):
+            self.assertEqual(self.client.post("/api/orders", json=order(1, quantity)).status_code, 422)
+        body = self.client.post("/api/orders/bulk", json=[order(1, 0), order(1, -1)]).json()
+        self.assertEqual((body["created"], body["failed"]), (0, 2))
+        self.assertEqual(self.stock(1), 2)
+        with self.Session() as db:
+            self.assertEqual(db.query(models.Order).count(), 0)
+
+    def test_line_split_over_shards(self):
+        self.set_stock(1, 10, shards=4)
+        self.assertEqual(self.client.post("/api/orders", json=order(1, 5)).status_code, 200)
+        self.assertEqual(self.stock(1), 5)
+        # More than is left anywhere: nothing is taken
+        self.assertEqual(self.client.post("/api/orders", json=order(1, 6)).status_code, 409)
+        self.assertEqual(self.stock(1), 5)
+        with self.Session() as db:
+            reservation = inventory.reserve(db, 1, 4)
+            self.assertTrue(inventory.release(db, reservation.id))
+        self.assertEqual(self.stock(1), 5)
+        self.assertEqual(self.client.post("/api/orders", json=order(1, 5)).status_code, 200)
+        self.assertEqual(self.stock(1), 0)
+
+    def test_stock_changed_by_another_process(self):
+        # Like `python inventory.py set`, but without set_stock, so nothing in this process hears of it
+        self.assertEqual(self.client.post("/api/orders", json=order(1)).status_code, 200)
+        with self.Session() as db:
+            db.query(models.Product).filter_by(id=1).update({"stock": 1})
+            db.commit()
+        codes = [self.client.post("/api/orders", json=order(1)).status_code for _ in range(2)]
+        self.assertEqual(codes, [200, 409])
+        with self.Session() as db:
+            db.query(models.Product).filter_by(id=1).update({"stock": None, "stock_shards": 2})
+            db.add_all([models.StockShard(product_id=1, shard=shard, stock=1) for shard in range(2)])
+            db.commit()
+        codes = [self.client.post("/api/orders", json=order(1)).status_code for _ in range(3)]
+        self.assertEqual(codes, [200, 200, 409])
+
+    def test_bulk_reports_sold_out_items(self):
+        self.set_stock(2, 1)
+        body = self.client.post("/api/orders/bulk", json=[order(2), order(1), order(2)]).json()
+        self.assertEqual((body["created"], body["failed"]), (2, 1))
+        self.assertEqual(body["results"][2]["error"], "Product 2 is out of stock")
+
+    def test_bulk_decrements_once_per_product(self):
+        self.set_stock(1, 10)
+        self.set_stock(2, 3, shards=3)
+        statements = []
+        listener = lambda conn, cursor, statement, *args: statements.append(statement)
+        event.listen(self.engine, "before_cursor_execute", listener)
+        self.addCleanup(event.remove, self.engine, "before_cursor_execute", listener)
+        items = [order(1)] * 10 + [order(3)] * 50 + [order(2, 2), order(2, 2)]
+        body = self.client.post("/api/orders/bulk", json=items).json()
+        self.assertEqual((body["created"], body["failed"]), (61, 1))
+        self.assertEqual(body["results"][-1]["error"], "Product 2 is out of stock")
+        # Untracked product 3 costs no statement of its own, product 1 a single UPDATE
+        self.assertEqual(sum('UPDATE products' in statement for statement in statements), 1)
+        self.assertEqual((self.stock(1), self.stock(2)), (0, 1))
+        # Two units for one left: the combined decrement fails and lines are taken in order
+        self.set_stock(1, 1)
+        body = self.client.post("/api/orders/bulk", json=[order(1), order(1)]).json()
+        self.assertEqual([r["error"] for r in body["results"]], [None, "Product 1 is out of stock"])
+
+    def test_checkout_is_all_or_nothing(self):
+        self.set_stock(1, 5)
+        self.set_stock(2, 1)
+        cart = dict(CUSTOMER, items=[{"product_id": 1, "quantity": 2}, {"product_id": 2, "quantity": 2}])
+        self.assertEqual(self.client.post("/api/orders/checkout", json=cart).status_code, 409)
+        self.assertEqual((self.stock(1), self.stock(2)), (5, 1))
+        with self.Session() as db:
+            self.assertEqual(db.query(models.Order).count(), 0)
+
+    def test_reservation_consumed_by_order(self):
+        self.set_stock(1, 3)
+        reservation = self.client.post("/api/reservations", json={"product_id": 1, "quantity": 2}).json()
+        self.assertEqual(self.client.get("/api/products/1/stock").json()["reserved"], 2)
+        self.assertEqual(self.stock(1), 1)
+        # Held units are not for sale
+        self.assertEqual(self.client.post("/api/orders", json=order(1, 2)).status_code, 409)
+        self.assertEqual(self.client.post("/api/orders", json=order(1, 2, reservation_id=reservation["id"])).status_code, 200)
+        self.assertEqual(self.stock(1), 1)
+        # A reservation is used once
+        self.assertEqual(self.client.post("/api/orders", json=order(1, 2, reservation_id=reservation["id"])).status_code, 409)
+
+    def test_reservation_released(self):
+        self.set_stock(1, 3)
+        reservation = self.client.post("/api/reservations", json={"product_id": 1, "quantity": 3}).json()
+        self.assertEqual(self.client.post("/api/reservations", json={"product_id": 1, "quantity": 1}).status_code, 409)
+        self.assertEqual(self.client.delete(f"/api/reservations/{reservation['id']}").status_code, 204)
+        self.assertEqual(self.client.delete(f"/api/reservations/{reservation['id']}").status_code, 404)
+        self.assertEqual(self.stock(1), 3)
+        self.assertEqual(self.client.post("/api/reservations", json={"product_id": 9, "quantity": 1}).status_code, 404)
+
+    def test_expired_reservations_return_stock(self):
+        self.set_stock(1, 4, shards=2)
+        with self.Session() as db:
+            expired = inventory.reserve(db, 1, 2, ttl=-1)
+            inventory.reserve(db, 1, 1)
+        self.assertEqual(self.stock(1), 1)
+        # An expired reservation can no longer be consumed
+        response = self.client.post("/api/orders", json=order(1, 2, reservation_id=expired.id))
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(inventory.Reaper(self.Session).sweep(), 1)
+        self.assertEqual(self.stock(1), 3)
+        with self.Session() as db:
+            self.assertEqual(inventory.release_expired(db), 0)
+
+class TestConcurrentBuyers(unittest.TestCase):
+
+    def test_no_oversell(self):
+        cache.catalog_cache.invalidate()
+        self.addCleanup(cache.catalog_cache.invalidate)
+        path = os.path.join(tempfile.mkdtemp(), 'stock.db')
+        engine = database.create_db_engine(f'sqlite:///{path}')
+        self.addCleanup(engine.dispose)
+        models.Base.metadata.create_all(engine)
+        Session = sessionmaker(bind=engine)
+        with Session() as db:
+            db.add(models.Product(name='Hot', price=1.0))
+            db.commit()
+            inventory.set_stock(db, 1, 25, shards=3)
+        sold, refused = [], []
+
+        def buyer():
+            for _ in range(5):
+                with Session() as db:
+                    try:
+                        inventory.take(db, 1, 1)
+                        db.commit()
+                        sold.append(1)
+                    except HTTPException:
+                        refused.append(1)
+
+        threads = [threading.Thread(target=buyer) for _ in range(10)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual((len(sold), len(refused)), (25, 25))
+        with Session() as db:
+            self.assertEqual(inventory.get_stock(db, 1).stock, 0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+import unittest
+from unittest.mock import patch
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text
+from sqlalchemy.pool import StaticPool
+
+import metrics
+from main import app as main_app
+
+class TestHistogram(unittest.TestCase):
+
+    def test_render_cumulative_buckets(self):
+        h = metrics.Histogram('x_seconds', 'help', ('route',), buckets=(0.1, 1.0))
+        h.observe(0.05, '/a')
+        h.observe(0.5, '/a')
+        h.observe(5, '/a')
+        text_out = '\n'.join(h.render())
+        self.assertIn('x_seconds_bucket{route="/a",le="0.1"} 1', text_out)
+        self.assertIn('x_seconds_bucket{route="/a",le="1.0"} 2', text_out)
+        self.assertIn('x_seconds_bucket{route="/a",le="+Inf"} 3', text_out)
+        self.assertIn('x_seconds_count{route="/a"} 3', text_out)
+
+class TestInstrumentation(unittest.TestCase):
+
+    def setUp(self):
+        self.engine = metrics.instrument_engine(create_engine('sqlite://', poolclass=StaticPool))
+        app = FastAPI()
+        app.add_middleware(metrics.MetricsMiddleware)
+
+        @app.get('/items/{item_id}')
+        def read_item(item_id: int):
+            with self.engine.connect() as conn:
+                for _ in range(item_id):
+                    conn.execute(text('SELECT 1'))
+            return {}
+
+        self.client = TestClient(app)
+
+    def test_route_template_and_query_counts(self):
+        before = metrics.db_queries_per_request.count('/items/{item_id}')
+        self.client.get('/items/1')
+        self.assertGreater(metrics.http_request_duration.count('/items/{item_id}', 'GET', '200'), 0)
+        self.assertEqual(metrics.db_queries_per_request.count('/items/{item_id}'), before + 1)
+
+    def test_n_plus_one_flagged(self):
+        before = metrics.db_n_plus_one.value('/items/{item_id}')
+        with self.assertLogs('ecommerce.sql', level='WARNING'):
+            self.client.get('/items/5')
+        self.assertEqual(metrics.db_n_plus_one.value('/items/{item_id}'), before + 1)
+
+    def test_slow_query_logged(self):
+        before = metrics.db_slow_queries.value('/items/{item_id}')
+        with patch.object(metrics, 'SLOW_QUERY_MS', 0), self.assertLogs('ecommerce.sql', level='WARNING'):
+            self.client.get('/items/1')
+        self.assertEqual(metrics.db_slow_queries.value('/items/{item_id}'), before + 1)
+
+class TestMetricsEndpoint(unittest.TestCase):
+
+    def test_prometheus_exposition(self):
+        client = TestClient(main_app)
+        client.get('/contact')
+        response = client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.headers['content-type'].startswith('text/plain'))
+        self.assertIn('# TYPE http_request_duration_seconds histogram', response.text)
+        self.assertIn('route="/contact",method="GET",status="200"', response.text)
+        self.assertIn('cache_hits_total{cache="catalog"}', response.text)
+
+if __name__ == '__main__':
+    unittest.main()
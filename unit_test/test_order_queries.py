@@ -0,0 +1,43 @@
+import unittest
+
+import models
+from unit_test.support import AppTestCase, order
+
+class TestOrderQueries(AppTestCase):
+
+    def seed(self, db):
+        db.add_all([models.Product(name='Shirt', price=10.0), models.Product(name='Hat', price=4.0)])
+        db.commit()
+
+    def test_unit_price_is_snapshotted(self):
+        created = self.client.post('/api/orders', json=order(1)).json()
+        self.assertEqual(created['unit_price'], 10.0)
+        bulk = self.client.post('/api/orders/bulk', json=[order(2), order(1)]).json()
+        self.assertEqual(bulk['created'], 2)
+        with self.Session() as db:
+            db.query(models.Product).filter(models.Product.id == 1).update({'price': 99.0})
+            db.commit()
+            self.assertEqual([o.unit_price for o in db.query(models.Order).order_by(models.Order.id)], [10.0, 4.0, 10.0])
+
+    def test_orders_by_product(self):
+        self.client.post('/api/orders/bulk', json=[order(1), order(2), order(1), order(1)])
+        first = self.client.get('/api/products/1/orders', params={'limit': 2}).json()
+        self.assertEqual([o['id'] for o in first['items']], [1, 3])
+        rest = self.client.get('/api/products/1/orders', params={'limit': 2, 'cursor': first['next_cursor']}).json()
+        self.assertEqual([o['id'] for o in rest['items']], [4])
+        self.assertIsNone(rest['next_cursor'])
+
+    def test_orders_by_customer(self):
+        self.client.post('/api/orders/bulk', json=[order(1, customer_email='b@example.com'), order(2), order(2, customer_email='b@example.com')])
+        page = self.client.get('/api/orders/by-customer', params={'email': 'b@example.com'}).json()
+        self.assertEqual([(o['id'], o['product_id']) for o in page['items']], [(1, 1), (3, 2)])
+
+    def test_indexed_plans(self):
+        with self.Session() as db:
+            for sql, index in [('SELECT * FROM orders WHERE product_id = 1 ORDER BY id', 'ix_orders_product_id_id'),
+                               ("SELECT * FROM orders WHERE customer_email = 'x' ORDER BY id", 'ix_orders_customer_email_id')]:
+                plan = ' '.join(row[-1] for row in db.connection().exec_driver_sql('EXPLAIN QUERY PLAN ' + sql))
+                self.assertIn(index, plan)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+import threading
+import unittest
+from fastapi import HTTPException
+from sqlalchemy.orm import sessionmaker
+
+import cache, inventory, models, order_queue, schemas
+from unit_test.support import memory_engine, order
+
+class TestOrderWriter(unittest.TestCase):
+
+    def setUp(self):
+        cache.catalog_cache.invalidate()
+        engine = memory_engine()
+        models.Base.metadata.create_all(engine)
+        self.Session = sessionmaker(bind=engine)
+        with self.Session() as db:
+            db.add(models.Product(name='Shirt', price=5.0))
+            db.commit()
+        self.writer = order_queue.OrderWriter(self.Session, batch_size=10, max_wait_ms=50)
+        self.addCleanup(self.writer.stop)
+
+    def test_group_commit(self):
+        batches_before = order_queue.commit_batch_size.count()
+        results = [None] * 25
+        def place(i):
+            results[i] = self.writer.submit(schemas.OrderCreate(**order(1, i + 1)), 4.5).result(timeout=10)
+        threads = [threading.Thread(target=place, args=(i,)) for i in range(25)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(sorted(r.id for r in results), list(range(1, 26)))
+        self.assertEqual([r.quantity for r in results], list(range(1, 26)))
+        self.assertTrue(all(r.unit_price == 4.5 for r in results))
+        self.assertLess(order_queue.commit_batch_size.count() - batches_before, 25)
+        with self.Session() as db:
+            self.assertEqual(db.query(models.Order).count(), 25)
+
+    def test_stop_drains_queue(self):
+        futures = [self.writer.submit(schemas.OrderCreate(**order(1, i))) for i in range(1, 6)]
+        self.writer.stop()
+        self.assertTrue(all(f.done() for f in futures))
+        # Orders submitted without a price snapshot the product's current price
+        self.assertEqual({f.result().unit_price for f in futures}, {5.0})
+
+    def test_sold_out_order_fails_alone(self):
+        with self.Session() as db:
+            inventory.set_stock(db, 1, 3)
+        self.addCleanup(cache.catalog_cache.invalidate)
+        futures = [self.writer.submit(schemas.OrderCreate(**order(1, 2)), 5.0) for _ in range(2)]
+        self.assertEqual(futures[0].result(timeout=10).quantity, 2)
+        with self.assertRaises(HTTPException) as raised:
+            futures[1].result(timeout=10)
+        self.assertEqual(raised.exception.status_code, 409)
+        with self.Session() as db:
+            self.assertEqual(db.query(models.Order).count(), 1)
+            self.assertEqual(inventory.get_stock(db, 1).stock, 1)
+
+    def test_timed_out_orders(self):
+        committing, release = threading.Event(), threading.Event()
+
+        def slow_session():
+            committing.set()
+            release.wait(10)
+            return self.Session()
+
+        writer = order_queue.OrderWriter(slow_session, batch_size=1, max_wait_ms=0)
+        self.addCleanup(writer.stop)
+        taken = writer.submit(schemas.OrderCreate(**order(1)), 5.0)
+        committing.wait(10)
+        queued = writer.submit(schemas.OrderCreate(**order(1, 2)), 5.0)
+        # Still queued: withdrawn, so retrying cannot place it twice
+        with self.assertRaises(HTTPException) as raised:
+            order_queue.result(queued, timeout=0.01)
+        self.assertEqual(raised.exception.status_code, 503)
+        # Already being committed: the outcome is unknown
+        with self.assertRaises(HTTPException) as raised:
+            order_queue.result(taken, timeout=0.01)
+        self.assertEqual(raised.exception.status_code, 504)
+        release.set()
+        writer.stop()
+        with self.Session() as db:
+            self.assertEqual([o.quantity for o in db.query(models.Order)], [1])
+
+    def test_failed_commit_reaches_every_request(self):
+        def broken_session():
+            raise RuntimeError('database unavailable')
+        writer = order_queue.OrderWriter(broken_session, batch_size=10, max_wait_ms=20)
+        futures = [writer.submit(schemas.OrderCreate(**order(1, i))) for i in range(1, 4)]
+        for future in futures:
+            with self.assertRaises(RuntimeError):
+                future.result(timeout=10)
+        writer.stop()
+
+if __name__ == '__main__':
+    unittest.main()
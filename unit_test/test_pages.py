@@ -0,0 +1,61 @@
+import gzip
+import os
+import tempfile
+import unittest
+from fastapi.testclient import TestClient
+
+import etag, pages
+from main import app
+
+class TestChooseEncoding(unittest.TestCase):
+
+    def test_prefers_brotli(self):
+        self.assertEqual(etag.choose_encoding('gzip, deflate, br', {'identity', 'gzip', 'br'}), 'br')
+
+    def test_q_zero_excludes(self):
+        self.assertEqual(etag.choose_encoding('br;q=0, gzip', {'identity', 'gzip', 'br'}), 'gzip')
+
+    def test_identity_fallback(self):
+        self.assertEqual(etag.choose_encoding('', {'identity', 'gzip'}), 'identity')
+
+class TestPageRoutes(unittest.TestCase):
+
+    def setUp(self):
+        self.client = TestClient(app)
+        self.body = pages.store.get('index.html').body
+
+    def test_gzip_variant(self):
+        response = self.client.get('/', headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers['content-encoding'], 'gzip')
+        self.assertEqual(response.content, self.body)
+        self.assertIn('Accept-Encoding', response.headers['vary'])
+
+    def test_identity_variant(self):
+        response = self.client.get('/contact', headers={'Accept-Encoding': 'identity'})
+        self.assertNotIn('content-encoding', response.headers)
+        self.assertIn(b'<form', response.content)
+
+    def test_conditional_requests(self):
+        first = self.client.get('/products', headers={'Accept-Encoding': 'gzip'})
+        by_etag = self.client.get('/products', headers={'Accept-Encoding': 'gzip', 'If-None-Match': first.headers['etag']})
+        self.assertEqual(by_etag.status_code, 304)
+        by_date = self.client.get('/products', headers={'If-Modified-Since': first.headers['last-modified']})
+        self.assertEqual(by_date.status_code, 304)
+
+class TestPageReload(unittest.TestCase):
+
+    def test_reload_on_change(self):
+        path = os.path.join(tempfile.mkdtemp(), 'page.html')
+        with open(path, 'w') as f:
+            f.write('<p>one</p>')
+        store = pages.PageStore([path], reload=True)
+        self.assertEqual(store.get(path).body, b'<p>one</p>')
+        with open(path, 'w') as f:
+            f.write('<p>two</p>')
+        os.utime(path, (1, 1))
+        self.assertEqual(store.get(path).body, b'<p>two</p>')
+        self.assertEqual(gzip.decompress(store.get(path).variants['gzip']), b'<p>two</p>')
+
+if __name__ == '__main__':
+    unittest.main()
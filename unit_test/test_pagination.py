@@ -0,0 +1,48 @@
+import unittest
+
+import crud, models, pagination
+from unit_test.support import AppTestCase
+
+class TestCursor(unittest.TestCase):
+
+    def test_round_trip(self):
+        self.assertEqual(pagination.decode_cursor(pagination.encode_cursor(42)), 42)
+
+    def test_empty_cursor_is_first_page(self):
+        self.assertIsNone(pagination.decode_cursor(""))
+
+    def test_invalid_cursor(self):
+        with self.assertRaises(ValueError):
+            pagination.decode_cursor("not-a-cursor")
+
+class TestKeysetPagination(AppTestCase):
+
+    def seed(self, db):
+        db.add_all([models.Product(name=f'Product {i}', price=1.0) for i in range(25)])
+        db.commit()
+
+    def test_crud_after_id(self):
+        with self.Session() as db:
+            page = crud.get_products(db, limit=10, after_id=20)
+        self.assertEqual([p.id for p in page], [21, 22, 23, 24, 25])
+
+    def test_walk_all_pages(self):
+        ids, cursor = [], ""
+        while cursor is not None:
+            response = self.client.get("/api/products", params={"cursor": cursor, "limit": 10})
+            self.assertEqual(response.status_code, 200)
+            body = response.json()
+            ids.extend(p["id"] for p in body["items"])
+            cursor = body["next_cursor"]
+        self.assertEqual(ids, list(range(1, 26)))
+
+    def test_skip_still_returns_list(self):
+        response = self.client.get("/api/products", params={"skip": 20})
+        self.assertEqual([p["id"] for p in response.json()], [21, 22, 23, 24, 25])
+
+    def test_bad_cursor_rejected(self):
+        response = self.client.get("/api/orders", params={"cursor": "garbage"})
+        self.assertEqual(response.status_code, 400)
+
+if __name__ == '__main__':
+    unittest.main()
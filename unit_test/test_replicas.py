@@ -0,0 +1,108 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import cache, crud, models, replicas, schemas
+from main import app, get_db
+from unit_test.support import order
+
+class TestReplicaSet(unittest.TestCase):
+
+    def test_round_robin(self):
+        replica_set = replicas.ReplicaSet(['a', 'b', 'c'], None)
+        picks = [replica_set.acquire() for _ in range(6)]
+        self.assertEqual(picks, [0, 1, 2, 0, 1, 2])
+        self.assertEqual(replica_set.in_use, [2, 2, 2])
+
+    def test_least_loaded(self):
+        replica_set = replicas.ReplicaSet(['a', 'b'], None, policy='least_loaded')
+        first, second = replica_set.acquire(), replica_set.acquire()
+        self.assertEqual({first, second}, {0, 1})
+        replica_set.release(1)
+        # Round robin would pick 0 here
+        self.assertEqual(replica_set.acquire(), 1)
+        self.assertEqual(replica_set.in_use, [1, 1])
+
+    def test_unknown_policy(self):
+        with self.assertRaises(ValueError):
+            replicas.ReplicaSet(['a'], None, policy='random')
+
+class TestReadRouting(unittest.TestCase):
+
+    def setUp(self):
+        cache.catalog_cache.invalidate()
+        directory = tempfile.mkdtemp()
+        primary, replica = os.path.join(directory, 'primary.db'), os.path.join(directory, 'replica.db')
+        self.engine = create_engine(f'sqlite:///{primary}', connect_args={"check_same_thread": False})
+        models.Base.metadata.create_all(self.engine)
+        self.Session = sessionmaker(bind=self.engine)
+        with self.Session() as db:
+            db.add(models.Product(name='Shirt', price=5.0))
+            db.commit()
+        self.replicator = replicas.Replicator(primary, [replica])
+        self.replicator.sync()
+
+        def override_get_db():
+            db = self.Session()
+            try:
+                yield db
+            finally:
+                db.close()
+
+        app.dependency_overrides[get_db] = override_get_db
+        read_replicas = replicas.ReplicaSet([f'sqlite:///{replica}'], lambda url: create_engine(url, connect_args={"check_same_thread": False}))
+        patcher = patch.object(replicas, 'read_replicas', read_replicas)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(read_replicas.dispose)
+        self.addCleanup(self.engine.dispose)
+
+    def tearDown(self):
+        app.dependency_overrides.clear()
+
+    def test_reads_go_to_replica_until_synced(self):
+        writer, reader = TestClient(app), TestClient(app)
+        response = writer.post("/api/orders", json=order(1))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(replicas.STICKY_COOKIE, response.cookies)
+        # The writer reads its own order from the primary
+        self.assertEqual(len(writer.get("/api/orders").json()), 1)
+        # Another client reads the lagging replica
+        before = replicas.reads_total.value("replica")
+        self.assertEqual(reader.get("/api/orders").json(), [])
+        self.assertEqual(reader.get("/api/orders/by-customer", params={"email": "test@example.com"}).json()["items"], [])
+        self.assertEqual(replicas.reads_total.value("replica") - before, 2)
+        self.replicator.sync()
+        self.assertEqual(len(reader.get("/api/orders").json()), 1)
+
+    def test_catalog_fills_wait_for_replica(self):
+        patcher = patch.object(replicas, '_replicator', self.replicator)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        client = TestClient(app)
+        before = replicas.reads_total.value("replica")
+        self.assertEqual([p["name"] for p in client.get("/api/products").json()], ['Shirt'])
+        self.assertEqual(replicas.reads_total.value("replica") - before, 1)
+        with self.Session() as db:
+            crud.create_product(db, schemas.ProductCreate(name='Scarf', price=3.0))
+        # The replica has not seen the new product yet, so the cache is filled from the primary
+        self.assertEqual([p["name"] for p in client.get("/api/products").json()], ['Shirt', 'Scarf'])
+        self.assertEqual(replicas.reads_total.value("replica") - before, 1)
+        self.replicator.sync()
+        self.assertEqual([p["name"] for p in client.get("/api/products", params={"ids": "2"}).json()], ['Scarf'])
+        self.assertEqual(replicas.reads_total.value("replica") - before, 2)
+
+    def test_expired_or_bad_cookie_reads_replica(self):
+        client = TestClient(app)
+        client.post("/api/orders", json=order(1))
+        client.cookies.set(replicas.STICKY_COOKIE, "0")
+        self.assertEqual(client.get("/api/orders").json(), [])
+        client.cookies.set(replicas.STICKY_COOKIE, "not-a-number")
+        self.assertEqual(client.get("/api/orders").json(), [])
+
+if __name__ == '__main__':
+    unittest.main()
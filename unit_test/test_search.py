@@ -0,0 +1,71 @@
+import unittest
+from sqlalchemy import text
+from sqlalchemy.orm import sessionmaker
+
+import crud, models, schemas, search
+from unit_test.support import AppTestCase, memory_engine
+
+class TestProductSearch(AppTestCase):
+
+    def seed(self, db):
+        for name, description, price in [
+            ('Linen Shirt', 'Breathable summer shirt', 40.0),
+            ('Denim Jacket', 'Goes well with any shirt', 90.0),
+            ('Wool Scarf', 'Warm winter scarf', 25.0),
+            ('Shirt Dress', None, 60.0),
+        ]:
+            crud.create_product(db, schemas.ProductCreate(name=name, description=description, price=price))
+
+    def names(self, **params):
+        response = self.client.get('/api/products/search', params=params)
+        self.assertEqual(response.status_code, 200)
+        return [p['name'] for p in response.json()]
+
+    def test_prefix_match_ranks_name_first(self):
+        names = self.names(q='shi')
+        self.assertEqual(set(names), {'Linen Shirt', 'Shirt Dress', 'Denim Jacket'})
+        self.assertEqual(names[-1], 'Denim Jacket')
+
+    def test_price_range(self):
+        self.assertEqual(self.names(q='shirt', min_price=50, max_price=100), ['Shirt Dress', 'Denim Jacket'])
+        self.assertEqual(set(self.names(q='shirt', max_price=50)), {'Linen Shirt'})
+        self.assertEqual(self.names(min_price=30, max_price=70), ['Linen Shirt', 'Shirt Dress'])
+
+    def test_broad_query_filters_and_ranks_every_match(self):
+        with self.Session() as db:
+            db.add_all([models.Product(name='Red Shoe', description='shoe', price=5.0) for _ in range(2500)])
+            db.add_all([models.Product(name='Gold Shoe', price=500.0), models.Product(name='Shoe', price=9.0)])
+            db.commit()
+        self.assertEqual(self.names(q='shoe', min_price=100), ['Gold Shoe'])
+        # The exact name ranks first although it was inserted last
+        self.assertEqual(self.names(q='shoe', limit=1), ['Shoe'])
+
+    def test_limit_bounds(self):
+        for limit in (-1, 0, search.MAX_RESULTS + 1):
+            response = self.client.get('/api/products/search', params={'min_price': 0, 'limit': limit})
+            self.assertEqual(response.status_code, 422)
+
+    def test_operators_are_quoted(self):
+        self.assertEqual(self.names(q='scarf OR "shirt'), [])
+        self.assertEqual(self.names(q='warm NEAR scarf'), [])
+        self.assertEqual(search.build_match('Linen-Shirt'), '"linen" "shirt"*')
+
+    def test_index_follows_updates_and_deletes(self):
+        with self.Session() as db:
+            db.get(models.Product, 3).name = 'Cashmere Scarf'
+            db.delete(db.get(models.Product, 1))
+            db.commit()
+        self.assertEqual(self.names(q='cashmere'), ['Cashmere Scarf'])
+        self.assertEqual(self.names(q='linen'), [])
+
+    def test_ensure_index_backfills(self):
+        engine = memory_engine()
+        with engine.begin() as conn:
+            conn.execute(text('CREATE TABLE products (id INTEGER PRIMARY KEY, name VARCHAR, description VARCHAR, price FLOAT, image_url VARCHAR)'))
+            conn.execute(text("INSERT INTO products (name, price) VALUES ('Old Hat', 5.0)"))
+        search.ensure_index(engine)
+        with sessionmaker(bind=engine)() as db:
+            self.assertEqual([p.name for p in search.search_products(db, 'hat')], ['Old Hat'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,41 @@
+import unittest
+from datetime import date, datetime
+
+import models, stats
+from unit_test.support import AppTestCase, order
+
+class TestSalesAggregates(AppTestCase):
+
+    def seed(self, db):
+        db.add_all([models.Product(name='Shirt', price=10.0), models.Product(name='Hat', price=4.0), models.Product(name='Scarf', price=1.0)])
+        db.commit()
+
+    def test_incremental_updates(self):
+        self.client.post('/api/orders', json=order(1, 2))
+        self.client.post('/api/orders/bulk', json=[order(1), order(2, 3), order(99)])
+        self.assertEqual(self.client.get('/api/stats/products/1').json(), {'product_id': 1, 'orders': 2, 'units': 3, 'revenue': 30.0})
+        self.assertEqual(self.client.get('/api/stats/products/2').json()['revenue'], 12.0)
+        daily = self.client.get('/api/stats/daily').json()
+        self.assertEqual(len(daily), 1)
+        self.assertEqual((daily[0]['orders'], daily[0]['units'], daily[0]['revenue']), (3, 6, 42.0))
+
+    def test_product_without_sales(self):
+        self.assertEqual(self.client.get('/api/stats/products/3').json()['orders'], 0)
+        self.assertEqual(self.client.get('/api/stats/products/99').status_code, 404)
+
+    def test_rebuild_matches_incremental(self):
+        self.client.post('/api/orders/bulk', json=[order(1), order(2, 3), order(1, 5)])
+        with self.Session() as db:
+            # Orders inserted behind the write paths' back, on two different days
+            db.add_all([models.Order(**order(3, 4), unit_price=1.0, created_at=datetime(2024, 1, d)) for d in (1, 2)])
+            db.commit()
+            self.assertIsNone(stats.get_product_sales(db, 3))
+            self.assertEqual(stats.rebuild(db, batch_size=2), (3, 3))
+            self.assertEqual(stats.get_product_sales(db, 1).units, 6)
+            self.assertEqual(stats.get_product_sales(db, 3).revenue, 8.0)
+            days = stats.get_daily_sales(db, start=date(2024, 1, 2))
+            self.assertEqual([d.day for d in days][0], date(2024, 1, 2))
+            self.assertEqual(len(days), 2)
+
+if __name__ == '__main__':
+    unittest.main()